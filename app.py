@@ -1,16 +1,19 @@
 import streamlit as st
 import pytesseract
-import edge_tts
-import asyncio
-import tempfile
-import fitz  # PyMuPDF
-from PIL import Image, ImageEnhance, ImageOps
 import base64
 import time
 import os
 import sys
 import shutil
 
+from pdfvoice import bookjob, metrics, profiles, search
+from pdfvoice.audio_cache import get_audio_cache
+from pdfvoice.audio_server import audio_url
+from pdfvoice.batch import find_precomputed_audio, manifest_index, manifest_stamp
+from pdfvoice.documents import get_document
+from pdfvoice.prefetch import PagePrefetcher
+from pdfvoice.tts import prefetch_page_audio, start_page_audio, stream_page_audio
+
 # --- CẤU HÌNH ĐƯỜNG DẪN TỰ ĐỘNG (AUTO DETECT) ---
 # Logic: Nếu tìm thấy Tesseract trong đường dẫn hệ thống (Linux/Web) thì dùng nó.
 # Nếu không (đang ở Windows), thì mới dùng đường dẫn cứng.
@@ -33,86 +36,192 @@ VOICES = {
     "Nữ - Hoài My": "vi-VN-HoaiMyNeural",
     "Nam - Nam Minh": "vi-VN-NamMinhNeural"
 }
+TTS_RATE = "+15%"
+
+# Thư mục kết quả của `python -m pdfvoice.batch` (nếu có thì dùng mp3 tạo sẵn)
+ARTIFACTS_DIR = os.environ.get("PDF_VOICE_ARTIFACTS_DIR")
+
+# Thư mục static/ cạnh app: Streamlit phục vụ ở /app/static/ khi bật server.enableStaticServing
+# (.streamlit/config.toml) -> mp3 trong cache phát qua URL cùng origin (pdfvoice.audio_server)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def get_manifest_index(artifacts_dir, stamp):
+    # Đọc các manifest một lần; stamp đổi (batch vừa ghi thêm) thì đọc lại
+    return manifest_index(artifacts_dir)
 
 # --- HÀM XỬ LÝ (GIỮ NGUYÊN TỪ V16) ---
+# profile đứng trước page_number vì PagePrefetcher gọi fn(*args, page_number)
 @st.cache_data(show_spinner=False)
-def get_page_content_parallel(pdf_bytes, page_number):
+def get_page_content_parallel(_pdf, digest, profile, page_number):
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page = doc.load_page(page_number - 1)
-        
-        # Render ảnh
-        mat = fitz.Matrix(2.0, 2.0)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img_visual = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        
-        # Xử lý OCR
-        img_ocr = ImageOps.grayscale(img_visual)
-        enhancer = ImageEnhance.Contrast(img_ocr)
-        img_ocr = enhancer.enhance(2.0)
-        
-        # OCR
-        custom_config = r'--oem 3 --psm 6'
-        text = pytesseract.image_to_string(img_ocr, lang='vie', config=custom_config)
+        # _pdf (OpenDocument) không bị Streamlit băm; khoá cache là digest + hồ sơ + số trang
+        page = _pdf.load_page(page_number)
         
-        return img_visual, text
+        # Ảnh JPEG vừa màn hình của hồ sơ + chữ: kho -> lớp chữ có sẵn của PDF -> OCR theo hồ sơ
+        # (pdfvoice.profiles; chỉ trang scan mới cần Tesseract, khi đó mới render ảnh xám riêng cho OCR)
+        content = profiles.page_content(page, digest, page_number, profile)
+        return content["image"], content["text"]
     except Exception as e:
         return None, str(e)
 
-async def generate_audio_file(text, voice_key):
-    if not text or len(text.strip()) < 2: return None
-    tfile = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-    communicate = edge_tts.Communicate(text, VOICES[voice_key], rate="+15%")
-    await communicate.save(tfile.name)
-    return tfile.name
-
-def get_auto_player_html(file_path, page_num, total_pages):
-    with open(file_path, "rb") as f:
-        audio_bytes = f.read()
-    audio_base64 = base64.b64encode(audio_bytes).decode()
-    unique_id = f"audio_{page_num}_{int(time.time())}"
-    
-    js_script = ""
-    if page_num < total_pages:
-        js_script = f"""
+def get_auto_player_html(file_path, page_num, total_pages, chunk_index=0, chunk_count=1, player_id=None):
+    # Đoạn 0 dựng thẻ <audio> + hàng đợi; các đoạn sau chỉ đẩy địa chỉ vào hàng đợi đó.
+    # file_path = None nghĩa là đoạn đó tổng hợp lỗi -> trình phát bỏ qua.
+    # File trong cache được phát qua URL cùng origin (static/ của app, HTTP Range, trình duyệt tự cache);
+    # chưa bật static serving hay file ngoài cache (mp3 tạo sẵn bằng batch) thì nhúng base64.
+    audio_src = ""
+    if file_path:
+        static_dir = STATIC_DIR if st.get_option("server.enableStaticServing") else None
+        audio_src = audio_url(file_path, get_audio_cache().directory, st.context.headers.get("Host"), static_dir)
+        if not audio_src:
+            with open(file_path, "rb") as f:
+                audio_bytes = f.read()
+            audio_src = "data:audio/mp3;base64," + base64.b64encode(audio_bytes).decode()
+    unique_id = player_id or f"audio_{page_num}_{int(time.time())}"
+
+    if chunk_index > 0:
+        return f"""
+        <script>
+            var player = window.parent.pdfVoice;
+            if (player && player.id === "{unique_id}") {{ player.push({chunk_index}, "{audio_src}"); }}
+        </script>
+        """
+
+    auto_next = "true" if page_num < total_pages else "false"
+    return f"""
+        <audio id="{unique_id}" controls preload="auto" style="width: 100%; margin-top: 10px;"></audio>
         <script>
             var audio = document.getElementById("{unique_id}");
-            audio.onended = function() {{
+            var queue = ["{audio_src}"];
+            var total = {chunk_count};
+            var playing = 0;
+            var waiting = false;
+
+            function autoNext() {{
+                if (!{auto_next}) return;
                 var buttons = window.parent.document.getElementsByTagName('button');
                 for (var i = 0; i < buttons.length; i++) {{
                     if (buttons[i].innerText.includes("Auto Next")) {{
                         buttons[i].click(); break;
                     }}
                 }}
+            }}
+
+            function playCurrent() {{
+                // Bỏ qua đoạn lỗi (chuỗi rỗng), chờ đoạn chưa tới (undefined)
+                while (playing < total && queue[playing] === "") playing++;
+                if (playing >= total) {{ autoNext(); return; }}
+                if (queue[playing] === undefined) {{ waiting = true; return; }}
+                waiting = false;
+                audio.src = queue[playing];
+                audio.play();
+            }}
+
+            audio.onended = function() {{ playing++; playCurrent(); }};
+            window.parent.pdfVoice = {{
+                id: "{unique_id}",
+                push: function(index, src) {{
+                    queue[index] = src;
+                    if (waiting) playCurrent();
+                }}
             }};
+            playCurrent();
         </script>
-        """
-    return f"""
-        <audio id="{unique_id}" autoplay controls style="width: 100%; margin-top: 10px;">
-            <source src="data:audio/mp3;base64,{audio_base64}" type="audio/mp3">
-        </audio>
-        {js_script}
     """
 
+# --- TIẾN ĐỘ OCR CẢ CUỐN ---
+# Fragment tự chạy lại vài giây một lần: thanh tiến độ cập nhật mà không rerun cả trang
+@st.fragment(run_every=bookjob.PROGRESS_SECONDS)
+def show_book_progress(job):
+    progress = job.progress()
+    st.progress(progress["done"] / progress["total"], text=bookjob.progress_text(progress))
+
+# --- TÌM TRONG SÁCH ---
+# Tìm trên chỉ mục các trang đã OCR (pdfvoice.search), gõ không dấu vẫn ra; bấm kết quả để nhảy
+# tới trang đó. Fragment: gõ chữ tìm không rerun cả trang (không OCR / render lại trang đang đọc)
+@st.fragment
+def show_search(pdf):
+    query = st.text_input("🔎 Tìm trong sách", placeholder="vd: duong cach mang")
+    if not query:
+        return
+    results = search.search(pdf.digest, query)
+    st.caption(f"{len(results)} kết quả · tìm trên {search.indexed_count(pdf.digest)}/{pdf.page_count} trang đã OCR")
+    for index, result in enumerate(results):
+        if st.button(f"Trang {result['page']}", key=f"search-{index}-{result['page']}"):
+            st.session_state.current_page = result["page"]
+            # Nhảy trang -> huỷ các trang đang xếp hàng đọc trước của vị trí cũ
+            st.session_state.prefetcher.cancel()
+            # Rerun cả app: ô số trang, nút, trình đọc theo trang mới
+            st.rerun()
+        st.markdown(result["snippet"])
+
 # --- GIAO DIỆN CHÍNH ---
 st.set_page_config(page_title="PDF Reader Online", layout="wide")
+# Đặt PDF_VOICE_METRICS_PORT (vd 8503) để xem thời gian từng bước ở http://127.0.0.1:<cổng>/metrics
+metrics.start_metrics_server()
 
 with st.sidebar:
     st.header("Cài đặt")
     selected_voice = st.selectbox("Giọng đọc:", list(VOICES.keys()))
+
+    # Hồ sơ xử lý theo thiết bị (điện thoại -> lite, máy tính -> desktop), đổi tay được.
+    # Mọi hồ sơ dùng chung kho chữ + cache âm thanh: cùng hồ sơ thì trang đã OCR ở máy khác dùng lại được.
+    default_profile = profiles.device_profile(st.context.headers.get("User-Agent"))
+    profile_names = list(profiles.PROFILES)
+    selected_profile = st.selectbox(
+        "Hồ sơ xử lý:", profile_names, index=profile_names.index(default_profile),
+        format_func=lambda name: profiles.PROFILES[name]["label"]
+    )
     uploaded_file = st.file_uploader("Upload PDF", type="pdf")
 
+    # Thống kê cache âm thanh (trúng / trượt)
+    audio_stats = get_audio_cache().stats()
+    st.caption(
+        f"🔊 Cache âm thanh: {audio_stats['hits']} trúng / {audio_stats['misses']} trượt · "
+        f"{audio_stats['bytes'] / 1048576:.0f}/{audio_stats['max_bytes'] / 1048576:.0f} MB"
+    )
+
 if uploaded_file:
     if 'current_page' not in st.session_state: st.session_state.current_page = 1
     if 'is_auto' not in st.session_state: st.session_state.is_auto = False
+    if 'prefetcher' not in st.session_state: st.session_state.prefetcher = PagePrefetcher()
+
+    # Mở file một lần cho cả phiên: rerun không đọc lại / băm lại cả file
+    pdf = get_document(st.session_state, uploaded_file)
+    total_pages = pdf.page_count
 
-    doc = fitz.open(stream=uploaded_file.read(), filetype="pdf")
-    total_pages = doc.page_count
-    uploaded_file.seek(0)
-    bytes_data = uploaded_file.read()
+    # Auto: trang trắng / trang ngăn cách / trang chỉ có hình thì nhảy qua ngay trong lượt chạy này
+    # (kiểm tra trên ảnh ~50 dpi, không OCR, không ngủ, không rerun thêm)
+    if st.session_state.is_auto:
+        st.session_state.current_page = pdf.next_readable_page(st.session_state.current_page)
 
     col_vis, col_ctrl = st.columns([1.3, 1])
-    img_show, text_content = get_page_content_parallel(bytes_data, st.session_state.current_page)
+    # Cả cuốn được OCR trước trong nền: trang đang đọc, các trang sau rồi phần còn lại (pdfvoice.bookjob)
+    if bookjob.BOOK_JOB_ENABLED:
+        book_job = bookjob.get_job(pdf, selected_profile, st.session_state.current_page)
+        with st.sidebar:
+            show_book_progress(book_job)
+    with st.sidebar:
+        show_search(pdf)
+
+    # Đo thời gian từng bước của trang (cache, render, OCR...) -> log, /metrics, bảng debug
+    with metrics.page_trace("get_page_content_parallel", st.session_state.current_page) as page_trace:
+        img_show, text_content = get_page_content_parallel(pdf, pdf.digest, selected_profile,
+                                                           st.session_state.current_page)
+        page_trace.add_payload("image", len(img_show or b""))
+
+    # Bảng thời gian xử lý các trang gần nhất (bật bằng PDF_VOICE_DEBUG_PANEL=1)
+    if metrics.DEBUG_PANEL:
+        with st.sidebar.expander("🐞 Thời gian xử lý", expanded=True):
+            st.dataframe(metrics.recent(), use_container_width=True)
+
+    # Trong lúc đọc trang này thì OCR sẵn mấy trang sau (vào chung cache)
+    st.session_state.prefetcher.schedule(
+        get_page_content_parallel, st.session_state.current_page, total_pages, pdf, pdf.digest, selected_profile,
+        doc_key=pdf.digest
+    )
 
     with col_vis:
         if img_show: st.image(img_show, use_container_width=True)
@@ -141,12 +250,50 @@ if uploaded_file:
                 st.rerun()
                 
         if st.session_state.is_auto and text_content:
-            with st.spinner("⏳ Đang tải..."):
-                audio_path = asyncio.run(generate_audio_file(text_content, selected_voice))
-                if audio_path:
-                    st.components.v1.html(get_auto_player_html(audio_path, st.session_state.current_page, total_pages), height=80)
-                else:
-                    time.sleep(1)
-                    if st.session_state.current_page < total_pages:
-                        st.session_state.current_page += 1
-                        st.rerun()
\ No newline at end of file
+            audio_path = None
+            if ARTIFACTS_DIR:
+                audio_path = find_precomputed_audio(
+                    get_manifest_index(ARTIFACTS_DIR, manifest_stamp(ARTIFACTS_DIR)),
+                    pdf.digest, st.session_state.current_page,
+                    VOICES[selected_voice], TTS_RATE
+                )
+            if audio_path:
+                with page_trace.stage("payload"):
+                    player_html = get_auto_player_html(audio_path, st.session_state.current_page, total_pages)
+                page_trace.add_payload("audio", len(player_html))
+                st.components.v1.html(player_html, height=80)
+            elif len(text_content.strip()) >= 2:
+                # Tổng hợp từng đoạn câu song song; đoạn 1 xong là phát ngay, các đoạn sau đẩy tiếp vào
+                voice = VOICES[selected_voice]
+                page_num = st.session_state.current_page
+                player_id = f"audio_{page_num}_{int(time.time())}"
+                chunk_count = len(start_page_audio(text_content, voice, TTS_RATE))
+                chunks = stream_page_audio(text_content, voice, TTS_RATE)
+                with st.spinner("⏳ Đang tải..."), page_trace.stage("tts_wait"):
+                    first_path = next(chunks)
+                with page_trace.stage("payload"):
+                    player_html = get_auto_player_html(first_path, page_num, total_pages, 0, chunk_count, player_id)
+                page_trace.add_payload("audio", len(player_html))
+                st.components.v1.html(player_html, height=80)
+
+                # Trang sau: OCR xong (luồng đọc trước) thì tổng hợp luôn âm thanh của nó
+                def prefetch_next_audio(future):
+                    if future.cancelled(): return
+                    next_img, next_text = future.result()
+                    if next_img is not None:
+                        prefetch_page_audio(next_text, voice, TTS_RATE)
+
+                next_page = st.session_state.prefetcher.future(page_num + 1)
+                if next_page is not None:
+                    next_page.add_done_callback(prefetch_next_audio)
+
+                with page_trace.stage("tts_wait"):
+                    for index, path in enumerate(chunks, start=1):
+                        player_html = get_auto_player_html(path, page_num, total_pages, index, chunk_count, player_id)
+                        page_trace.add_payload("audio", len(player_html))
+                        st.components.v1.html(player_html, height=0)
+            else:
+                # Trang có nội dung nhưng OCR không ra chữ nào: sang trang luôn
+                if st.session_state.current_page < total_pages:
+                    st.session_state.current_page += 1
+                    st.rerun()
\ No newline at end of file
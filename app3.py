@@ -1,17 +1,18 @@
 import streamlit as st
 import pytesseract
-from pdf2image import convert_from_bytes
-import edge_tts
 import asyncio
-import tempfile
-import fitz  # PyMuPDF
-from PIL import Image, ImageOps, ImageEnhance
-import numpy as np
+import os
+
+from pdfvoice import bookjob, profiles
+from pdfvoice.documents import get_document
+from pdfvoice.mp_ocr import archival_profile, render_page_images, render_thumbnail
+from pdfvoice.audio_cache import get_audio_cache
+from pdfvoice.audio_server import audio_url
+from pdfvoice.tts import synthesize_cached
 
 # --- ⚠️ CẤU HÌNH ĐƯỜNG DẪN CỦA BẠN (QUAN TRỌNG NHẤT) ---
-# Hãy thay đúng đường dẫn trên máy bạn vào 2 dòng dưới đây
+# Hãy thay đúng đường dẫn trên máy bạn vào dòng dưới đây
 PATH_TESSERACT = r'C:\Program Files\Tesseract-OCR\tesseract.exe' 
-PATH_POPPLER = r'C:\Program Files\poppler\poppler-25.12.0\Library\bin' 
 
 # Cấu hình hệ thống
 pytesseract.pytesseract.tesseract_cmd = PATH_TESSERACT
@@ -22,70 +23,51 @@ VOICES = {
     "Nam - Nam Minh": "vi-VN-NamMinhNeural"
 }
 
-# --- HÀM XỬ LÝ ẢNH CAO CẤP ---
-def preprocess_image(image):
-    """
-    Biến ảnh mờ/xám thành ảnh trắng đen siêu nét để AI dễ đọc
-    """
-    # 1. Chuyển sang ảnh xám (Grayscale)
-    img_gray = image.convert('L')
-    
-    # 2. Tăng độ tương phản lên 2 lần
-    enhancer = ImageEnhance.Contrast(img_gray)
-    img_contrast = enhancer.enhance(2.0)
-    
-    # 3. Làm sạch nhiễu (Thresholding) - Biến những điểm mờ thành trắng hẳn, chữ thành đen hẳn
-    # Ngưỡng 180: Ai sáng hơn 180 -> Trắng, Tối hơn -> Đen
-    img_binary = img_contrast.point(lambda x: 0 if x < 160 else 255, '1')
-    
-    return img_binary
+# Thư mục static/ cạnh app: Streamlit phục vụ ở /app/static/ khi bật server.enableStaticServing
+# (.streamlit/config.toml) -> mp3 trong cache phát qua URL cùng origin (pdfvoice.audio_server)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
 
-def process_pdf_v5(pdf_file_bytes, psm_mode):
-    pages_data = []
-    
+# Tên các loại trang không cần OCR (pdfvoice.blank)
+PAGE_KINDS = {"blank": "trang trắng", "separator": "trang ngăn cách", "image": "trang chỉ có hình"}
+
+def process_page_v5(pdf, page_number, psm_mode):
     # Chế độ cấu hình Tesseract
     # --psm 3: Tự động (Mặc định)
     # --psm 6: Coi như một khối văn bản duy nhất (Rất tốt cho trang sách)
     # --psm 4: Coi như một cột văn bản
-    custom_config = f'--oem 3 --psm {psm_mode}'
-    
-    st.toast("Đang chuyển đổi PDF sang Ảnh...", icon="🔄")
+    # "auto": bắt đầu nhanh, chỉ trang độ tin cậy thấp mới tăng DPI / làm nét / đổi PSM
+    # Trang job nền đã làm thì lấy từ kho; chưa tới thì OCR ngay trang này (300 DPI + làm nét),
+    # job nền đang làm đúng trang này thì chờ chung (pdfvoice.shared_cache)
     try:
-        # Tăng DPI lên 300 để ảnh nét căng
-        images = convert_from_bytes(pdf_file_bytes, poppler_path=PATH_POPPLER, dpi=300)
+        # Chữ đã làm sạch để đọc: bỏ header / footer / số trang, nối dòng (pdfvoice.cleanup)
+        result = profiles.read_clean_text(pdf.load_page(page_number), pdf.digest, page_number,
+                                          archival_profile(psm_mode))
     except Exception as e:
-        st.error(f"Lỗi Poppler: {e}")
-        return []
+        result = {"text": f"Lỗi OCR: {e}", "method": "ocr", "rung": None, "confidence": None}
+    return dict(result, id=page_number)
 
-    total = len(images)
-    my_bar = st.progress(0)
+# Ảnh thu nhỏ các trang lân cận, render ở độ phân giải nhỏ khi cần
+@st.cache_data(show_spinner=False, max_entries=64)
+def get_thumbnail(_pdf, digest, page_number):
+    return render_thumbnail(_pdf.load_page(page_number))
 
-    for i, image in enumerate(images):
-        # Bước 1: Xử lý ảnh (Làm nét)
-        processed_img = preprocess_image(image)
-        
-        # Bước 2: Đọc chữ
-        try:
-            text = pytesseract.image_to_string(processed_img, lang='vie', config=custom_config)
-        except Exception as e:
-            text = f"Lỗi OCR: {e}"
-
-        pages_data.append({
-            'id': i+1, 
-            'text': text, 
-            'image_original': image,
-            'image_processed': processed_img
-        })
-        my_bar.progress((i + 1) / total)
-            
-    return pages_data
-
-async def generate_audio_chunk(text, voice_key, output_file):
+# Ảnh to chỉ render lại cho trang đang xem (giữ vài trang gần nhất)
+@st.cache_data(show_spinner=False, max_entries=4)
+def get_page_images(_pdf, digest, page_number):
+    return render_page_images(_pdf.thread_doc(), page_number, dpi=300)
+
+async def generate_audio_chunk(text, voice_key):
+    # Trả về đường dẫn mp3 trong cache âm thanh chung (đọc lại cùng đoạn thì không gọi mạng)
     if not text or len(text.strip()) < 2:
-        return False
-    communicate = edge_tts.Communicate(text, VOICES[voice_key])
-    await communicate.save(output_file)
-    return True
+        return None
+    return await synthesize_cached(text, VOICES[voice_key], "+0%")
+
+# --- TIẾN ĐỘ OCR CẢ CUỐN ---
+# Fragment tự chạy lại vài giây một lần: thanh tiến độ cập nhật mà không rerun cả trang
+@st.fragment(run_every=bookjob.PROGRESS_SECONDS)
+def show_book_progress(job):
+    progress = job.progress()
+    st.progress(progress["done"] / progress["total"], text=bookjob.progress_text(progress))
 
 # --- GIAO DIỆN NGƯỜI DÙNG ---
 st.set_page_config(page_title="Super OCR Reader", layout="wide")
@@ -95,11 +77,12 @@ with st.sidebar:
     st.header("🔧 Cấu hình nâng cao")
     
     # Cho phép người dùng chỉnh chế độ đọc nếu máy đọc sai
+    # "auto": đọc nhanh trước, trang nào máy không chắc mới tăng độ phân giải / làm nét / đổi PSM
     psm_mode = st.selectbox(
         "Chế độ đọc (PSM):", 
-        options=[3, 6, 4], 
-        format_func=lambda x: f"Mode {x} - {'Tự động' if x==3 else 'Khối văn bản (Nên dùng cho sách)' if x==6 else 'Cột đơn'}",
-        index=1 # Mặc định chọn Mode 6 vì tốt cho sách của bạn
+        options=["auto", 3, 6, 4], 
+        format_func=lambda x: "Tự động (nhanh trước, làm nét khi cần)" if x == "auto" else f"Mode {x} - {'Tự động' if x==3 else 'Khối văn bản (Nên dùng cho sách)' if x==6 else 'Cột đơn'}",
+        index=0 # Mặc định tự động; Mode 6 vẫn tốt cho sách của bạn
     )
     
     st.info("Mẹo: Nếu đọc ra trang trống, hãy thử đổi Mode sang 3 hoặc 4.")
@@ -108,51 +91,70 @@ with st.sidebar:
     uploaded_file = st.file_uploader("Upload PDF", type="pdf")
 
 if uploaded_file:
-    # Logic chạy lại khi đổi file hoặc đổi chế độ
-    if 'data_v5' not in st.session_state or \
-       st.session_state.get('fname') != uploaded_file.name or \
-       st.session_state.get('psm') != psm_mode:
-           
-        with st.spinner('Đang xử lý hình ảnh...'):
-            bytes_data = uploaded_file.read()
-            # Reset pointer
-            uploaded_file.seek(0) 
-            data = process_pdf_v5(bytes_data, psm_mode)
-            st.session_state['data_v5'] = data
-            st.session_state['fname'] = uploaded_file.name
-            st.session_state['psm'] = psm_mode
-
-    if 'data_v5' in st.session_state:
-        data = st.session_state['data_v5']
-        
-        # Chọn trang
-        col_sel, col_info = st.columns([1, 4])
-        with col_sel:
-            page_idx = st.number_input("Chọn trang:", min_value=1, max_value=len(data), value=1) - 1
+    # Mở file một lần cho cả phiên
+    pdf = get_document(st.session_state, uploaded_file)
+
+    total = pdf.page_count
+
+    # Chọn trang
+    col_sel, col_info = st.columns([1, 4])
+    with col_sel:
+        page_number = st.number_input("Chọn trang:", min_value=1, max_value=total, value=1)
+
+    # Không chờ OCR xong cả cuốn mới hiện: job nền OCR cả cuốn (trang đang xem, các trang sau,
+    # rồi phần còn lại), ghi từng trang vào kho -> đổi chế độ / mở lại file thì làm tiếp (pdfvoice.bookjob)
+    if bookjob.BOOK_JOB_ENABLED:
+        book_job = bookjob.get_job(pdf, archival_profile(psm_mode), page_number)
+        with st.sidebar:
+            show_book_progress(book_job)
+
+    current_page = process_page_v5(pdf, page_number, psm_mode)
+
+    # Ảnh thu nhỏ các trang lân cận
+    with col_info:
+        near = range(max(1, page_number - 2), min(total, page_number + 2) + 1)
+        for col, number in zip(st.columns(5), near):
+            with col:
+                st.image(get_thumbnail(pdf, pdf.digest, number), caption=f"Trang {number}", use_container_width=True)
+
+    # Hiển thị 3 cột: Ảnh gốc - Ảnh máy nhìn - Kết quả chữ
+    c1, c2, c3 = st.columns(3)
+    image_original, image_processed = get_page_images(pdf, pdf.digest, current_page['id'])
+    
+    with c1:
+        st.caption("Ảnh gốc")
+        st.image(image_original, use_container_width=True)
         
-        current_page = data[page_idx]
+    with c2:
+        st.caption("Ảnh máy nhìn thấy (Đã xử lý)")
+        # Đây là ảnh quan trọng, nếu ảnh này đen sì là lỗi
+        st.image(image_processed, use_container_width=True) 
 
-        # Hiển thị 3 cột: Ảnh gốc - Ảnh máy nhìn - Kết quả chữ
-        c1, c2, c3 = st.columns(3)
+    with c3:
+        if current_page.get('method') == 'native':
+            source = " (lấy từ lớp chữ của PDF)"
+        elif current_page.get('method') in PAGE_KINDS:
+            # pdfvoice.blank: nhận ra trước khi OCR, không chạy Tesseract
+            source = f" ({PAGE_KINDS[current_page['method']]}, bỏ qua OCR)"
+        elif current_page.get('rung'):
+            # Chế độ tự động: trang này phải leo đến mức nào, độ tin cậy bao nhiêu
+            source = f" (OCR, mức {current_page['rung']}"
+            if current_page.get('confidence') is not None:
+                source += f", tin cậy {current_page['confidence']:.0f}%"
+            source += ")"
+        else:
+            source = " (OCR)"
+        st.caption("Kết quả chữ" + source)
+        txt_val = st.text_area("Chữ đọc được:", current_page['text'], height=300)
         
-        with c1:
-            st.caption("Ảnh gốc")
-            st.image(current_page['image_original'], use_container_width=True)
-            
-        with c2:
-            st.caption("Ảnh máy nhìn thấy (Đã xử lý)")
-            # Đây là ảnh quan trọng, nếu ảnh này đen sì là lỗi
-            st.image(current_page['image_processed'], use_container_width=True) 
-
-        with c3:
-            st.caption("Kết quả chữ")
-            txt_val = st.text_area("Chữ đọc được:", current_page['text'], height=300)
-            
-            if st.button("📢 Đọc ngay", type="primary"):
-                if not txt_val.strip():
-                    st.error("Chưa đọc được chữ nào!")
-                else:
-                    with st.spinner('Đang tạo âm thanh...'):
-                        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-                        asyncio.run(generate_audio_chunk(txt_val, selected_voice, tmp.name))
-                        st.audio(tmp.name)
\ No newline at end of file
+        if st.button("📢 Đọc ngay", type="primary"):
+            if not txt_val.strip():
+                st.error("Chưa đọc được chữ nào!")
+            else:
+                with st.spinner('Đang tạo âm thanh...'):
+                    audio_path = asyncio.run(generate_audio_chunk(txt_val, selected_voice))
+                    if audio_path:
+                        # Phát qua URL cùng origin (static/ của app) nếu được, không thì để Streamlit tự phục vụ file
+                        static_dir = STATIC_DIR if st.get_option("server.enableStaticServing") else None
+                        st.audio(audio_url(audio_path, get_audio_cache().directory,
+                                           st.context.headers.get("Host"), static_dir) or audio_path)
\ No newline at end of file
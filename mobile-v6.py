@@ -1,13 +1,13 @@
 import streamlit as st
 import pytesseract
-import fitz  # PyMuPDF
-from PIL import Image, ImageEnhance, ImageOps
+import json
 import sys
 import shutil
-import time
 import streamlit.components.v1 as components
-import cv2
-import numpy as np
+
+from pdfvoice import bookjob, metrics, preprocess, profiles, search
+from pdfvoice.documents import get_document
+from pdfvoice.speech_component import browser_reader, reading_queue, reported_page
 
 # --- CẤU HÌNH ---
 if sys.platform.startswith('win'):
@@ -18,122 +18,115 @@ else:
 if PATH_TESSERACT:
     pytesseract.pytesseract.tesseract_cmd = PATH_TESSERACT
 
-# --- HÀM XỬ LÝ ẢNH (2 CHẾ ĐỘ) ---
+# --- CHẾ ĐỘ ĐỌC ẢNH ---
+# Mỗi chế độ là một hồ sơ dùng chung (pdfvoice.profiles), kho chữ chung với các app khác.
+# Tự động: chạy bản nhanh trước, trang nào Tesseract không chắc mới làm nét / tăng độ phân giải
+OCR_MODES = {
+    "Tự động": "auto",
+    "Nhanh": "lite",
+    "Làm nét (OpenCV)": "opencv",
+    "Nhiều cột": "columns",
+}
+
+# --- HÀM XỬ LÝ ẢNH (4 CHẾ ĐỘ) ---
 @st.cache_data(show_spinner=False)
-def get_page_content_v31(pdf_bytes, page_number, use_opencv=False):
+def get_page_content_v31(_pdf, digest, page_number, mode="auto"):
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page = doc.load_page(page_number - 1)
-        
-        # Matrix 1.5: Cân bằng giữa tốc độ và độ nét
-        mat = fitz.Matrix(1.5, 1.5) 
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img_pil = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        
-        final_img = img_pil
-        
-        # --- NẾU BẬT OPENCV (CHẾ ĐỘ LÀM NÉT) ---
-        if use_opencv:
-            # Chuyển sang định dạng OpenCV
-            img_np = np.array(img_pil)
-            gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
-            
-            # Thuật toán Adaptive Threshold: Tự động tách chữ khỏi nền
-            # Giúp chữ tiếng Việt đậm hơn, rõ dấu hơn
-            processed = cv2.adaptiveThreshold(
-                gray, 255, 
-                cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                cv2.THRESH_BINARY, 
-                15, 8
-            )
-            final_img = Image.fromarray(processed)
-        else:
-            # Chế độ thường: Chỉ tăng tương phản nhẹ
-            gray = ImageOps.grayscale(img_pil)
-            final_img = ImageEnhance.Contrast(gray).enhance(1.5)
-
-        # OCR
-        custom_config = r'--oem 3 --psm 6'
-        text = pytesseract.image_to_string(final_img, lang='vie', config=custom_config)
-        
-        # Làm sạch text
-        text = text.replace('\n', ' ').replace('|', '').strip()
+        # _pdf (OpenDocument) không bị Streamlit băm; khoá cache chỉ là digest + số trang
+        page = _pdf.load_page(page_number)
         
-        return img_pil, final_img, text
+        # Ảnh gốc JPEG 720px + chữ theo hồ sơ (trang có lớp chữ thì bỏ qua Tesseract)
+        content = profiles.page_content(page, digest, page_number, mode)
+
+        # Chế độ làm nét: hiện luôn ảnh sau Adaptive Threshold để biết máy nhìn thấy gì
+        img_proc = None
+        if mode == "opencv":
+            img_proc = preprocess.to_image(profiles.processed_gray(page, mode))
+
+        # Tự động: trang này phải leo đến mức nào của thang (pdfvoice.ladder)
+        note = ""
+        if content["rung"]:
+            note = f"Mức OCR: {content['rung']}"
+            if content["confidence"] is not None:
+                note += f" (tin cậy {content['confidence']:.0f}%)"
+        # Các đoạn câu để đọc đã tách sẵn ở server, cache cùng chữ (pdfvoice.speech)
+        return content["image"], img_proc, content["text"], content["chunks"], note
     except Exception as e:
-        return None, None, str(e)
-
-# --- JS ĐỌC TỪNG CÂU (SMOOTH V30) ---
-def mobile_speak_smooth(text):
-    safe_text = text.replace('\\', '').replace('"', '').replace("'", "").replace('\n', ' ')
-    html = f"""
-    <script>
-        window.speechSynthesis.cancel();
-        
-        var fullText = "{safe_text}";
-        var sentences = fullText.match(/[^.!?]+[.!?]+|[^.!?]+$/g);
-        
-        if (!sentences || sentences.length === 0) {{
-            sentences = [fullText];
-        }}
-
-        var currentIndex = 0;
-
-        function playNextChunk() {{
-            if (currentIndex >= sentences.length) {{
-                var buttons = window.parent.document.getElementsByTagName('button');
-                for (var i = 0; i < buttons.length; i++) {{
-                    if (buttons[i].innerText.toUpperCase().includes("TIẾP THEO")) {{
-                        buttons[i].click(); return;
-                    }}
-                }}
-                return;
-            }}
-
-            var chunk = sentences[currentIndex];
-            if (!chunk || chunk.trim().length === 0) {{
-                currentIndex++; playNextChunk(); return;
-            }}
-
-            var msg = new SpeechSynthesisUtterance();
-            msg.text = chunk;
-            msg.lang = 'vi-VN';
-            msg.rate = 1.0; 
-
-            var voices = window.speechSynthesis.getVoices();
-            var vn = voices.find(v => v.lang.includes('vi'));
-            if (vn) msg.voice = vn;
-
-            msg.onend = function(e) {{
-                currentIndex++; playNextChunk(); 
-            }};
-            
-            msg.onerror = function(e) {{
-                currentIndex++; playNextChunk();
-            }};
-
-            window.speechSynthesis.speak(msg);
-        }}
-        
-        if (window.speechSynthesis.getVoices().length === 0) {{
-            window.speechSynthesis.addEventListener('voiceschanged', function() {{ playNextChunk(); }});
-        }} else {{
-            playNextChunk();
-        }}
-        
-        if (window.speechInterval) clearInterval(window.speechInterval);
-        window.speechInterval = setInterval(function() {{
-            if (window.speechSynthesis.speaking) {{
-                window.speechSynthesis.pause();
-                window.speechSynthesis.resume();
-            }}
-        }}, 8000);
-    </script>
-    """
-    components.html(html, height=0)
+        return None, None, str(e), [], ""
+
+# --- TIẾN ĐỘ OCR CẢ CUỐN ---
+# Fragment tự chạy lại vài giây một lần: thanh tiến độ cập nhật mà không rerun cả trang
+@st.fragment(run_every=bookjob.PROGRESS_SECONDS)
+def show_book_progress(job):
+    progress = job.progress()
+    st.progress(progress["done"] / progress["total"], text=bookjob.progress_text(progress))
+
+# --- TRANG ĐANG ĐỌC ---
+# Component đọc báo đã sang trang -> chỉ fragment này chạy lại (ảnh, chữ, hàng đợi đọc),
+# không rerun cả app
+@st.fragment
+def show_page(pdf, ocr_mode):
+    total = pdf.page_count
+    page = reported_page()
+    if page is not None:
+        if page > total:
+            # Đọc hết sách: rerun cả app để nút trở về "BẮT ĐẦU"
+            st.session_state.auto = False
+            st.rerun()
+        st.session_state.curr_page = page
+    if st.session_state.auto:
+        st.session_state.curr_page = pdf.next_readable_page(st.session_state.curr_page)
+    page = st.session_state.curr_page
+
+    # Trang đổi trong fragment: job OCR cả cuốn cũng ưu tiên lại từ đây
+    book_job = bookjob.get_job(pdf, ocr_mode, page) if bookjob.BOOK_JOB_ENABLED else None
+
+    # Đo thời gian từng bước của trang (cache, render, OCR...) -> log, /metrics, bảng debug
+    with metrics.page_trace("get_page_content_v31", page) as page_trace:
+        img_org, img_proc, text, chunks, ocr_note = get_page_content_v31(pdf, pdf.digest, page, ocr_mode)
+        page_trace.add_payload("image", len(img_org or b""))
+
+    # Hiển thị ảnh (Nếu bật OpenCV thì hiện ảnh đã xử lý để biết nó nét thế nào)
+    if ocr_mode == "opencv" and img_proc:
+        st.image(img_proc, caption=f"Trang {page} · Ảnh đã qua OpenCV (Trắng đen)", use_container_width=True)
+    elif img_org:
+        st.image(img_org, caption=f"Trang {page} · {ocr_note or 'Ảnh gốc'}", use_container_width=True)
+
+    # Logic Đọc
+    if st.session_state.auto:
+        st.toast(f"🔊 Đang đọc trang {page}...")
+        # Gửi sẵn chữ của vài trang sau đã OCR xong: component đọc hết trang này thì tự sang trang
+        # (trang OCR ra rỗng thì bỏ qua luôn), không phải chờ server
+        queue = reading_queue(pdf, page, lambda n: get_page_content_v31(pdf, pdf.digest, n, ocr_mode)[3],
+                              ready=book_job.is_done if book_job else None)
+        page_trace.add_payload("speech", len(json.dumps(queue, ensure_ascii=False).encode()))
+        browser_reader(queue, page)
+
+        if chunks:
+            with st.expander("Xem chữ"):
+                st.write(text)
+
+# --- TÌM TRONG SÁCH ---
+# Tìm trên chỉ mục các trang đã OCR (pdfvoice.search), gõ không dấu vẫn ra; bấm kết quả để nhảy
+# tới trang đó. Fragment: gõ chữ tìm không rerun cả trang (không OCR / render lại trang đang đọc)
+@st.fragment
+def show_search(pdf):
+    query = st.text_input("🔎 Tìm trong sách", placeholder="vd: duong cach mang")
+    if not query:
+        return
+    results = search.search(pdf.digest, query)
+    st.caption(f"{len(results)} kết quả · tìm trên {search.indexed_count(pdf.digest)}/{pdf.page_count} trang đã OCR")
+    for index, result in enumerate(results):
+        if st.button(f"Trang {result['page']}", key=f"search-{index}-{result['page']}"):
+            st.session_state.curr_page = result["page"]
+            # Rerun cả app: ô số trang, nút, trình đọc theo trang mới
+            st.rerun()
+        st.markdown(result["snippet"])
 
 # --- GIAO DIỆN CHÍNH ---
 st.set_page_config(page_title="PDF OpenCV V31", layout="centered")
+# Đặt PDF_VOICE_METRICS_PORT (vd 8503) để xem thời gian từng bước ở http://127.0.0.1:<cổng>/metrics
+metrics.start_metrics_server()
 st.markdown("<h3 style='text-align: center;'>📱 PDF Pro (OpenCV)</h3>", unsafe_allow_html=True)
 
 uploaded_file = st.file_uploader("Chọn file PDF:", type="pdf")
@@ -142,14 +135,21 @@ if uploaded_file:
     if 'curr_page' not in st.session_state: st.session_state.curr_page = 1
     if 'auto' not in st.session_state: st.session_state.auto = False
     
-    # --- CÔNG TẮC OPENCV ---
-    # Mặc định tắt cho nhanh, cần thì bật lên
-    use_opencv = st.checkbox("✅ Bật chế độ làm nét (OpenCV) - Đọc chậm nhưng chuẩn hơn")
+    # --- CHẾ ĐỘ ĐỌC ẢNH ---
+    # Mặc định tự động: trang rõ đọc nhanh, trang mờ tự làm nét (chậm hơn)
+    ocr_mode = OCR_MODES[st.radio("Chế độ đọc ảnh:", list(OCR_MODES), horizontal=True)]
 
-    doc = fitz.open(stream=uploaded_file.read(), filetype="pdf")
-    total = doc.page_count
-    uploaded_file.seek(0)
-    bytes_data = uploaded_file.read()
+    # Mở file một lần cho cả phiên: rerun không đọc lại / băm lại cả file
+    pdf = get_document(st.session_state, uploaded_file)
+    total = pdf.page_count
+
+    # Auto: trang trắng / trang ngăn cách / trang chỉ có hình thì nhảy qua ngay trong lượt chạy này
+    # (kiểm tra trên ảnh ~50 dpi, không OCR, không ngủ, không rerun thêm)
+    if st.session_state.auto:
+        st.session_state.curr_page = pdf.next_readable_page(st.session_state.curr_page)
+
+    with st.expander("🔎 Tìm trong sách"):
+        show_search(pdf)
 
     # Chọn trang
     st.write("---")
@@ -188,25 +188,15 @@ if uploaded_file:
             st.rerun()
 
     # --- XỬ LÝ ---
-    img_org, img_proc, text = get_page_content_v31(bytes_data, st.session_state.curr_page, use_opencv)
-    
-    # Hiển thị ảnh (Nếu bật OpenCV thì hiện ảnh đã xử lý để biết nó nét thế nào)
-    if use_opencv and img_proc:
-        st.image(img_proc, caption="Ảnh đã qua OpenCV (Trắng đen)", use_container_width=True)
-    elif img_org:
-        st.image(img_org, caption="Ảnh gốc", use_container_width=True)
-    
-    # Logic Đọc
-    if st.session_state.auto:
-        if text:
-            st.toast(f"🔊 Đang đọc trang {st.session_state.curr_page}...")
-            mobile_speak_smooth(text)
-            
-            with st.expander("Xem chữ"):
-                st.write(text)
-        else:
-            st.warning("Trang trắng. Chuyển tiếp...")
-            time.sleep(1)
-            if st.session_state.curr_page < total:
-                st.session_state.curr_page += 1
-                st.rerun()
+    # Cả cuốn được OCR trước trong nền: trang đang đọc, các trang sau rồi phần còn lại (pdfvoice.bookjob)
+    if bookjob.BOOK_JOB_ENABLED:
+        book_job = bookjob.get_job(pdf, ocr_mode, st.session_state.curr_page)
+        with st.sidebar:
+            show_book_progress(book_job)
+
+    show_page(pdf, ocr_mode)
+
+    # Bảng thời gian xử lý các trang gần nhất (bật bằng PDF_VOICE_DEBUG_PANEL=1)
+    if metrics.DEBUG_PANEL:
+        with st.sidebar.expander("🐞 Thời gian xử lý", expanded=True):
+            st.dataframe(metrics.recent(), use_container_width=True)
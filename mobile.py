@@ -1,12 +1,12 @@
 import streamlit as st
 import pytesseract
-import fitz  # PyMuPDF
-from PIL import Image, ImageEnhance, ImageOps
 import sys
 import shutil
-import time
 import streamlit.components.v1 as components
 
+from pdfvoice import bookjob, metrics, profiles
+from pdfvoice.documents import get_document
+
 # --- CẤU HÌNH ---
 if sys.platform.startswith('win'):
     PATH_TESSERACT = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
@@ -18,27 +18,15 @@ if PATH_TESSERACT:
 
 # --- HÀM XỬ LÝ ẢNH SIÊU NHẸ (LITE) ---
 @st.cache_data(show_spinner=False)
-def get_page_lite(pdf_bytes, page_number):
+def get_page_lite(_pdf, digest, page_number):
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page = doc.load_page(page_number - 1)
-        
-        # Matrix 1.2: Đủ nét để đọc, nhẹ RAM điện thoại
-        mat = fitz.Matrix(1.2, 1.2) 
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img_visual = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        
-        # OCR
-        img_ocr = ImageOps.grayscale(img_visual)
-        img_ocr = ImageEnhance.Contrast(img_ocr).enhance(1.5)
-        
-        custom_config = r'--oem 3 --psm 6'
-        text = pytesseract.image_to_string(img_ocr, lang='vie', config=custom_config)
-        
-        # Làm sạch cơ bản (Không dùng Regex để tránh lỗi)
-        text = text.replace('\n', ' ').replace('|', '').strip()
+        # _pdf (OpenDocument) không bị Streamlit băm; khoá cache chỉ là digest + số trang
+        page = _pdf.load_page(page_number)
         
-        return img_visual, text
+        # Hồ sơ "lite" dùng chung (pdfvoice.profiles): JPEG 720px để xem; trang scan mới render
+        # ảnh xám Matrix 1.2 + tương phản 1.5 để OCR. Kho chữ / cache âm thanh chung với các app khác.
+        content = profiles.page_content(page, digest, page_number, "lite")
+        return content["image"], content["text"]
     except Exception as e:
         return None, str(e)
 
@@ -87,8 +75,17 @@ def mobile_speak_final(text):
     """
     components.html(html, height=0)
 
+# --- TIẾN ĐỘ OCR CẢ CUỐN ---
+# Fragment tự chạy lại vài giây một lần: thanh tiến độ cập nhật mà không rerun cả trang
+@st.fragment(run_every=bookjob.PROGRESS_SECONDS)
+def show_book_progress(job):
+    progress = job.progress()
+    st.progress(progress["done"] / progress["total"], text=bookjob.progress_text(progress))
+
 # --- GIAO DIỆN CHÍNH ---
 st.set_page_config(page_title="PDF Mobile Pro", layout="centered")
+# Đặt PDF_VOICE_METRICS_PORT (vd 8503) để xem thời gian từng bước ở http://127.0.0.1:<cổng>/metrics
+metrics.start_metrics_server()
 
 st.markdown("<h3 style='text-align: center;'>📱 PDF Reader V25 (Pro)</h3>", unsafe_allow_html=True)
 
@@ -99,11 +96,14 @@ if uploaded_file:
     if 'curr_page' not in st.session_state: st.session_state.curr_page = 1
     if 'auto' not in st.session_state: st.session_state.auto = False
 
-    # Load File
-    doc = fitz.open(stream=uploaded_file.read(), filetype="pdf")
-    total = doc.page_count
-    uploaded_file.seek(0)
-    bytes_data = uploaded_file.read()
+    # Mở file một lần cho cả phiên: rerun không đọc lại / băm lại cả file
+    pdf = get_document(st.session_state, uploaded_file)
+    total = pdf.page_count
+
+    # Auto: trang trắng / trang ngăn cách / trang chỉ có hình thì nhảy qua ngay trong lượt chạy này
+    # (kiểm tra trên ảnh ~50 dpi, không OCR, không ngủ, không rerun thêm)
+    if st.session_state.auto:
+        st.session_state.curr_page = pdf.next_readable_page(st.session_state.curr_page)
 
     # --- KHU VỰC CHỌN SỐ TRANG (TÍNH NĂNG MỚI) ---
     st.write("---")
@@ -154,7 +154,21 @@ if uploaded_file:
             st.rerun()
 
     # --- HIỂN THỊ & ĐỌC ---
-    img, text = get_page_lite(bytes_data, st.session_state.curr_page)
+    # Cả cuốn được OCR trước trong nền: trang đang đọc, các trang sau rồi phần còn lại (pdfvoice.bookjob)
+    if bookjob.BOOK_JOB_ENABLED:
+        book_job = bookjob.get_job(pdf, "lite", st.session_state.curr_page)
+        with st.sidebar:
+            show_book_progress(book_job)
+
+    # Đo thời gian từng bước của trang (cache, render, OCR...) -> log, /metrics, bảng debug
+    with metrics.page_trace("get_page_lite", st.session_state.curr_page) as page_trace:
+        img, text = get_page_lite(pdf, pdf.digest, st.session_state.curr_page)
+        page_trace.add_payload("image", len(img or b""))
+
+    # Bảng thời gian xử lý các trang gần nhất (bật bằng PDF_VOICE_DEBUG_PANEL=1)
+    if metrics.DEBUG_PANEL:
+        with st.sidebar.expander("🐞 Thời gian xử lý", expanded=True):
+            st.dataframe(metrics.recent(), use_container_width=True)
     
     if img:
         st.image(img, use_container_width=True)
@@ -162,10 +176,10 @@ if uploaded_file:
     if st.session_state.auto:
         if text and len(text) > 5:
             st.toast(f"🔊 Đang đọc trang {st.session_state.curr_page}...")
+            page_trace.add_payload("speech", len(text.encode()))
             mobile_speak_final(text)
         else:
-            st.warning("Trang trắng. Tự qua trang sau...")
-            time.sleep(1)
+            # Trang có nội dung nhưng OCR không ra chữ: sang trang luôn
             if st.session_state.curr_page < total:
                 st.session_state.curr_page += 1
                 st.rerun()
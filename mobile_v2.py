@@ -1,12 +1,14 @@
 import streamlit as st
 import pytesseract
-import fitz  # PyMuPDF
-from PIL import Image, ImageEnhance, ImageOps
+import json
 import sys
 import shutil
-import time
 import streamlit.components.v1 as components
 
+from pdfvoice import bookjob, metrics, profiles, search
+from pdfvoice.documents import get_document
+from pdfvoice.speech_component import browser_reader, reading_queue, reported_page
+
 # --- CẤU HÌNH ---
 if sys.platform.startswith('win'):
     PATH_TESSERACT = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
@@ -18,119 +20,90 @@ if PATH_TESSERACT:
 
 # --- HÀM XỬ LÝ ẢNH (LITE) ---
 @st.cache_data(show_spinner=False)
-def get_page_lite(pdf_bytes, page_number):
+def get_page_lite(_pdf, digest, page_number):
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page = doc.load_page(page_number - 1)
-        
-        # Matrix 1.2 cho nhẹ máy
-        mat = fitz.Matrix(1.2, 1.2) 
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img_visual = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        
-        # OCR
-        img_ocr = ImageOps.grayscale(img_visual)
-        img_ocr = ImageEnhance.Contrast(img_ocr).enhance(1.5)
-        
-        custom_config = r'--oem 3 --psm 6'
-        text = pytesseract.image_to_string(img_ocr, lang='vie', config=custom_config)
-        
-        # Làm sạch cơ bản
-        text = text.replace('\n', ' ').replace('|', '').strip()
+        # _pdf (OpenDocument) không bị Streamlit băm; khoá cache chỉ là digest + số trang
+        page = _pdf.load_page(page_number)
         
-        return img_visual, text
+        # Hồ sơ "lite" dùng chung (pdfvoice.profiles): JPEG 720px để xem; trang scan mới render
+        # ảnh xám Matrix 1.2 + tương phản 1.5 để OCR. Kho chữ / cache âm thanh chung với các app khác.
+        # Các đoạn câu để đọc đã tách sẵn ở server, cache cùng chữ (pdfvoice.speech)
+        content = profiles.page_content(page, digest, page_number, "lite")
+        return content["image"], content["text"], content["chunks"]
     except Exception as e:
-        return None, str(e)
+        return None, str(e), []
+
+# --- TIẾN ĐỘ OCR CẢ CUỐN ---
+# Fragment tự chạy lại vài giây một lần: thanh tiến độ cập nhật mà không rerun cả trang
+@st.fragment(run_every=bookjob.PROGRESS_SECONDS)
+def show_book_progress(job):
+    progress = job.progress()
+    st.progress(progress["done"] / progress["total"], text=bookjob.progress_text(progress))
+
+# --- TRANG ĐANG ĐỌC ---
+# Component đọc báo đã sang trang -> chỉ fragment này chạy lại (ảnh, chữ, hàng đợi đọc),
+# không rerun cả app
+@st.fragment
+def show_page(pdf):
+    total = pdf.page_count
+    page = reported_page()
+    if page is not None:
+        if page > total:
+            # Đọc hết sách: rerun cả app để nút trở về "BẮT ĐẦU"
+            st.session_state.auto = False
+            st.rerun()
+        st.session_state.curr_page = page
+    if st.session_state.auto:
+        st.session_state.curr_page = pdf.next_readable_page(st.session_state.curr_page)
+    page = st.session_state.curr_page
 
-# --- JS ĐỌC TỪNG CÂU (CHỐNG NGẮT QUÃNG) ---
-def mobile_speak_smooth(text):
-    # Lọc ký tự gây lỗi
-    safe_text = text.replace('\\', '').replace('"', '').replace("'", "").replace('\n', ' ')
-    
-    html = f"""
-    <script>
-        // 1. Hủy lệnh cũ
-        window.speechSynthesis.cancel();
-        
-        // 2. Chia văn bản thành mảng các câu (Dựa vào dấu . ! ? ;)
-        var fullText = "{safe_text}";
-        // Regex này tách câu nhưng giữ lại dấu câu để đọc có ngữ điệu
-        var sentences = fullText.match(/[^.!?]+[.!?]+|[^.!?]+$/g);
-        
-        if (!sentences || sentences.length === 0) {{
-            sentences = [fullText]; // Nếu không chia được thì đọc cả cục
-        }}
-
-        var currentIndex = 0;
-
-        function playNextChunk() {{
-            // NẾU ĐÃ ĐỌC HẾT CÁC CÂU -> BẤM NEXT TRANG
-            if (currentIndex >= sentences.length) {{
-                console.log("Xong trang. Chuyển tiếp...");
-                var buttons = window.parent.document.getElementsByTagName('button');
-                for (var i = 0; i < buttons.length; i++) {{
-                    if (buttons[i].innerText.toUpperCase().includes("TIẾP THEO")) {{
-                        buttons[i].click(); return;
-                    }}
-                }}
-                return;
-            }}
-
-            var chunk = sentences[currentIndex];
-            if (!chunk || chunk.trim().length === 0) {{
-                currentIndex++; playNextChunk(); return;
-            }}
-
-            // TẠO LỆNH ĐỌC CHO CÂU HIỆN TẠI
-            var msg = new SpeechSynthesisUtterance();
-            msg.text = chunk;
-            msg.lang = 'vi-VN';
-            msg.rate = 1.0; 
-
-            var voices = window.speechSynthesis.getVoices();
-            var vn = voices.find(v => v.lang.includes('vi'));
-            if (vn) msg.voice = vn;
-
-            // QUAN TRỌNG: Đọc xong câu này -> Gọi lại hàm để đọc câu sau
-            msg.onend = function(e) {{
-                currentIndex++;
-                playNextChunk(); 
-            }};
-            
-            // Nếu lỗi câu này -> Bỏ qua đọc câu sau luôn
-            msg.onerror = function(e) {{
-                console.log("Lỗi chunk, skip...");
-                currentIndex++;
-                playNextChunk();
-            }};
-
-            window.speechSynthesis.speak(msg);
-        }}
-        
-        // --- CHỜ LOAD GIỌNG RỒI MỚI ĐỌC ---
-        if (window.speechSynthesis.getVoices().length === 0) {{
-            window.speechSynthesis.addEventListener('voiceschanged', function() {{
-                playNextChunk();
-            }});
-        }} else {{
-            playNextChunk();
-        }}
-        
-        // --- ANTI SLEEP (GIỮ KẾT NỐI) ---
-        if (window.speechInterval) clearInterval(window.speechInterval);
-        window.speechInterval = setInterval(function() {{
-            if (window.speechSynthesis.speaking) {{
-                window.speechSynthesis.pause();
-                window.speechSynthesis.resume();
-            }}
-        }}, 8000);
-
-    </script>
-    """
-    components.html(html, height=0)
+    # Trang đổi trong fragment: job OCR cả cuốn cũng ưu tiên lại từ đây
+    book_job = bookjob.get_job(pdf, "lite", page) if bookjob.BOOK_JOB_ENABLED else None
+
+    # Đo thời gian từng bước của trang (cache, render, OCR...) -> log, /metrics, bảng debug
+    with metrics.page_trace("get_page_lite", page) as page_trace:
+        img, text, chunks = get_page_lite(pdf, pdf.digest, page)
+        page_trace.add_payload("image", len(img or b""))
+
+    if img:
+        st.image(img, caption=f"Trang {page} / {total}", use_container_width=True)
+
+    # --- XỬ LÝ ĐỌC ---
+    if st.session_state.auto:
+        st.toast(f"🔊 Đang đọc trang {page}...")
+        # Gửi sẵn chữ của vài trang sau đã OCR xong: component đọc hết trang này thì tự sang trang
+        # (trang OCR ra rỗng thì bỏ qua luôn), không phải chờ server
+        queue = reading_queue(pdf, page, lambda n: get_page_lite(pdf, pdf.digest, n)[2],
+                              ready=book_job.is_done if book_job else None)
+        page_trace.add_payload("speech", len(json.dumps(queue, ensure_ascii=False).encode()))
+        browser_reader(queue, page)
+
+        # Hiển thị text mờ mờ bên dưới để biết nó đang đọc cái gì
+        if chunks:
+            with st.expander("Xem văn bản đang đọc"):
+                st.write(text)
+
+# --- TÌM TRONG SÁCH ---
+# Tìm trên chỉ mục các trang đã OCR (pdfvoice.search), gõ không dấu vẫn ra; bấm kết quả để nhảy
+# tới trang đó. Fragment: gõ chữ tìm không rerun cả trang (không OCR / render lại trang đang đọc)
+@st.fragment
+def show_search(pdf):
+    query = st.text_input("🔎 Tìm trong sách", placeholder="vd: duong cach mang")
+    if not query:
+        return
+    results = search.search(pdf.digest, query)
+    st.caption(f"{len(results)} kết quả · tìm trên {search.indexed_count(pdf.digest)}/{pdf.page_count} trang đã OCR")
+    for index, result in enumerate(results):
+        if st.button(f"Trang {result['page']}", key=f"search-{index}-{result['page']}"):
+            st.session_state.curr_page = result["page"]
+            # Rerun cả app: ô số trang, nút, trình đọc theo trang mới
+            st.rerun()
+        st.markdown(result["snippet"])
 
 # --- GIAO DIỆN CHÍNH ---
 st.set_page_config(page_title="PDF Smooth V30", layout="centered")
+# Đặt PDF_VOICE_METRICS_PORT (vd 8503) để xem thời gian từng bước ở http://127.0.0.1:<cổng>/metrics
+metrics.start_metrics_server()
 
 st.markdown("<h3 style='text-align: center;'>📱 PDF Smooth (V30)</h3>", unsafe_allow_html=True)
 
@@ -140,10 +113,17 @@ if uploaded_file:
     if 'curr_page' not in st.session_state: st.session_state.curr_page = 1
     if 'auto' not in st.session_state: st.session_state.auto = False
 
-    doc = fitz.open(stream=uploaded_file.read(), filetype="pdf")
-    total = doc.page_count
-    uploaded_file.seek(0)
-    bytes_data = uploaded_file.read()
+    # Mở file một lần cho cả phiên: rerun không đọc lại / băm lại cả file
+    pdf = get_document(st.session_state, uploaded_file)
+    total = pdf.page_count
+
+    # Auto: trang trắng / trang ngăn cách / trang chỉ có hình thì nhảy qua ngay trong lượt chạy này
+    # (kiểm tra trên ảnh ~50 dpi, không OCR, không ngủ, không rerun thêm)
+    if st.session_state.auto:
+        st.session_state.curr_page = pdf.next_readable_page(st.session_state.curr_page)
+
+    with st.expander("🔎 Tìm trong sách"):
+        show_search(pdf)
 
     # --- CHỌN TRANG ---
     st.write("---")
@@ -190,24 +170,15 @@ if uploaded_file:
             st.rerun()
 
     # --- HIỂN THỊ ẢNH ---
-    img, text = get_page_lite(bytes_data, st.session_state.curr_page)
-    
-    if img:
-        st.image(img, use_container_width=True)
-    
-    # --- XỬ LÝ ĐỌC ---
-    if st.session_state.auto:
-        # ÉP ĐỌC: Kể cả ít chữ cũng đọc
-        if text:
-            st.toast(f"🔊 Đang đọc trang {st.session_state.curr_page}...")
-            mobile_speak_smooth(text)
-            
-            # Hiển thị text mờ mờ bên dưới để biết nó đang đọc cái gì
-            with st.expander("Xem văn bản đang đọc"):
-                st.write(text)
-        else:
-            st.warning("Trang trắng. Chuyển trang...")
-            time.sleep(1)
-            if st.session_state.curr_page < total:
-                st.session_state.curr_page += 1
-                st.rerun()
+    # Cả cuốn được OCR trước trong nền: trang đang đọc, các trang sau rồi phần còn lại (pdfvoice.bookjob)
+    if bookjob.BOOK_JOB_ENABLED:
+        book_job = bookjob.get_job(pdf, "lite", st.session_state.curr_page)
+        with st.sidebar:
+            show_book_progress(book_job)
+
+    show_page(pdf)
+
+    # Bảng thời gian xử lý các trang gần nhất (bật bằng PDF_VOICE_DEBUG_PANEL=1)
+    if metrics.DEBUG_PANEL:
+        with st.sidebar.expander("🐞 Thời gian xử lý", expanded=True):
+            st.dataframe(metrics.recent(), use_container_width=True)
@@ -0,0 +1 @@
+# Các thành phần dùng chung cho các bản app đọc PDF (app.py, ver.py, v3/v3.py, ...)
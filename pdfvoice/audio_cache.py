@@ -0,0 +1,140 @@
+"""
+Cache mp3 theo nội dung: khoá = sha256(chữ đã chuẩn hoá, giọng, tốc độ).
+Đọc lại trang cũ không gọi edge-tts nữa; thư mục có giới hạn dung lượng và
+xoá file lâu không dùng nhất (LRU) khi vượt.
+"""
+import hashlib
+import os
+import threading
+import unicodedata
+import uuid
+from collections import OrderedDict
+
+from pdfvoice import metrics
+from pdfvoice.store import CACHE_DIR
+
+# Dung lượng tối đa (MB) của thư mục âm thanh
+AUDIO_CACHE_MB = int(os.environ.get("PDF_VOICE_AUDIO_CACHE_MB", "512"))
+
+
+def normalize_text(text):
+    # Cùng một câu nhưng khác khoảng trắng / dạng dấu (NFC, NFD) vẫn trúng cache
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+def audio_key(text, voice, rate):
+    raw = "\x00".join((normalize_text(text), voice, rate))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    def __init__(self, directory=None, max_bytes=AUDIO_CACHE_MB * 1024 * 1024):
+        self.directory = directory or os.path.join(CACHE_DIR, "audio")
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Nạp lại file đã có từ lần chạy trước, cũ nhất đứng đầu
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".mp3"):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._bytes += size
+        with self._lock:
+            self._evict()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key + ".mp3")
+
+    def get(self, text, voice, rate):
+        key = audio_key(text, voice, rate)
+        path = self.path_for(key)
+        with self._lock:
+            if key in self._entries and os.path.exists(path):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.count_cache("audio", True)
+                os.utime(path)
+                return path
+            if key in self._entries:
+                # Tiến trình khác đã xoá file
+                self._bytes -= self._entries.pop(key)
+            self.misses += 1
+            metrics.count_cache("audio", False)
+            return None
+
+    def temp_path(self):
+        # File tạm nằm cùng thư mục để os.replace là thao tác nguyên tử
+        return os.path.join(self.directory, f".tmp-{uuid.uuid4().hex}.mp3.part")
+
+    def put_file(self, text, voice, rate, source_path):
+        key = audio_key(text, voice, rate)
+        path = self.path_for(key)
+        os.replace(source_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)
+            self._entries[key] = size
+            self._bytes += size
+            self._evict(keep=key)
+        return path
+
+    async def get_or_synthesize(self, text, voice, rate, synthesize):
+        """synthesize(output_file) là coroutine tạo mp3; chỉ được gọi khi cache trượt."""
+        path = self.get(text, voice, rate)
+        if path:
+            return path
+        tmp = self.temp_path()
+        try:
+            await synthesize(tmp)
+            return self.put_file(text, voice, rate, tmp)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _evict(self, keep=None):
+        while self._bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            self._bytes -= self._entries.pop(key)
+            self.evictions += 1
+            try:
+                os.remove(self.path_for(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "files": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_audio_cache():
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = AudioCache()
+        return _CACHE
@@ -0,0 +1,184 @@
+"""
+Phục vụ file mp3 trong cache âm thanh qua HTTP (có hỗ trợ Range), để trình phát
+chỉ cần một URL thay vì nhúng cả file base64 vào HTML mỗi lần rerun.
+
+PDF_VOICE_AUDIO_SERVING:
+    static   (mặc định) hardlink file vào thư mục static/audio cạnh app, Streamlit tự phục vụ ở
+             /app/static/audio/<tên> (server.enableStaticServing trong .streamlit/config.toml):
+             cùng cổng, cùng origin nên chạy được sau HTTPS / reverse proxy / Streamlit Cloud.
+             App chưa bật static serving, hoặc không hardlink được (cache ở ổ đĩa khác) -> inline
+    inline   nhúng base64 như cũ
+    external thư mục cache đã được web server khác phục vụ cùng origin với app (nginx...)
+             ở địa chỉ PDF_VOICE_AUDIO_URL
+    http     bật máy chủ nhỏ trong tiến trình, cổng PDF_VOICE_AUDIO_PORT (8502), HTTP thường.
+             Chỉ nghe trên 127.0.0.1 (trình duyệt cùng máy) trừ khi đặt PDF_VOICE_AUDIO_HOST
+"""
+import functools
+import os
+import re
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+AUDIO_SERVING = os.environ.get("PDF_VOICE_AUDIO_SERVING", "static")
+# Đặt tay (vd 0.0.0.0) mới mở cổng ra ngoài máy; mặc định chỉ trình duyệt trên cùng máy vào được
+AUDIO_HOST = os.environ.get("PDF_VOICE_AUDIO_HOST")
+AUDIO_PORT = int(os.environ.get("PDF_VOICE_AUDIO_PORT", "8502"))
+# Địa chỉ công khai của thư mục cache (ví dụ https://doc.example.com/audio)
+AUDIO_URL = os.environ.get("PDF_VOICE_AUDIO_URL")
+
+# Chỉ phục vụ file tên dạng <sha256>.mp3 (tên theo nội dung -> cache vĩnh viễn được)
+AUDIO_NAME = re.compile(r"^/([0-9a-f]{64}\.mp3)$")
+# Đường dẫn Streamlit phục vụ thư mục static/audio của app
+STATIC_URL = "/app/static/audio"
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+class AudioRequestHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _serve(self, send_body):
+        match = AUDIO_NAME.match(self.path.split("?", 1)[0])
+        path = os.path.join(self.directory, match.group(1)) if match else None
+        if not path or not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        status = 200
+        requested = self.headers.get("Range")
+        if requested:
+            parsed = RANGE.match(requested.strip())
+            if not parsed or not (parsed.group(1) or parsed.group(2)):
+                self._not_satisfiable(size)
+                return
+            if parsed.group(1):
+                start = int(parsed.group(1))
+                if parsed.group(2):
+                    end = min(int(parsed.group(2)), size - 1)
+            else:
+                # bytes=-N: N byte cuối
+                start = max(0, size - int(parsed.group(2)))
+            if start > end:
+                self._not_satisfiable(size)
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        self.end_headers()
+        if not send_body:
+            return
+
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Trình duyệt tua / đóng kết nối giữa chừng
+                    return
+                remaining -= len(data)
+
+    def _not_satisfiable(self, size):
+        self.send_response(416)
+        self.send_header("Content-Range", f"bytes */{size}")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+_SERVER = None
+_LOCAL_HOSTS = {"localhost", "127.0.0.1", "[::1]"}
+_SERVER_LOCK = threading.Lock()
+
+
+def start_audio_server(directory, host=AUDIO_HOST or "127.0.0.1", port=AUDIO_PORT):
+    """Bật máy chủ (một lần cho cả tiến trình). Cổng đã bị chiếm thì coi như đã có người phục vụ."""
+    global _SERVER
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            handler = functools.partial(AudioRequestHandler, directory=directory)
+            try:
+                _SERVER = ThreadingHTTPServer((host, port), handler)
+            except OSError:
+                _SERVER = False
+                return None
+            _SERVER.daemon_threads = True
+            threading.Thread(target=_SERVER.serve_forever, name="pdf-audio-http", daemon=True).start()
+        return _SERVER or None
+
+
+def _prune_static(target_dir):
+    # File chỉ còn một tên = cache âm thanh đã xoá bản của nó (LRU) -> xoá nốt, giữ đúng hạn mức đĩa
+    for entry in os.scandir(target_dir):
+        try:
+            if entry.name.endswith(".mp3") and entry.stat().st_nlink == 1:
+                os.remove(entry.path)
+        except OSError:
+            continue
+
+
+def publish_static(file_path, static_dir):
+    """
+    Hardlink file mp3 của cache vào static_dir/audio (không tốn thêm chỗ), trả về URL cùng origin
+    /app/static/audio/<tên>; None nếu không link được (khác ổ đĩa, hệ file không hỗ trợ...).
+    """
+    target_dir = os.path.join(static_dir, "audio")
+    name = os.path.basename(file_path)
+    target = os.path.join(target_dir, name)
+    if not os.path.exists(target):
+        try:
+            os.makedirs(target_dir, exist_ok=True)
+            _prune_static(target_dir)
+            os.link(file_path, target)
+        except FileExistsError:
+            pass
+        except OSError:
+            return None
+    return f"{STATIC_URL}/{name}"
+
+
+def audio_url(file_path, cache_dir, request_host=None, static_dir=None):
+    """
+    URL của file mp3 nếu nó nằm trong thư mục cache và đang có chế độ phục vụ qua HTTP,
+    ngược lại None (bên gọi quay về nhúng base64).
+    static_dir: thư mục static/ của app, chỉ truyền khi Streamlit đang bật server.enableStaticServing.
+    """
+    if AUDIO_SERVING == "inline" or not file_path:
+        return None
+    if os.path.dirname(os.path.abspath(file_path)) != os.path.abspath(cache_dir):
+        return None
+    name = os.path.basename(file_path)
+    if AUDIO_SERVING == "static":
+        return publish_static(file_path, static_dir) if static_dir else None
+    if AUDIO_URL:
+        base = AUDIO_URL.rstrip("/")
+    elif AUDIO_SERVING == "http":
+        start_audio_server(cache_dir)
+        # Không ghi http/https -> theo giao thức của trang; host theo địa chỉ người dùng đang mở
+        host = request_host or "localhost"
+        if not host.endswith("]"):
+            host = host.rsplit(":", 1)[0]
+        # Máy chủ chỉ nghe trên 127.0.0.1 mà người dùng mở app từ máy khác -> không tới được, nhúng base64
+        if not AUDIO_HOST and host not in _LOCAL_HOSTS:
+            return None
+        base = f"//{host}:{AUDIO_PORT}"
+    else:
+        return None
+    return f"{base}/{name}"
@@ -0,0 +1,222 @@
+"""
+Xử lý trước cả thư mục PDF ngoài Streamlit (chạy tay hoặc bằng cron):
+
+    python -m pdfvoice.batch sach/ out/ --ocr-workers 4 --tts-workers 4
+
+Mỗi cuốn sách ra một thư mục out/<tên file>/ gồm pages/0001.txt, audio/0001.mp3
+và manifest.json. Chạy lại thì chỉ làm tiếp các trang còn thiếu.
+Chữ OCR cũng được ghi vào kho chung (pdfvoice.store) nên app mở sách là có ngay.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz  # PyMuPDF
+
+from pdfvoice import cleanup, core
+from pdfvoice.store import pdf_fingerprint
+
+MANIFEST = "manifest.json"
+
+
+# --- MANIFEST ---
+def load_manifest(book_dir):
+    path = os.path.join(book_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(book_dir, manifest):
+    # Ghi ra file tạm rồi đổi tên -> bị ngắt giữa chừng cũng không hỏng manifest
+    path = os.path.join(book_dir, MANIFEST)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def manifest_stamp(artifacts_dir):
+    """Lần sửa manifest mới nhất trong artifacts_dir (đổi khi batch thêm sách / thêm trang)."""
+    stamp = 0
+    if not artifacts_dir or not os.path.isdir(artifacts_dir):
+        return stamp
+    for name in os.listdir(artifacts_dir):
+        try:
+            stamp = max(stamp, os.stat(os.path.join(artifacts_dir, name, MANIFEST)).st_mtime_ns)
+        except OSError:
+            continue
+    return stamp
+
+
+def manifest_index(artifacts_dir):
+    """
+    Đọc mọi manifest một lần: {(vân tay, giọng, tốc độ): {trang: đường dẫn mp3}}.
+    App giữ chỉ mục này (theo manifest_stamp) thay vì mở lại từng manifest mỗi trang.
+    """
+    index = {}
+    if not artifacts_dir or not os.path.isdir(artifacts_dir):
+        return index
+    for name in os.listdir(artifacts_dir):
+        book_dir = os.path.join(artifacts_dir, name)
+        manifest = load_manifest(book_dir)
+        if not manifest:
+            continue
+        key = (manifest.get("fingerprint"), manifest.get("voice"), manifest.get("rate"))
+        pages = index.setdefault(key, {})
+        for page, entry in manifest["pages"].items():
+            if entry.get("audio"):
+                pages[int(page)] = os.path.join(book_dir, entry["audio"])
+    return index
+
+
+def find_precomputed_audio(index, fingerprint, page_number, voice, rate):
+    """Tìm file mp3 đã tạo sẵn cho trang (cùng sách, cùng giọng, cùng tốc độ) trong manifest_index."""
+    path = index.get((fingerprint, voice, rate), {}).get(page_number)
+    if path and os.path.exists(path):
+        return path
+    return None
+
+
+# --- XỬ LÝ MỘT CUỐN ---
+def _ocr_pages(pdf_bytes, fingerprint, pages, ocr_workers, zoom, contrast):
+    # fitz.Document không an toàn khi dùng chung giữa các luồng -> mỗi luồng mở một bản
+    local = threading.local()
+
+    def work(page_number):
+        if not hasattr(local, "doc"):
+            local.doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        page = local.doc.load_page(page_number - 1)
+        try:
+            return page_number, core.page_text(page, fingerprint, page_number, zoom=zoom, contrast=contrast)
+        except Exception as e:
+            # Trang lỗi không ghi vào manifest -> lần chạy sau làm lại
+            print(f"  ! Trang {page_number}: lỗi OCR ({e})", file=sys.stderr)
+            return page_number, None
+
+    with ThreadPoolExecutor(max_workers=ocr_workers) as pool:
+        for page_number, text in pool.map(work, pages):
+            if text is not None:
+                yield page_number, text
+
+
+async def _synthesize_pages(jobs, tts_workers, voice, rate):
+    limit = asyncio.Semaphore(tts_workers)
+
+    async def one(page_number, text, output_file):
+        async with limit:
+            try:
+                ok = await core.synthesize(text, output_file, voice=voice, rate=rate)
+            except Exception as e:
+                print(f"  ! Trang {page_number}: lỗi TTS ({e})", file=sys.stderr)
+                return page_number, None
+            return page_number, ok
+
+    return await asyncio.gather(*(one(*job) for job in jobs))
+
+
+def process_book(pdf_path, out_dir, ocr_workers=2, tts_workers=4, voice=core.DEFAULT_VOICE,
+                 rate=core.DEFAULT_RATE, zoom=core.DEFAULT_ZOOM, contrast=core.DEFAULT_CONTRAST,
+                 audio=True):
+    with open(pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+    fingerprint = pdf_fingerprint(pdf_bytes)
+    page_count = fitz.open(stream=pdf_bytes, filetype="pdf").page_count
+
+    book_dir = os.path.join(out_dir, os.path.splitext(os.path.basename(pdf_path))[0])
+    os.makedirs(os.path.join(book_dir, "pages"), exist_ok=True)
+    os.makedirs(os.path.join(book_dir, "audio"), exist_ok=True)
+
+    manifest = load_manifest(book_dir)
+    # File PDF đã đổi nội dung hoặc đổi giọng -> làm lại từ đầu
+    if (not manifest or manifest.get("fingerprint") != fingerprint
+            or manifest.get("voice") != voice or manifest.get("rate") != rate):
+        manifest = {
+            "source": os.path.abspath(pdf_path),
+            "fingerprint": fingerprint,
+            "page_count": page_count,
+            "voice": voice,
+            "rate": rate,
+            "ocr": {"zoom": zoom, "contrast": contrast, "lang": core.OCR_LANG},
+            "pages": {},
+        }
+    pages = manifest["pages"]
+    started = time.time()
+
+    # Bước 1: chữ
+    todo = [n for n in range(1, page_count + 1) if str(n) not in pages]
+    for page_number, text in _ocr_pages(pdf_bytes, fingerprint, todo, ocr_workers, zoom, contrast):
+        rel = os.path.join("pages", f"{page_number:04d}.txt")
+        with open(os.path.join(book_dir, rel), "w", encoding="utf-8") as f:
+            f.write(text)
+        pages[str(page_number)] = {"text": rel, "chars": len(text.strip()), "audio": None}
+        save_manifest(book_dir, manifest)
+        print(f"  Trang {page_number}/{page_count}: {len(text.strip())} ký tự")
+
+    # Bước 2: âm thanh (trang trắng giữ audio = None)
+    if audio:
+        # Làm sạch cả cuốn một lượt: header / footer lặp lại được tìm trên mọi trang (pdfvoice.cleanup)
+        texts = {}
+        for key, entry in pages.items():
+            with open(os.path.join(book_dir, entry["text"]), encoding="utf-8") as f:
+                texts[int(key)] = f.read()
+        cleaned = cleanup.clean_document(texts)
+        jobs = []
+        for key, entry in pages.items():
+            text = cleaned[int(key)]
+            if entry["audio"] or len(text) < 2:
+                continue
+            rel = os.path.join("audio", f"{int(key):04d}.mp3")
+            jobs.append((int(key), text, os.path.join(book_dir, rel)))
+        for page_number, ok in asyncio.run(_synthesize_pages(jobs, tts_workers, voice, rate)):
+            if ok:
+                pages[str(page_number)]["audio"] = os.path.join("audio", f"{page_number:04d}.mp3")
+        save_manifest(book_dir, manifest)
+
+    print(f"Xong {os.path.basename(pdf_path)}: {page_count} trang, {time.time() - started:.1f}s")
+    return manifest
+
+
+def process_directory(input_dir, out_dir, **options):
+    results = {}
+    for name in sorted(os.listdir(input_dir)):
+        if name.lower().endswith(".pdf"):
+            print(f"== {name}")
+            results[name] = process_book(os.path.join(input_dir, name), out_dir, **options)
+    return results
+
+
+# --- DÒNG LỆNH ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Xử lý trước thư mục PDF thành chữ + mp3 từng trang")
+    parser.add_argument("input_dir", help="Thư mục chứa các file PDF")
+    parser.add_argument("out_dir", help="Thư mục ghi kết quả")
+    parser.add_argument("--ocr-workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--tts-workers", type=int, default=4, help="Số yêu cầu edge-tts chạy song song")
+    parser.add_argument("--voice", default=core.DEFAULT_VOICE)
+    parser.add_argument("--rate", default=core.DEFAULT_RATE)
+    parser.add_argument("--zoom", type=float, default=core.DEFAULT_ZOOM)
+    parser.add_argument("--contrast", type=float, default=core.DEFAULT_CONTRAST)
+    parser.add_argument("--no-audio", action="store_true", help="Chỉ OCR, không tạo mp3")
+    args = parser.parse_args(argv)
+
+    core.setup_tesseract()
+    process_directory(
+        args.input_dir, args.out_dir,
+        ocr_workers=args.ocr_workers, tts_workers=args.tts_workers,
+        voice=args.voice, rate=args.rate, zoom=args.zoom, contrast=args.contrast,
+        audio=not args.no_audio
+    )
+
+
+if __name__ == "__main__":
+    main()
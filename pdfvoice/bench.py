@@ -0,0 +1,261 @@
+"""
+Đo cả đường đi của một trang trên bộ PDF tổng hợp (pdfvoice.corpus), ở từng mức zoom các app đang dùng:
+
+    python -m pdfvoice.bench --pages 12 --json ket_qua.json
+    python -m pdfvoice.bench --corpus bench_corpus/ --compare ket_qua_cu.json
+
+Các bước được bấm giờ riêng: open (mở file / load_page), render, preprocess, ocr, cleanup, tts
+(edge-tts trỏ vào máy chủ giả lập pdfvoice.fake_tts, không cần mạng). Mỗi mức zoom báo số trang/giây,
+p50 / p95 từng bước, RSS cao nhất và tỉ lệ lỗi ký tự (CER) so với chữ đúng của bộ PDF.
+--compare: so với lần đo trước, trả mã lỗi 1 nếu CER tăng quá --max-cer-increase
+(để tối ưu tốc độ không âm thầm làm OCR kém đi).
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+import unicodedata
+
+import edge_tts.communicate
+import fitz  # PyMuPDF
+import numpy as np
+
+from pdfvoice import core, corpus, fake_tts, ocr_engine, preprocess, render
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Các mức đang dùng: mobile*.py 1.2, mobile-v6 1.5, app / ver / v3 2.0, app3 300 dpi
+SETTINGS = (("1.2", 1.2), ("1.5", 1.5), ("2.0", 2.0), ("300dpi", 300 / 72))
+STAGES = ("open", "render", "preprocess", "ocr", "cleanup", "tts")
+
+
+# --- ĐỘ CHÍNH XÁC ---
+def normalize(text):
+    # So chữ chứ không so cách xuống dòng / khoảng trắng; dấu tiếng Việt về dạng dựng sẵn (NFC)
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def edit_distance(a, b):
+    """Khoảng cách Levenshtein theo ký tự, mỗi hàng của bảng quy hoạch động tính bằng NumPy."""
+    if not a:
+        return len(b)
+    if not b:
+        return len(a)
+    codes = np.array([ord(c) for c in b])
+    offsets = np.arange(len(b) + 1)
+    row = offsets.copy()
+    for i, char in enumerate(a, 1):
+        new = np.empty_like(row)
+        new[0] = i
+        # Thay thế / xoá
+        new[1:] = np.minimum(row[:-1] + (codes != ord(char)), row[1:] + 1)
+        # Chèn: new[j] = min(new[j], new[j-1] + 1) <=> cộng dồn min của new[j] - j
+        row = np.minimum.accumulate(new - offsets) + offsets
+    return int(row[-1])
+
+
+def char_error_rate(expected, actual):
+    expected, actual = normalize(expected), normalize(actual)
+    return edit_distance(expected, actual) / max(len(expected), 1)
+
+
+# --- THỐNG KÊ ---
+def percentile(values, q):
+    # Hạng gần nhất: p95 của 12 trang là trang chậm thứ 12
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def peak_rss_mb():
+    """RSS cao nhất của tiến trình này tính đến lúc gọi (MB); None nếu hệ điều hành không hỗ trợ."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux báo KB, macOS báo byte
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def clean_text(text):
+    # Giống phần làm sạch chữ của các app trước khi đọc
+    return " ".join(text.replace("|", "").split())
+
+
+# --- CHẠY ĐO ---
+def run_setting(pdf_bytes, truth, zoom, contrast=core.DEFAULT_CONTRAST, tts=True,
+                voice=core.DEFAULT_VOICE, rate=core.DEFAULT_RATE):
+    """Đo mọi trang ở một mức zoom; trả về dict timings (giây, theo bước), cer, ocr_error, seconds."""
+    timings = {stage: [] for stage in STAGES}
+    cer = {}
+    ocr_error = None
+    workdir = tempfile.TemporaryDirectory(prefix="pdfvoice-bench-")
+    started = time.perf_counter()
+
+    start = time.perf_counter()
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    open_seconds = time.perf_counter() - start
+
+    for index, expected in enumerate(truth):
+        start = time.perf_counter()
+        page = doc.load_page(index)
+        timings["open"].append(open_seconds + time.perf_counter() - start)
+        open_seconds = 0.0
+
+        start = time.perf_counter()
+        pix = render.ocr_pixmap(page, zoom)
+        timings["render"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        image = preprocess.to_image(preprocess.enhance_contrast(preprocess.to_gray(pix), contrast))
+        timings["preprocess"].append(time.perf_counter() - start)
+        del pix
+
+        text = None
+        if ocr_error is None:
+            try:
+                start = time.perf_counter()
+                raw = ocr_engine.image_to_string(image, lang=core.OCR_LANG, config=core.OCR_CONFIG)
+                timings["ocr"].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                text = clean_text(raw)
+                timings["cleanup"].append(time.perf_counter() - start)
+                cer.setdefault(expected["kind"], []).append(char_error_rate(expected["text"], text))
+            except Exception as e:
+                # Không có Tesseract / tessdata: vẫn đo các bước còn lại
+                ocr_error = str(e)
+
+        if tts:
+            # OCR không chạy được thì đọc chữ đúng của trang, để vẫn đo được bước TTS
+            speech = text if text is not None else clean_text(expected["text"])
+            start = time.perf_counter()
+            asyncio.run(core.synthesize(speech, os.path.join(workdir.name, f"{index + 1:04d}.mp3"), voice, rate))
+            timings["tts"].append(time.perf_counter() - start)
+
+    seconds = time.perf_counter() - started
+    workdir.cleanup()
+    return {"timings": timings, "cer": cer, "ocr_error": ocr_error, "seconds": seconds}
+
+
+def summarize(result, pages):
+    summary = {
+        "pages": pages,
+        "pages_per_sec": pages / result["seconds"] if result["seconds"] else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": {},
+        "cer": None,
+        "cer_by_kind": {kind: statistics.mean(values) for kind, values in result["cer"].items()},
+        "ocr_error": result["ocr_error"],
+    }
+    for stage, values in result["timings"].items():
+        if values:
+            summary["stages"][stage] = {"p50_ms": percentile(values, 50) * 1000,
+                                        "p95_ms": percentile(values, 95) * 1000}
+    all_cer = [value for values in result["cer"].values() for value in values]
+    if all_cer:
+        summary["cer"] = statistics.mean(all_cer)
+    return summary
+
+
+def run_benchmark(pdf_bytes, truth, settings=SETTINGS, tts=True, tts_delay=0.0):
+    if tts:
+        # edge-tts gọi máy chủ giả lập chạy nền thay cho dịch vụ thật (như PDF_VOICE_TTS_URL của pdfvoice.tts)
+        edge_tts.communicate.WSS_URL = fake_tts.serve_in_background(delay=tts_delay)
+    results = {}
+    for name, zoom in settings:
+        result = run_setting(pdf_bytes, truth, zoom, tts=tts)
+        results[name] = summarize(result, len(truth))
+        print_setting(name, results[name])
+    return results
+
+
+# --- BÁO CÁO ---
+def _fmt(value, pattern):
+    return pattern.format(value) if value is not None else "-"
+
+
+def print_setting(name, summary):
+    print(f"== zoom {name}: {_fmt(summary['pages_per_sec'], '{:.2f}')} trang/giây, "
+          f"RSS cao nhất {_fmt(summary['peak_rss_mb'], '{:.0f}')} MB, CER {_fmt(summary['cer'], '{:.3f}')}")
+    for stage in STAGES:
+        if stage in summary["stages"]:
+            times = summary["stages"][stage]
+            print(f"   {stage:10s} p50 {times['p50_ms']:8.1f} ms   p95 {times['p95_ms']:8.1f} ms")
+    for kind, value in sorted(summary["cer_by_kind"].items()):
+        print(f"   CER {kind:8s} {value:.3f}")
+    if summary["ocr_error"]:
+        print(f"   OCR không chạy được: {summary['ocr_error']}")
+
+
+def compare(results, baseline, max_cer_increase):
+    """In chênh lệch so với lần đo trước; trả về False nếu CER của mức nào tăng quá ngưỡng."""
+    ok = True
+    for name, summary in results.items():
+        old = baseline.get("settings", {}).get(name)
+        if not old:
+            continue
+        line = f"zoom {name}:"
+        if summary["pages_per_sec"] and old.get("pages_per_sec"):
+            line += f" tốc độ {summary['pages_per_sec'] / old['pages_per_sec'] - 1:+.0%}"
+        if summary["cer"] is not None and old.get("cer") is not None:
+            delta = summary["cer"] - old["cer"]
+            line += f", CER {delta:+.3f}"
+            if delta > max_cer_increase:
+                line += "  <-- CER TĂNG QUÁ NGƯỠNG"
+                ok = False
+        print(line)
+    return ok
+
+
+# --- DÒNG LỆNH ---
+def load_corpus(corpus_dir):
+    with open(os.path.join(corpus_dir, "corpus.pdf"), "rb") as f:
+        pdf_bytes = f.read()
+    with open(os.path.join(corpus_dir, "truth.json"), encoding="utf-8") as f:
+        return pdf_bytes, json.load(f)["pages"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo tốc độ / độ chính xác OCR + TTS trên bộ PDF tổng hợp")
+    parser.add_argument("--corpus", help="Thư mục tạo bằng pdfvoice.corpus (mặc định: tạo trong bộ nhớ)")
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--zoom", action="append", choices=[name for name, _ in SETTINGS],
+                        help="Chỉ đo mức này (lặp lại được); mặc định đo tất cả")
+    parser.add_argument("--no-tts", action="store_true", help="Bỏ bước TTS")
+    parser.add_argument("--tts-delay", type=float, default=0.0, help="Giây trễ mỗi ký tự của máy chủ TTS giả lập")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON (để so sánh lần sau)")
+    parser.add_argument("--compare", help="File JSON của lần đo trước")
+    parser.add_argument("--max-cer-increase", type=float, default=0.005)
+    args = parser.parse_args(argv)
+
+    core.setup_tesseract()
+    if args.corpus:
+        pdf_bytes, truth = load_corpus(args.corpus)
+    else:
+        pdf_bytes, truth = corpus.build_corpus(args.pages, args.seed)
+    settings = [(name, zoom) for name, zoom in SETTINGS if not args.zoom or name in args.zoom]
+
+    results = run_benchmark(pdf_bytes, truth, settings, tts=not args.no_tts, tts_delay=args.tts_delay)
+    report = {"corpus": args.corpus or {"pages": args.pages, "seed": args.seed}, "settings": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.max_cer_increase):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Đo thời gian OCR mỗi trang của từng backend (pdfvoice.ocr_engine) trên cùng một bộ ảnh:
+
+    python -m pdfvoice.bench_ocr sach.pdf --pages 10
+
+Ảnh được render + làm nét trước (giống core.page_text) nên chỉ đo riêng phần OCR.
+"""
+import argparse
+import statistics
+import sys
+import time
+
+import fitz  # PyMuPDF
+
+from pdfvoice import core, ocr_engine, preprocess, render
+
+BACKENDS = ("pytesseract", "tesserocr")
+
+
+def prepare_images(pdf_path, pages, zoom=core.DEFAULT_ZOOM, contrast=core.DEFAULT_CONTRAST):
+    doc = fitz.open(pdf_path)
+    images = []
+    for index in range(min(pages, doc.page_count)):
+        gray = preprocess.to_gray(render.ocr_pixmap(doc.load_page(index), zoom))
+        images.append(preprocess.to_image(preprocess.enhance_contrast(gray, contrast)))
+    return images
+
+
+def time_backend(backend, images, config=core.OCR_CONFIG, warmup=1):
+    """Trả về danh sách số giây mỗi trang (bỏ qua các lần chạy nóng máy đầu tiên)."""
+    for image in images[:warmup]:
+        ocr_engine.image_to_string(image, lang=core.OCR_LANG, config=config, backend=backend)
+    timings = []
+    for image in images:
+        start = time.perf_counter()
+        ocr_engine.image_to_string(image, lang=core.OCR_LANG, config=config, backend=backend)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="So sánh thời gian OCR mỗi trang giữa các backend")
+    parser.add_argument("pdf", help="File PDF dùng để đo (nên là sách scan)")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--zoom", type=float, default=core.DEFAULT_ZOOM)
+    parser.add_argument("--contrast", type=float, default=core.DEFAULT_CONTRAST)
+    parser.add_argument("--warmup", type=int, default=1, help="Số trang chạy trước, không tính giờ")
+    args = parser.parse_args(argv)
+
+    core.setup_tesseract()
+    images = prepare_images(args.pdf, args.pages, args.zoom, args.contrast)
+    if not images:
+        print("PDF không có trang nào")
+        return 1
+
+    results = {}
+    for backend in BACKENDS:
+        try:
+            results[backend] = time_backend(backend, images, warmup=args.warmup)
+        except Exception as e:
+            print(f"{backend}: không chạy được ({e})")
+
+    for backend, timings in results.items():
+        print(f"{backend:12s} {len(timings)} trang  trung bình {statistics.mean(timings) * 1000:8.1f} ms/trang"
+              f"  trung vị {statistics.median(timings) * 1000:8.1f} ms")
+
+    if len(results) == len(BACKENDS):
+        old = statistics.mean(results["pytesseract"])
+        new = statistics.mean(results["tesserocr"])
+        print(f"Tiết kiệm {(old - new) * 1000:.1f} ms/trang ({(1 - new / old) * 100:.0f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Nhận diện trang trắng / trang ngăn cách / trang chỉ có hình trước khi chạy Tesseract.
+
+Trước đây trang trắng vẫn render ở zoom OCR, qua đủ các mức của thang rồi mới biết không có chữ;
+bản auto còn ngủ 1 giây và rerun thêm một lượt để sang trang. Ở đây chỉ tốn:
+  1. get_bboxlog: trang không vẽ gì cả -> trắng, không render,
+  2. một ảnh xám ~50 dpi (vài trăm KB) bỏ lề giấy: đếm tỉ lệ điểm có mực và điểm xám trung gian,
+     tính theo màu nền của chính trang đó (giấy ngả vàng / scan tối vẫn là nền, không phải mực).
+Kết quả "bỏ qua" không ghi vào kho chữ (textlayer.read_page_result): sửa cách nhận diện thì trang
+bị bỏ nhầm trước đây được OCR lại.
+"""
+import fitz  # PyMuPDF
+import numpy as np
+
+from pdfvoice import metrics, preprocess
+
+# Độ phân giải ảnh kiểm tra: đủ thấy dòng chữ, render chỉ vài ms
+CHECK_DPI = 50
+# Bỏ lề giấy (bóng gáy sách, mép scan, số trang) mỗi cạnh theo tỉ lệ kích thước trang
+BORDER = 0.06
+# Màu nền = phân vị này của độ sáng trong trang (chữ / hình hiếm khi phủ quá nửa trang)
+BACKGROUND_PERCENTILE = 90
+# Điểm tối hơn nền * INK_RATIO coi là có mực (nền trắng 245 -> 220 như trước)
+INK_RATIO = 0.9
+# Ít mực hơn mức này: trang trắng (chỉ có vài vết bẩn)
+BLANK_INK = 0.002
+# Trang ngăn cách ("PHẦN II", hoa văn): ít mực, dồn trong một dải hẹp không nằm ở đầu trang.
+# Trang cuối chương vài dòng thì mực nằm ở đầu trang -> vẫn OCR.
+SEPARATOR_INK = 0.01
+SEPARATOR_SPAN = 0.2
+SEPARATOR_TOP = 0.25
+# Ảnh chụp / hình minh hoạ phủ trang: nhiều điểm xám trung gian; trang chữ (kể cả chữ nhỏ
+# bị làm mờ ở 50 dpi) chỉ khoảng 0.08-0.2
+IMAGE_MIDTONE = 0.35
+# Dải xám trung gian, theo tỉ lệ với màu nền (nền trắng 245 -> 64..192 như trước)
+MIDTONE_LOW = 0.26
+MIDTONE_HIGH = 0.78
+
+# Các loại trang không cần OCR / đọc: auto bỏ qua luôn
+SKIP_KINDS = ("blank", "separator", "image")
+
+
+@metrics.timed("classify")
+def classify_page(page):
+    """
+    Phân loại trang trước khi OCR. Trả về dict kind ('blank', 'separator', 'image', 'text'),
+    ink (tỉ lệ điểm có mực), midtone (tỉ lệ điểm xám trung gian), background (màu nền 0-255).
+    """
+    result = {"kind": "blank", "ink": 0.0, "midtone": 0.0, "background": 255.0}
+    if not page.get_bboxlog():
+        return result
+
+    pix = page.get_pixmap(dpi=CHECK_DPI, colorspace=fitz.csGRAY, alpha=False)
+    gray = preprocess.pixmap_array(pix)[:, :, 0]
+    height, width = gray.shape
+    top, left = int(height * BORDER), int(width * BORDER)
+    inner = gray[top:height - top, left:width - left]
+    if not inner.size:
+        return result
+
+    background = float(np.percentile(inner, BACKGROUND_PERCENTILE))
+    ink = inner < background * INK_RATIO
+    result["background"] = background
+    result["ink"] = np.count_nonzero(ink) / inner.size
+    result["midtone"] = np.count_nonzero((inner >= background * MIDTONE_LOW)
+                                         & (inner < background * MIDTONE_HIGH)) / inner.size
+
+    if result["ink"] < BLANK_INK:
+        return result
+    if result["midtone"] > IMAGE_MIDTONE:
+        result["kind"] = "image"
+        return result
+    if result["ink"] < SEPARATOR_INK:
+        rows = np.flatnonzero(ink.any(axis=1))
+        span = (rows[-1] - rows[0] + 1) / inner.shape[0]
+        if span < SEPARATOR_SPAN and rows[0] > inner.shape[0] * SEPARATOR_TOP:
+            result["kind"] = "separator"
+            return result
+    result["kind"] = "text"
+    return result
@@ -0,0 +1,218 @@
+"""
+OCR trước cả cuốn sách trong nền ngay khi mở file, ưu tiên quanh chỗ đang đọc:
+
+    job = bookjob.get_job(pdf, "desktop", current_page)    # mỗi lần rerun
+    st.progress(..., text=bookjob.progress_text(job.progress()))
+
+Thứ tự: trang đang đọc, các trang sau nó, rồi đến các trang trước. Mỗi trang xong được ghi ngay
+vào kho (pdfvoice.store) nên kho chính là checkpoint: job bị ngắt (restart, bị job khác chiếm chỗ)
+thì lần sau chỉ làm các trang còn thiếu. Trang đang đọc mà job chưa tới thì app tự OCR như cũ,
+không chờ job; job và app cùng làm một trang thì chờ chung một lần (pdfvoice.shared_cache).
+Xong cả cuốn thì làm sạch chữ một lượt (pdfvoice.cleanup.clean_book).
+Mỗi (sách, hồ sơ) chỉ có một job trong cả tiến trình: nhiều người đọc cùng cuốn dùng chung.
+Mọi job cộng lại chỉ OCR tối đa BOOK_WORKERS trang cùng lúc; tổng số lần OCR cùng lúc của cả tiến
+trình (kể cả trang đang đọc, đọc trước) còn bị ocr_engine.OCR_SLOTS chặn trên.
+"""
+import os
+import threading
+import time
+from itertools import chain
+
+import fitz  # PyMuPDF
+
+from pdfvoice import cleanup, metrics, profiles, search
+from pdfvoice.store import get_store
+
+# --- CẤU HÌNH ---
+BOOK_JOB_ENABLED = os.environ.get("PDF_VOICE_BOOK_JOB", "1") == "1"
+# Số trang OCR cùng lúc của mọi job cộng lại (Tesseract chạy ngoài GIL, mỗi lần một luồng);
+# chừa một nửa số nhân cho trang đang đọc + đọc trước
+BOOK_WORKERS = int(os.environ.get("PDF_VOICE_BOOK_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Số job chạy cùng lúc; quá số này thì dừng job lâu không ai đọc tới (chạy tiếp được nhờ checkpoint)
+MAX_JOBS = int(os.environ.get("PDF_VOICE_BOOK_JOBS", "2"))
+# Thanh tiến độ trong app tự cập nhật mỗi chừng này giây
+PROGRESS_SECONDS = float(os.environ.get("PDF_VOICE_BOOK_PROGRESS_SECONDS", "2"))
+
+# Lượt OCR dùng chung cho mọi job: MAX_JOBS job không thành MAX_JOBS x BOOK_WORKERS luồng Tesseract
+_BOOK_SLOTS = threading.BoundedSemaphore(max(1, BOOK_WORKERS))
+
+
+class BookJob:
+    def __init__(self, pdf_bytes, fingerprint, page_count, profile, workers=BOOK_WORKERS):
+        self.pdf_bytes = pdf_bytes
+        self.fingerprint = fingerprint
+        self.page_count = page_count
+        self.profile = profiles.resolve_profile(profile)
+        self.params = profiles.profile_params(self.profile)
+        self.workers = max(1, workers)
+        self.resumed = 0
+        self.started = None
+        self.last_focus = time.monotonic()
+        self._focus = 1
+        self._done = set()
+        self._running = set()
+        self._failed = {}
+        self._cleaned = False
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self.started is not None:
+                return self
+            # Resume: các trang đã có trong kho (lần chạy trước, người đọc khác, pdfvoice.batch) bỏ qua
+            self._done.update(get_store().pages_done(self.fingerprint, self.params))
+            self.resumed = len(self._done)
+            self.started = time.monotonic()
+            # Cả cuốn đã có trong kho thì không tạo luồng, không mở lại PDF
+            if len(self._done) < self.page_count:
+                for index in range(self.workers):
+                    thread = threading.Thread(target=self._work, name=f"pdf-book-{index}", daemon=True)
+                    self._threads.append(thread)
+                    thread.start()
+        if not self._threads:
+            self._clean_book()
+        return self
+
+    def focus(self, page_number):
+        # Người đọc nhảy trang -> trang chọn tiếp theo tính lại từ đây
+        with self._lock:
+            self._focus = min(max(1, page_number), self.page_count)
+            self.last_focus = time.monotonic()
+
+    def is_done(self, page_number):
+        # Trang đã có trong kho: lấy ra không phải chờ OCR
+        with self._lock:
+            return page_number in self._done
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def _next_page(self):
+        # Trang đang đọc -> các trang sau -> các trang trước (gọi khi đang giữ _lock)
+        for page_number in chain(range(self._focus, self.page_count + 1), range(1, self._focus)):
+            if page_number not in self._done and page_number not in self._running \
+                    and page_number not in self._failed:
+                self._running.add(page_number)
+                return page_number
+        return None
+
+    def _work(self):
+        doc = None
+        while not self._stop.is_set():
+            with self._lock:
+                page_number = self._next_page()
+            if page_number is None:
+                break
+            if doc is None:
+                # fitz.Document không dùng chung giữa các luồng được -> mỗi luồng mở một bản
+                doc = fitz.open(stream=self.pdf_bytes, filetype="pdf")
+            try:
+                with _BOOK_SLOTS, metrics.page_trace("book_job", page_number, prefetch=True):
+                    profiles.read_text(doc.load_page(page_number - 1), self.fingerprint, page_number, self.profile)
+            except Exception as e:
+                # Trang lỗi không làm lại trong lần chạy này (không có trong kho -> lần sau thử lại)
+                with self._lock:
+                    self._running.discard(page_number)
+                    self._failed[page_number] = str(e)
+                continue
+            with self._lock:
+                self._running.discard(page_number)
+                self._done.add(page_number)
+        if doc is not None:
+            doc.close()
+        self._clean_book()
+
+    def _clean_book(self):
+        # Luồng xong sau cùng: làm sạch cả cuốn một lượt (header / footer tìm trên mọi trang, pdfvoice.cleanup)
+        with self._lock:
+            if self._cleaned or self._running or self._stop.is_set() \
+                    or len(self._done) + len(self._failed) < self.page_count:
+                return
+            self._cleaned = True
+            # Job xong vẫn nằm trong _JOBS (không còn luồng nào) -> bỏ bản PDF, chỉ giữ tiến độ
+            self.pdf_bytes = None
+        # Chỉ mục tìm kiếm cũng lấy bản sạch (bỏ header / footer, chữ gạch nối đã nối lại)
+        cleaned = cleanup.clean_book(self.fingerprint, self.params)
+        if cleaned:
+            search.index_pages(self.fingerprint, cleaned)
+
+    def progress(self):
+        """dict total, done, failed, running, pages_per_sec, eta_seconds, finished."""
+        with self._lock:
+            done, failed, running = len(self._done), len(self._failed), sorted(self._running)
+        remaining = self.page_count - done - failed
+        # Tốc độ tính trên các trang làm trong lần chạy này (không tính trang resume từ kho)
+        elapsed = time.monotonic() - self.started if self.started else 0
+        processed = done - self.resumed
+        rate = processed / elapsed if processed and elapsed else None
+        return {
+            "total": self.page_count,
+            "done": done,
+            "failed": failed,
+            "running": running,
+            "pages_per_sec": rate,
+            "eta_seconds": remaining / rate if rate and remaining else None,
+            "finished": remaining == 0,
+            "stopped": self.stopped,
+        }
+
+
+def _format_seconds(seconds):
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    if minutes >= 60:
+        return f"{minutes // 60} giờ {minutes % 60} phút"
+    return f"{minutes} phút {seconds} giây" if minutes else f"{seconds} giây"
+
+
+def progress_text(progress):
+    """Dòng chữ cho thanh tiến độ: số trang xong, còn bao lâu."""
+    text = f"Đã xử lý trước {progress['done']}/{progress['total']} trang"
+    if progress["failed"]:
+        text += f" · {progress['failed']} trang lỗi"
+    if progress["finished"]:
+        return text + " · xong cả cuốn"
+    if progress["eta_seconds"] is not None:
+        text += f" · còn khoảng {_format_seconds(progress['eta_seconds'])}"
+    return text
+
+
+# --- MỖI (SÁCH, HỒ SƠ) MỘT JOB CHO CẢ TIẾN TRÌNH ---
+_JOBS = {}
+_JOBS_LOCK = threading.Lock()
+
+
+def _trim(keep):
+    # Job đã dừng thì bỏ. Job đã xong thì giữ (không còn luồng, rerun / thanh tiến độ gọi lại get_job
+    # không phải tra kho, mở PDF, làm sạch lại); quá MAX_JOBS job đang chạy thì dừng job cũ nhất
+    for key, job in list(_JOBS.items()):
+        if key != keep and job.stopped:
+            del _JOBS[key]
+    active = sorted((job.last_focus, key) for key, job in _JOBS.items()
+                    if key != keep and not job.progress()["finished"])
+    while active and len(active) + 1 > MAX_JOBS:
+        _, key = active.pop(0)
+        _JOBS.pop(key).stop()
+
+
+def get_job(pdf, profile, page_number=1, workers=BOOK_WORKERS):
+    """
+    Job OCR cả cuốn của pdf (documents.OpenDocument) theo hồ sơ profile, đang chạy trong nền;
+    tạo mới nếu chưa có. page_number: trang người dùng đang đọc (ưu tiên làm trước).
+    """
+    profile = profiles.resolve_profile(profile)
+    key = (pdf.digest, profiles.profile_params(profile))
+    with _JOBS_LOCK:
+        job = _JOBS.get(key)
+        if job is None or job.stopped:
+            job = _JOBS[key] = BookJob(pdf.pdf_bytes, pdf.digest, pdf.page_count, profile, workers)
+        job.focus(page_number)
+        _trim(key)
+    if BOOK_JOB_ENABLED:
+        job.start()
+    return job
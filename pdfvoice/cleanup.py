@@ -0,0 +1,232 @@
+"""
+Làm sạch chữ OCR trước khi đọc: trước đây chỉ bỏ xuống dòng và ký tự "|", nên giọng đọc vẫn phải
+đọc cả chữ bị gạch nối cuối dòng, tên sách / tên chương lặp ở đầu mỗi trang, số trang và ký tự rác.
+
+  - drop_garbage: ngay sau OCR, bỏ các "từ" Tesseract không chắc mà trông không giống chữ
+    (độ tin cậy từng từ của ocr_engine.recognize, không tốn thêm lượt OCR),
+  - clean_page: NFC, bỏ số trang / header / footer ở mép trang, nối chữ bị gạch nối cuối dòng,
+    nối các dòng của một đoạn (đoạn cách nhau một dòng trống),
+  - clean_document: cả cuốn một lượt; header / footer là dòng ở mép trang lặp lại trên nhiều trang
+    (số trong dòng coi như nhau: "Chương 3 · 41" và "Chương 3 · 42" là một); dòng chỉ có số trang
+    ("12", "- 12 -", "xiv", "Trang 12") chỉ bỏ khi trang gần đó cũng đánh số cùng kiểu, khớp thứ tự
+    (dòng "di", "mi" một mình là chữ, không phải số La Mã).
+
+Kho (pdfvoice.store) vẫn giữ chữ OCR gốc. Chữ sạch của cả cuốn được ghi riêng (clean_book, khi
+job OCR cả cuốn xong); trang đọc lúc cả cuốn chưa xong thì làm sạch ngay với các header đã thấy.
+"""
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+from pdfvoice import metrics
+from pdfvoice.store import get_store
+
+# Đổi cách làm sạch thì tăng số này: chữ sạch đã ghi trong kho được làm lại
+CLEAN_VERSION = 2
+# Từ có độ tin cậy (0-100) dưới mức này mà không giống chữ thì bỏ
+DROP_CONF = float(os.environ.get("PDF_VOICE_OCR_DROP_CONF", "40"))
+# Số dòng ở đầu / cuối trang được xét là header / footer
+EDGE_LINES = 2
+# Dòng mép trang lặp lại trên ít nhất chừng này trang thì coi là header / footer
+MIN_REPEAT = int(os.environ.get("PDF_VOICE_BOILERPLATE_PAGES", "3"))
+# Header / footer là dòng ngắn; dòng dài hơn là chữ của bài dù có lặp lại
+MAX_EDGE_CHARS = 80
+# Số trang phải khớp thứ tự với trang cách xa nhiều nhất chừng này (sách scan hay thiếu số ở
+# trang mở chương)
+FOLIO_NEIGHBOURS = 2
+
+# Số trang đứng riêng một dòng: "12", "- 12 -", "12/300", "Trang 12", "xiv" (số La Mã đúng luật,
+# viết thường, kẻo lẫn tiêu đề "I")
+_PAGE_NUMBER = re.compile(r"^(\W*)(\d{1,4})(\s*/\s*\d{1,4})?(\W*)$")
+_PAGE_WORD = re.compile(r"^(\W*(?:trang|tr\.?|page)\s*)(\d{1,4})(\W*)$", re.I)
+_PAGE_ROMAN = re.compile(r"^(\W*)(m{0,3}(?:cm|cd|d?c{0,3})(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3}))(\W*)$")
+_ROMAN = {"i": 1, "v": 5, "x": 10, "l": 50, "c": 100, "d": 500, "m": 1000}
+_INVISIBLE = re.compile('[\u200b-\u200f\u2060\ufeff]')
+# Gạch nối mềm giữa dòng thì bỏ; cuối dòng thì là chỗ ngắt chữ
+_SOFT_HYPHEN_INSIDE = re.compile('\u00ad(?=.)')
+_HYPHENS = '-\u00ad\u2010\u2011¬'
+
+
+def _is_wordlike(token):
+    # Từ thật (kể cả có dấu câu dính hai bên) phần lớn là chữ / số
+    core = token.strip(".,;:!?…\"'“”‘’«»()[]")
+    if not core:
+        return False
+    return sum(c.isalnum() for c in core) / len(core) >= 0.6
+
+
+def drop_garbage(text, confidences, min_conf=DROP_CONF):
+    """
+    Bỏ các từ độ tin cậy dưới min_conf mà không giống chữ. confidences: của từng từ theo thứ tự
+    (ocr_engine.recognize); số từ không khớp với chữ (engine tách từ khác) thì giữ nguyên chữ.
+    """
+    words = [c for c in confidences if c >= 0]
+    tokens = re.split(r"(\s+)", text)
+    if len(words) != sum(1 for token in tokens[::2] if token):
+        return text
+    conf = iter(words)
+    kept = []
+    for i, token in enumerate(tokens):
+        if i % 2 == 0 and token and next(conf) < min_conf and not _is_wordlike(token):
+            token = ""
+        kept.append(token)
+    # Bỏ từ để lại khoảng trắng thừa trong dòng; giữ nguyên xuống dòng
+    return "\n".join(" ".join(line.split()) for line in "".join(kept).split("\n"))
+
+
+def _lines(text):
+    # NFC (Tesseract / lớp chữ PDF hay cho dấu tổ hợp rời), bỏ ký tự vô hình và "|" (đường kẻ đọc nhầm)
+    text = unicodedata.normalize("NFC", _INVISIBLE.sub("", text)).replace("|", " ")
+    text = _SOFT_HYPHEN_INSIDE.sub("", text)
+    return [" ".join(line.split()) for line in text.replace("\f", "\n").split("\n")]
+
+
+def _edge_key(line):
+    # So header không phân biệt hoa thường / dấu câu / số trang
+    return " ".join(re.sub(r"\d+", "#", re.sub(r"[^\w\s]", " ", line.lower())).split())
+
+
+def _edge_indexes(lines):
+    # Dòng đầu / cuối có chữ hoặc số (vết bẩn ở mép không tính)
+    filled = [i for i, line in enumerate(lines) if any(c.isalnum() for c in line)]
+    return set(filled[:EDGE_LINES] + filled[-EDGE_LINES:])
+
+
+def _roman_value(numeral):
+    values = [_ROMAN[c] for c in numeral]
+    return sum(-v if i + 1 < len(values) and v < values[i + 1] else v for i, v in enumerate(values))
+
+
+def _folio(line):
+    """Dòng chỉ có số trang -> (kiểu, số): "- 12 -" -> ("- # -", 12), "xiv" -> ("r", 14); không thì None."""
+    match = _PAGE_NUMBER.match(line)
+    if match:
+        return match.group(1) + "#" + (match.group(3) or "") + match.group(4), int(match.group(2))
+    match = _PAGE_WORD.match(line)
+    if match:
+        return match.group(1).lower() + "#" + match.group(3), int(match.group(2))
+    match = _PAGE_ROMAN.match(line)
+    if match and match.group(2):
+        return match.group(1) + "r" + match.group(3), _roman_value(match.group(2))
+    return None
+
+
+def _folio_key(folio, page_number):
+    # Cùng kiểu và cùng độ lệch so với số trang trong file: "12" ở trang 20 khớp "13" ở trang 21
+    return ("folio", folio[0], folio[1] - page_number)
+
+
+def find_boilerplate(texts):
+    """
+    Header / footer của texts ({trang: chữ}): khoá dòng (_edge_key) lặp ở mép trang trên ít nhất
+    MIN_REPEAT trang, và kiểu đánh số trang (_folio_key) gặp lại ở trang cách không quá FOLIO_NEIGHBOURS.
+    """
+    counts = Counter()
+    folios = {}
+    for page_number, text in texts.items():
+        lines = _lines(text)
+        for i in _edge_indexes(lines):
+            folio = _folio(lines[i])
+            if folio is not None:
+                folios.setdefault(_folio_key(folio, page_number), set()).add(page_number)
+        counts.update({_edge_key(lines[i]) for i in _edge_indexes(lines)
+                       if len(lines[i]) <= MAX_EDGE_CHARS and _folio(lines[i]) is None})
+    keys = {key for key, count in counts.items() if count >= MIN_REPEAT}
+    for key, pages in folios.items():
+        pages = sorted(pages)
+        if any(b - a <= FOLIO_NEIGHBOURS for a, b in zip(pages, pages[1:])):
+            keys.add(key)
+    return frozenset(keys)
+
+
+def _is_boilerplate(line, boilerplate, page_number):
+    folio = _folio(line)
+    if folio is not None:
+        return page_number is not None and _folio_key(folio, page_number) in boilerplate
+    return _edge_key(line) in boilerplate
+
+
+def _join(previous, line):
+    # Chữ bị gạch nối cuối dòng: "Nguy-" + "ễn" -> "Nguyễn"; "Mác-" + "Lênin" giữ gạch nối
+    if previous[-1] in _HYPHENS and len(previous) > 1 and previous[-2].isalpha() and line[0].isalpha():
+        if line[0].islower() or previous[-1] == "\u00ad":
+            return previous[:-1] + line
+        return previous[:-1] + "-" + line
+    return previous + " " + line
+
+
+def clean_page(text, boilerplate=frozenset(), page_number=None):
+    """
+    Chữ OCR của một trang -> các đoạn (cách nhau một dòng trống), mỗi đoạn một dòng.
+    boilerplate: của find_boilerplate; số trang chỉ bỏ được khi biết page_number (trang mấy trong file).
+    """
+    lines = _lines(text)
+    edges = _edge_indexes(lines)
+    paragraphs, current = [], ""
+    for i, line in enumerate(lines):
+        if i in edges and _is_boilerplate(line, boilerplate, page_number):
+            continue
+        # Dòng toàn ký hiệu (vết bẩn, đường kẻ, "~~ —") không đọc
+        if line and not any(c.isalnum() for c in line):
+            continue
+        if not line:
+            if current:
+                paragraphs.append(current)
+                current = ""
+            continue
+        current = _join(current, line) if current else line
+    if current:
+        paragraphs.append(current)
+    return "\n\n".join(paragraphs)
+
+
+def clean_document(texts):
+    """{trang: chữ OCR} của cả cuốn -> {trang: chữ sạch}; header / footer tìm trên tất cả các trang."""
+    boilerplate = find_boilerplate(texts)
+    return {page: clean_page(text, boilerplate, page) for page, text in texts.items()}
+
+
+# --- HEADER / FOOTER ĐÃ THẤY CỦA MỖI CUỐN (cả cuốn chưa OCR xong) ---
+_KNOWN = {}
+_KNOWN_LOCK = threading.Lock()
+
+
+def known_boilerplate(fingerprint, params):
+    """Header / footer tìm trên các trang đã có trong kho; tính lại khi số trang trong kho gấp đôi."""
+    store = get_store()
+    with _KNOWN_LOCK:
+        pages, boilerplate = _KNOWN.get((fingerprint, params), (0, frozenset()))
+    done = len(store.pages_done(fingerprint, params))
+    if done >= max(2 * pages, MIN_REPEAT) and done > pages:
+        boilerplate = find_boilerplate(store.texts(fingerprint, params))
+        with _KNOWN_LOCK:
+            _KNOWN[(fingerprint, params)] = (done, boilerplate)
+    return boilerplate
+
+
+def clean_book(fingerprint, params):
+    """
+    Làm sạch cả cuốn từ kho (các trang đã có) rồi ghi chữ sạch vào kho; trả về {trang: chữ sạch}.
+    Đã làm rồi (đủ trang, cùng CLEAN_VERSION) thì thôi (trả về dict rỗng).
+    """
+    store = get_store()
+    if store.clean_count(fingerprint, params, CLEAN_VERSION) >= len(store.pages_done(fingerprint, params)):
+        return {}
+    texts = store.texts(fingerprint, params)
+    boilerplate = find_boilerplate(texts)
+    cleaned = {page: clean_page(text, boilerplate, page) for page, text in texts.items()}
+    store.put_clean(fingerprint, params, CLEAN_VERSION, cleaned)
+    with _KNOWN_LOCK:
+        _KNOWN[(fingerprint, params)] = (len(texts), boilerplate)
+    return cleaned
+
+
+@metrics.timed("cleanup")
+def cleaned_text(fingerprint, page_number, params, text):
+    """Chữ sạch của một trang: bản làm theo cả cuốn nếu đã có, không thì làm ngay với header đã thấy."""
+    cached = get_store().lookup_clean(fingerprint, page_number, params, CLEAN_VERSION)
+    if cached is not None:
+        return cached
+    return clean_page(text, known_boilerplate(fingerprint, params), page_number)
@@ -0,0 +1,124 @@
+// Đọc các đoạn câu Python đã tách sẵn (pdfvoice.speech) bằng giọng của trình duyệt.
+// File tĩnh, trình duyệt cache lại; component giữ nguyên (không nạp lại iframe) giữa các lần rerun.
+//   args = {pages: [{page, chunks}, ...] trang đang đọc + vài trang kế tiếp đã có chữ,
+//           page: trang app muốn đọc, ack: seq của lần báo cuối app đã xử lý, rate: tốc độ}
+// Đọc hết một trang thì tự sang trang kế trong hàng đợi (không bấm nút, không rerun cả app) rồi báo
+// vị trí lên Python: {seq, page, chunk, done}; done = đọc hết trang mà hàng đợi chưa có trang sau.
+(function () {
+  var synth = window.speechSynthesis;
+  // seq bắt đầu từ thời điểm mở: component gắn lại (dừng rồi đọc tiếp) không trùng seq cũ
+  var state = {pages: [], page: null, index: 0, rate: 1.0, token: 0, seq: Date.now(), sent: null};
+
+  function send(type, data) {
+    var message = {isStreamlitMessage: true, type: type};
+    for (var name in data) message[name] = data[name];
+    window.parent.postMessage(message, "*");
+  }
+
+  function report(done) {
+    state.seq++;
+    state.sent = state.seq;
+    send("streamlit:setComponentValue", {
+      value: {seq: state.seq, page: state.page, chunk: state.index, done: done},
+      dataType: "json"
+    });
+  }
+
+  function position(page) {
+    for (var i = 0; i < state.pages.length; i++) {
+      if (state.pages[i].page === page) return i;
+    }
+    return -1;
+  }
+
+  function vietnameseVoice() {
+    var voices = synth.getVoices();
+    for (var i = 0; i < voices.length; i++) {
+      if (voices[i].lang.indexOf("vi") === 0) return voices[i];
+    }
+    return null;
+  }
+
+  function finishPage() {
+    // Sang trang kế trong hàng đợi; trang OCR ra rỗng thì bỏ qua luôn
+    var at = position(state.page);
+    while (at !== -1 && at + 1 < state.pages.length) {
+      at++;
+      state.page = state.pages[at].page;
+      state.index = 0;
+      if (state.pages[at].chunks.length) {
+        play(state.page);
+        report(false);
+        return;
+      }
+    }
+    // Hết hàng đợi (trang sau chưa OCR xong): báo lên, app lấy trang đó rồi gửi xuống
+    report(true);
+  }
+
+  function speakNext(token) {
+    // Đã sang trang khác trong lúc chờ: bỏ lượt đọc cũ
+    if (token !== state.token) return;
+    var at = position(state.page);
+    var chunks = at !== -1 ? state.pages[at].chunks : [];
+    if (state.index >= chunks.length) {
+      finishPage();
+      return;
+    }
+    var msg = new SpeechSynthesisUtterance(chunks[state.index]);
+    msg.lang = "vi-VN";
+    msg.rate = state.rate;
+    var voice = vietnameseVoice();
+    if (voice) msg.voice = voice;
+    // Đọc xong (hoặc lỗi) đoạn này -> đoạn sau
+    msg.onend = msg.onerror = function () {
+      if (token !== state.token) return;
+      state.index++;
+      speakNext(token);
+    };
+    synth.speak(msg);
+  }
+
+  function play(page) {
+    synth.cancel();
+    state.token++;
+    state.page = page;
+    state.index = 0;
+    var token = state.token;
+    if (synth.getVoices().length) {
+      speakNext(token);
+    } else {
+      // Giọng chưa nạp xong (lần đầu mở trang)
+      synth.addEventListener("voiceschanged", function ready() {
+        synth.removeEventListener("voiceschanged", ready);
+        speakNext(token);
+      });
+    }
+  }
+
+  function render(args) {
+    state.pages = args.pages || [];
+    state.rate = args.rate || 1.0;
+    // Lần báo cuối app chưa xử lý xong (lượt chạy này bắt đầu trước đó): chỉ nhận hàng đợi mới,
+    // không nghe theo args.page cũ kẻo bị kéo lùi về trang vừa đọc xong
+    if (state.sent !== null && args.ack !== state.sent) return;
+    // Cùng trang (rerun vì bấm nút khác, app vừa nhận vị trí...) thì đọc tiếp; trang khác = người
+    // dùng nhảy trang, hoặc trang app vừa lấy xong sau khi component báo done
+    if (args.page !== state.page) play(args.page);
+  }
+
+  window.addEventListener("message", function (event) {
+    if (event.data && event.data.type === "streamlit:render") render(event.data.args);
+  });
+
+  // Chrome tự dừng đọc sau ~15 giây nếu không pause / resume
+  setInterval(function () {
+    if (synth.speaking) {
+      synth.pause();
+      synth.resume();
+    }
+  }, 8000);
+
+  send("streamlit:componentReady", {apiVersion: 1});
+  send("streamlit:setFrameHeight", {height: 0});
+})();
@@ -0,0 +1,53 @@
+import shutil
+import sys
+
+import edge_tts
+import pytesseract
+
+from pdfvoice import cleanup, ocr_engine, preprocess, render
+from pdfvoice.store import ocr_params
+from pdfvoice.textlayer import read_page_text
+
+# --- THAM SỐ MẶC ĐỊNH (GIỐNG app.py) ---
+OCR_LANG = 'vie'
+OCR_CONFIG = r'--oem 3 --psm 6'
+DEFAULT_ZOOM = 2.0
+DEFAULT_CONTRAST = 2.0
+DEFAULT_VOICE = "vi-VN-HoaiMyNeural"
+DEFAULT_RATE = "+15%"
+
+
+def setup_tesseract():
+    # Cùng logic tự dò đường dẫn như các app Streamlit
+    if sys.platform.startswith('win'):
+        path = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+    else:
+        path = shutil.which("tesseract")
+    if path:
+        pytesseract.pytesseract.tesseract_cmd = path
+    return path
+
+
+def page_text(page, fingerprint, page_number, zoom=DEFAULT_ZOOM, contrast=DEFAULT_CONTRAST, image=None):
+    """
+    Chữ của một trang: kho trên đĩa -> lớp chữ của PDF -> OCR.
+    Tham số OCR trùng với app.py nên kết quả chạy ngoài (CLI) được app dùng lại.
+    """
+    def run_ocr():
+        # image: ảnh PIL đã render sẵn (nếu có); không thì render pixmap xám vùng có chữ
+        gray = preprocess.to_gray(image if image is not None else render.ocr_pixmap(page, zoom))
+        img_ocr = preprocess.to_image(preprocess.enhance_contrast(gray, contrast))
+        # Bỏ luôn từ rác Tesseract không chắc (pdfvoice.cleanup)
+        return cleanup.drop_garbage(*ocr_engine.recognize(img_ocr, lang=OCR_LANG, config=OCR_CONFIG))
+
+    params = ocr_params(zoom=zoom, psm=6, prep=f"contrast-{contrast}", lang=OCR_LANG)
+    return read_page_text(page, fingerprint, page_number, params, run_ocr)
+
+
+async def synthesize(text, output_file, voice=DEFAULT_VOICE, rate=DEFAULT_RATE):
+    # Trang gần như trống thì không gọi edge-tts
+    if not text or len(text.strip()) < 2:
+        return False
+    communicate = edge_tts.Communicate(text, voice, rate=rate)
+    await communicate.save(output_file)
+    return True
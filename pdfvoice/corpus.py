@@ -0,0 +1,160 @@
+"""
+Bộ PDF tiếng Việt tổng hợp (luôn giống hệt nhau với cùng seed) để đo tốc độ / độ chính xác:
+
+    python -m pdfvoice.corpus bench_corpus/ --pages 12 --seed 0
+
+Ra corpus.pdf và truth.json (chữ đúng của từng trang). Các loại trang xoay vòng theo KINDS:
+  - digital: sách điện tử, có lớp chữ,
+  - scan: trang digital render thành ảnh xám, thêm nhiễu, nghiêng nhẹ, nén JPEG (không có lớp chữ),
+  - columns: trang scan hai cột (chữ đúng = hết cột trái rồi đến cột phải),
+  - blank: trang scan giấy trắng có nhiễu.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+KINDS = ("digital", "scan", "columns", "blank")
+
+# Âm tiết hay gặp, đủ các dấu thanh và chữ ă â đ ê ô ơ ư
+VOCABULARY = (
+    "người việt nam đọc sách ở thư viện những ngày mưa bánh mì nướng thơm lừng trên phố "
+    "cũ hà nội sài gòn huế đà nẵng cần thơ quê hương đất nước con đường làng mùa xuân hạ "
+    "thu đông gió mùa đông bắc trời trong xanh biển rộng sông dài núi cao rừng sâu cánh đồng "
+    "lúa chín vàng tiếng chuông chùa xa xăm học trò thầy giáo bài giảng lịch sử văn học "
+    "khoa học kỹ thuật máy tính điện thoại ứng dụng giọng nói nhận dạng chữ viết tay "
+    "trang giấy mực in cuốn tiểu thuyết truyện ngắn bài thơ câu ca dao tục ngữ ông bà cha mẹ "
+    "anh chị em gia đình bữa cơm chiều nồi canh chua cá kho tộ phở bò bún chả chè đậu xanh "
+    "nhưng vì thế cho nên tuy nhiên hơn nữa dường như có lẽ chắc chắn luôn luôn đôi khi "
+    "suy nghĩ hiểu biết nhớ thương mong đợi trở về ra đi gặp gỡ chia tay hạnh phúc buồn vui"
+).split()
+
+# Chữ trong PDF: để MuPDF tự lấy font có dấu tiếng Việt (Noto) qua insert_htmlbox
+CSS = "* {font-family: serif; font-size: %.1fpt; line-height: 1.35;}"
+FONT_SIZE = 11.0
+MARGIN = 56
+COLUMN_GAP = 28
+# Trang "scan": độ phân giải, độ lệch chuẩn nhiễu, góc nghiêng tối đa (độ), chất lượng JPEG
+SCAN_DPI = 200
+SCAN_NOISE = 12.0
+SCAN_SKEW = 1.5
+SCAN_QUALITY = 80
+PAPER = 238
+
+
+def sentence(rng):
+    words = rng.choices(VOCABULARY, k=rng.randint(6, 16))
+    if len(words) > 8 and rng.random() < 0.5:
+        words[rng.randint(3, len(words) - 3)] += ","
+    return " ".join(words).capitalize() + rng.choice(".....?!")
+
+
+def paragraphs(rng, count, sentences=(3, 6)):
+    return [" ".join(sentence(rng) for _ in range(rng.randint(*sentences))) for _ in range(count)]
+
+
+def _html(paras):
+    return "".join(f"<p>{para}</p>" for para in paras)
+
+
+def _fill(page, rect, paras):
+    """Chèn các đoạn vào rect, bớt đoạn cuối đến khi vừa; trả về các đoạn thực sự nằm trên trang."""
+    while paras:
+        spare, scale = page.insert_htmlbox(rect, _html(paras), css=CSS % FONT_SIZE, scale_low=1)
+        if spare >= 0:
+            return paras
+        paras = paras[:-1]
+    return paras
+
+
+def _digital_page(doc, rng, columns=1):
+    page = doc.new_page()
+    width, height = page.rect.width, page.rect.height
+    column_width = (width - 2 * MARGIN - (columns - 1) * COLUMN_GAP) / columns
+    texts = []
+    for column in range(columns):
+        x0 = MARGIN + column * (column_width + COLUMN_GAP)
+        rect = fitz.Rect(x0, MARGIN, x0 + column_width, height - MARGIN)
+        texts.extend(_fill(page, rect, paragraphs(rng, 8 // columns + 2)))
+    return page, "\n\n".join(texts)
+
+
+def scan_image(gray, rng):
+    """Ảnh xám sạch -> ảnh giống trang scan: giấy ngả xám, nhiễu, nghiêng nhẹ. Trả về bytes JPEG."""
+    noise_rng = np.random.default_rng(rng.randrange(2 ** 32))
+    paper = np.where(gray > 250, PAPER, gray).astype(np.float32)
+    paper += noise_rng.normal(0, SCAN_NOISE, gray.shape).astype(np.float32)
+    height, width = gray.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rng.uniform(-SCAN_SKEW, SCAN_SKEW), 1.0)
+    skewed = cv2.warpAffine(np.clip(paper, 0, 255).astype(np.uint8), matrix, (width, height),
+                            flags=cv2.INTER_LINEAR, borderValue=PAPER)
+    ok, jpeg = cv2.imencode(".jpg", skewed, [cv2.IMWRITE_JPEG_QUALITY, SCAN_QUALITY])
+    return jpeg.tobytes()
+
+
+def _scan_page(doc, rng, columns=1):
+    # Dựng trang digital ở file nháp, render xám rồi chèn vào corpus như ảnh scan
+    draft = fitz.open()
+    page, text = _digital_page(draft, rng, columns)
+    pix = page.get_pixmap(dpi=SCAN_DPI, colorspace=fitz.csGRAY, alpha=False)
+    gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+    target = doc.new_page(width=page.rect.width, height=page.rect.height)
+    target.insert_image(target.rect, stream=scan_image(gray, rng))
+    return text
+
+
+def _blank_page(doc, rng):
+    page = doc.new_page()
+    gray = np.full((int(page.rect.height * SCAN_DPI / 72), int(page.rect.width * SCAN_DPI / 72)), 255, np.uint8)
+    page.insert_image(page.rect, stream=scan_image(gray, rng))
+    return ""
+
+
+def build_corpus(pages=12, seed=0, kinds=KINDS):
+    """Trả về (bytes PDF, [dict kind, text] cho từng trang). Cùng pages/seed -> cùng nội dung."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    truth = []
+    for index in range(pages):
+        kind = kinds[index % len(kinds)]
+        if kind == "digital":
+            text = _digital_page(doc, rng)[1]
+        elif kind == "scan":
+            text = _scan_page(doc, rng)
+        elif kind == "columns":
+            text = _scan_page(doc, rng, columns=2)
+        else:
+            text = _blank_page(doc, rng)
+        truth.append({"kind": kind, "text": text})
+    doc.set_metadata({"title": f"pdfvoice corpus seed={seed}", "creationDate": "", "modDate": ""})
+    return doc.tobytes(garbage=3, deflate=True, no_new_id=True), truth
+
+
+def save_corpus(out_dir, pages=12, seed=0):
+    os.makedirs(out_dir, exist_ok=True)
+    pdf_bytes, truth = build_corpus(pages, seed)
+    pdf_path = os.path.join(out_dir, "corpus.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(pdf_bytes)
+    with open(os.path.join(out_dir, "truth.json"), "w", encoding="utf-8") as f:
+        json.dump({"seed": seed, "pages": truth}, f, ensure_ascii=False, indent=1)
+    return pdf_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tạo bộ PDF tiếng Việt tổng hợp để đo OCR / TTS")
+    parser.add_argument("out_dir")
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    print(save_corpus(args.out_dir, args.pages, args.seed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
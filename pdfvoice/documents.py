@@ -0,0 +1,64 @@
+"""
+Giữ file PDF đã mở cho cả phiên làm việc: mỗi lần upload chỉ đọc bytes, băm
+sha256 và mở fitz.Document đúng một lần. Các lần rerun (bấm chuyển trang...)
+chỉ tra lại theo file_id, không copy / băm lại cả file.
+Loại trang (trắng / ngăn cách / chỉ có hình, pdfvoice.blank) cũng nhớ luôn theo file đã mở.
+"""
+import threading
+
+import fitz  # PyMuPDF
+
+from pdfvoice import blank
+from pdfvoice.store import pdf_fingerprint
+
+
+class OpenDocument:
+    def __init__(self, pdf_bytes, name=None):
+        self.pdf_bytes = pdf_bytes
+        self.name = name
+        self.digest = pdf_fingerprint(pdf_bytes)
+        self.doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        self.page_count = self.doc.page_count
+        self.metadata = self.doc.metadata
+        self._local = threading.local()
+        self._page_kinds = {}
+
+    def thread_doc(self):
+        # fitz.Document không dùng đồng thời từ nhiều luồng được (luồng rerun, luồng đọc trước)
+        # -> mỗi luồng mở một bản riêng từ cùng bytes, mở một lần rồi giữ lại
+        doc = getattr(self._local, "doc", None)
+        if doc is None:
+            doc = self._local.doc = fitz.open(stream=self.pdf_bytes, filetype="pdf")
+        return doc
+
+    def load_page(self, page_number):
+        return self.thread_doc().load_page(page_number - 1)
+
+    def page_kind(self, page_number):
+        kind = self._page_kinds.get(page_number)
+        if kind is None:
+            kind = self._page_kinds[page_number] = blank.classify_page(self.load_page(page_number))["kind"]
+        return kind
+
+    def next_readable_page(self, page_number):
+        """Trang đầu tiên từ page_number trở đi không phải trang bỏ qua; hết sách thì trả về trang cuối."""
+        while page_number < self.page_count and self.page_kind(page_number) in blank.SKIP_KINDS:
+            page_number += 1
+        return page_number
+
+
+def get_document(session_state, uploaded_file):
+    """Trả về OpenDocument của file đang upload (mở một lần cho mỗi phiên)."""
+    digests = session_state.setdefault("pdf_file_digests", {})
+    documents = session_state.setdefault("pdf_documents", {})
+
+    digest = digests.get(uploaded_file.file_id)
+    if digest is None or digest not in documents:
+        entry = OpenDocument(uploaded_file.getvalue(), name=uploaded_file.name)
+        # Chỉ giữ file đang đọc, file cũ nhả ra cho nhẹ RAM
+        digests.clear()
+        documents.clear()
+        digests[uploaded_file.file_id] = entry.digest
+        documents[entry.digest] = entry
+        return entry
+    return documents[digest]
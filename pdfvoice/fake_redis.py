@@ -0,0 +1,145 @@
+"""
+Máy chủ giả lập Redis (một phần giao thức RESP) để chạy cache OCR dùng chung khi chưa có Redis:
+
+    python -m pdfvoice.fake_redis --port 6380
+    PDF_VOICE_SHARED_CACHE=redis://127.0.0.1:6380/0 streamlit run app.py --server.port 8501
+    PDF_VOICE_SHARED_CACHE=redis://127.0.0.1:6380/0 streamlit run app.py --server.port 8502
+
+Chỉ có các lệnh pdfvoice.shared_cache dùng: PING, AUTH, SELECT, GET, SET (NX, EX, PX), DEL và
+EVAL của đúng script trả phiếu (shared_cache.RELEASE_SCRIPT, không chạy Lua thật).
+Dữ liệu nằm trong RAM của tiến trình này, tắt là mất (kho SQLite của từng bản vẫn còn).
+Trong code dùng serve_in_background() như pdfvoice.fake_tts.
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from pdfvoice.shared_cache import RELEASE_SCRIPT
+
+
+class MemoryStore:
+    def __init__(self):
+        self._data = {}
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def set(self, key, value, ttl=None, only_new=False):
+        if only_new and self.get(key) is not None:
+            return False
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+        return True
+
+    def delete_if(self, key, value):
+        # Xoá key nếu đang giữ đúng value (một lệnh, không xen được lệnh khác vào giữa)
+        if self.get(key) != value:
+            return 0
+        del self._data[key]
+        return 1
+
+    def delete(self, keys):
+        return sum(1 for key in keys if self.get(key) is not None and self._data.pop(key))
+
+
+def _bulk(value):
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _error(message):
+    return b"-ERR " + message.encode() + b"\r\n"
+
+
+def execute(store, args):
+    """Một lệnh (danh sách bytes) -> trả lời đã mã hoá RESP."""
+    name = args[0].upper().decode()
+    if name == "PING":
+        return b"+PONG\r\n"
+    if name in ("AUTH", "SELECT"):
+        # Không phân quyền / không chia database: mọi bản dùng chung một kho
+        return b"+OK\r\n"
+    if name == "GET" and len(args) == 2:
+        return _bulk(store.get(args[1]))
+    if name == "DEL" and len(args) >= 2:
+        return b":%d\r\n" % store.delete(args[1:])
+    if name == "EVAL" and len(args) == 5 and args[1].decode() == RELEASE_SCRIPT and args[2] == b"1":
+        return b":%d\r\n" % store.delete_if(args[3], args[4])
+    if name == "SET" and len(args) >= 3:
+        ttl, only_new, options = None, False, [arg.upper() for arg in args[3:]]
+        i = 0
+        while i < len(options):
+            if options[i] == b"NX":
+                only_new = True
+            elif options[i] in (b"EX", b"PX") and i + 1 < len(options):
+                ttl = int(options[i + 1]) / (1 if options[i] == b"EX" else 1000)
+                i += 1
+            else:
+                return _error("syntax error")
+            i += 1
+        return b"+OK\r\n" if store.set(args[1], args[2], ttl, only_new) else _bulk(None)
+    return _error(f"unknown command '{name}'")
+
+
+async def _read_command(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if line[:1] != b"*":
+        # Lệnh dạng dòng (gõ tay qua telnet / redis-cli --no-raw)
+        return line.split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        size = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+def make_handler(store):
+    async def handle(reader, writer):
+        try:
+            while True:
+                args = await _read_command(reader)
+                if args is None:
+                    break
+                if args:
+                    writer.write(execute(store, args))
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+def serve_in_background(host="127.0.0.1"):
+    """Chạy máy chủ giả lập trên luồng nền, cổng tự chọn; trả về URL cho PDF_VOICE_SHARED_CACHE."""
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(make_handler(MemoryStore()), host, 0))
+    port = server.sockets[0].getsockname()[1]
+    threading.Thread(target=loop.run_forever, name="fake-redis", daemon=True).start()
+    return f"redis://{host}:{port}/0"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Máy chủ Redis giả lập cho cache OCR dùng chung")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args(argv)
+
+    async def serve():
+        server = await asyncio.start_server(make_handler(MemoryStore()), args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Máy chủ TTS giả lập giao thức WebSocket của edge-tts, để chạy thử / đo tốc độ
+mà không cần mạng:
+
+    python -m pdfvoice.fake_tts --port 8765 --delay 0.002
+    PDF_VOICE_TTS_URL="ws://127.0.0.1:8765/tts?TrustedClientToken=local" streamlit run app.py
+
+Trả về các khung MP3 im lặng, độ dài tỉ lệ với số ký tự; --delay là số giây trễ
+cho mỗi ký tự (mô phỏng thời gian tổng hợp của dịch vụ thật).
+Trong code (pdfvoice.bench) dùng serve_in_background() để chạy máy chủ trên một luồng nền.
+"""
+import argparse
+import asyncio
+import re
+import threading
+import uuid
+
+from aiohttp import WSMsgType, web
+
+# Một khung MPEG-1 Layer III 128 kbps / 44.1 kHz (417 byte, ~26 ms) toàn số 0 = im lặng
+SILENT_FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+# Một khung cho mỗi ký tự ~ 400 byte/ký tự, cỡ file mp3 edge-tts trả về thật
+FRAMES_PER_CHAR = 1
+FRAMES_PER_MESSAGE = 16
+# Đếm số yêu cầu / số ký tự đã tổng hợp (cũng xem được ở /stats)
+STATS = web.AppKey("stats", dict)
+
+
+def _text_message(request_id, path, body="{}"):
+    return (f"X-RequestId:{request_id}\r\n"
+            f"Content-Type:application/json; charset=utf-8\r\n"
+            f"Path:{path}\r\n\r\n{body}")
+
+
+def _audio_message(request_id, audio):
+    header = (f"X-RequestId:{request_id}\r\n"
+              f"Content-Type:audio/mpeg\r\n"
+              f"X-StreamId:{uuid.uuid4().hex}\r\n"
+              f"Path:audio\r\n").encode()
+    return len(header).to_bytes(2, "big") + header + audio
+
+
+def _ssml_text(message):
+    # Lấy phần chữ trong <prosody>...</prosody> của yêu cầu SSML
+    match = re.search(r"<prosody[^>]*>(.*)</prosody>", message, re.S)
+    return match.group(1) if match else ""
+
+
+def make_app(delay=0.0):
+    stats = {"requests": 0, "chars": 0}
+
+    async def synthesize(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT or "Path:ssml" not in msg.data:
+                continue
+            request_id = uuid.uuid4().hex
+            text = _ssml_text(msg.data)
+            stats["requests"] += 1
+            stats["chars"] += len(text)
+
+            await ws.send_str(_text_message(request_id, "turn.start"))
+            await asyncio.sleep(delay * len(text))
+            frames = max(1, len(text) * FRAMES_PER_CHAR)
+            for start in range(0, frames, FRAMES_PER_MESSAGE):
+                count = min(FRAMES_PER_MESSAGE, frames - start)
+                await ws.send_bytes(_audio_message(request_id, SILENT_FRAME * count))
+            await ws.send_str(_text_message(request_id, "turn.end"))
+        return ws
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app[STATS] = stats
+    app.router.add_get("/tts", synthesize)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+def serve_in_background(host="127.0.0.1", delay=0.0):
+    """Chạy máy chủ giả lập trên luồng nền, cổng tự chọn; trả về URL WebSocket cho edge-tts."""
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(make_app(delay))
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, host, 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    threading.Thread(target=loop.run_forever, name="fake-tts", daemon=True).start()
+    return f"ws://{host}:{port}/tts?TrustedClientToken=local"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Máy chủ edge-tts giả lập (chạy offline)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0, help="Giây trễ cho mỗi ký tự")
+    args = parser.parse_args(argv)
+    web.run_app(make_app(args.delay), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+OCR tự động theo "thang": chạy bản rẻ trước, chỉ leo lên bản đắt khi Tesseract không chắc.
+
+Mỗi mức render + tiền xử lý + PSM khác nhau. Sau mỗi mức lấy độ tin cậy trung bình các từ
+(ocr_engine.recognize); đạt MIN_CONFIDENCE thì dừng. Đa số trang sách in rõ chỉ tốn mức đầu.
+Trang nào phải leo đến mức nào được ghi vào kho (cột rung, confidence).
+"""
+import os
+
+from pdfvoice import cleanup, layout, ocr_engine, preprocess, render
+from pdfvoice.store import ocr_params
+
+# Độ tin cậy trung bình (0-100) tối thiểu để dừng ở một mức
+MIN_CONFIDENCE = float(os.environ.get("PDF_VOICE_OCR_MIN_CONF", "70"))
+
+# Từ rẻ đến đắt. prep: ("contrast", hệ số), ("adaptive", block, c) hoặc ("binary", tương phản, ngưỡng)
+RUNGS = [
+    {"name": "fast", "zoom": 1.5, "prep": ("contrast", 1.5), "psm": 6},
+    {"name": "hires", "zoom": 3.0, "prep": ("contrast", 2.0), "psm": 6},
+    # block 31 ở zoom 3.0 ~ block 15 ở zoom 1.5 của mobile-v6
+    {"name": "opencv", "zoom": 3.0, "prep": ("adaptive", 31, 8), "psm": 6},
+    # Trang nhiều cột / bố cục lạ: tách khối chữ rồi OCR từng khối song song (pdfvoice.layout)
+    {"name": "regions", "zoom": 3.0, "prep": ("contrast", 2.0), "psm": "regions"},
+]
+
+
+def ladder_params(lang="vie", min_confidence=MIN_CONFIDENCE, rungs=RUNGS):
+    # Khoá kho cho chế độ tự động: đổi thang / ngưỡng thì OCR lại
+    return ocr_params(mode="ladder", lang=lang, min_conf=min_confidence,
+                      rungs=",".join(rung["name"] for rung in rungs))
+
+
+def prepare(page, rung):
+    """Mảng xám đã tiền xử lý đưa vào Tesseract cho một mức của thang (hoặc một hồ sơ của pdfvoice.profiles)."""
+    gray = preprocess.to_gray(render.ocr_pixmap(page, rung["zoom"]))
+    if rung["prep"][0] == "adaptive":
+        return preprocess.adaptive_threshold(gray, *rung["prep"][1:])
+    if rung["prep"][0] == "binary":
+        return preprocess.binarize(gray, *rung["prep"][1:])
+    return preprocess.enhance_contrast(gray, rung["prep"][1])
+
+
+def mean_confidence(confidences):
+    # Tesseract trả -1 cho khối không phải chữ; trang không có từ nào -> None
+    words = [c for c in confidences if c >= 0]
+    return sum(words) / len(words) if words else None
+
+
+def ocr_page_adaptive(page, lang="vie", min_confidence=MIN_CONFIDENCE, rungs=RUNGS):
+    """
+    OCR một trang theo thang. Trả về dict text, rung (tên mức dừng lại), confidence.
+    Không mức nào đạt ngưỡng thì lấy kết quả tin cậy nhất.
+    """
+    best = None
+    for rung in rungs:
+        gray = prepare(page, rung)
+        if rung["psm"] == "regions":
+            text, confidences = layout.ocr_regions(gray, lang=lang)
+        else:
+            text, confidences = ocr_engine.recognize(preprocess.to_image(gray), lang=lang,
+                                                     config=f"--oem 3 --psm {rung['psm']}")
+        confidence = mean_confidence(confidences)
+        result = {"text": cleanup.drop_garbage(text, confidences), "rung": rung["name"], "confidence": confidence}
+        # Không có từ nào (trang trắng / chỉ có hình): leo thang cũng không ra thêm chữ
+        if confidence is None:
+            return result if best is None else best
+        if best is None or confidence > best["confidence"]:
+            best = result
+        if confidence >= min_confidence:
+            break
+    return best
@@ -0,0 +1,117 @@
+"""
+OCR theo vùng: tìm các khối chữ trên ảnh đã tiền xử lý rồi OCR từng khối song song.
+
+--psm 6 coi cả trang là một khối nên trang hai cột bị đọc xen kẽ dòng trái / phải, và Tesseract
+phải quét cả lề trắng lẫn hình minh hoạ. Ở đây:
+  1. nhị phân hoá (Otsu) + giãn nở (morphology) để chữ gần nhau dính thành khối đoạn văn,
+  2. connected components -> khung từng khối; bỏ vết bẩn nhỏ và hình (mật độ điểm đen cao),
+  3. sắp khối theo thứ tự đọc (cắt XY: cột trái hết rồi mới sang cột phải),
+  4. OCR các khối song song, khối một dòng dùng --psm 7, còn lại --psm 6.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from pdfvoice import metrics, ocr_engine, preprocess
+
+REGION_WORKERS = int(os.environ.get("PDF_VOICE_REGION_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Khối có tỉ lệ điểm đen cao hơn mức này coi là hình, không OCR
+IMAGE_DENSITY = 0.45
+# Lề thêm quanh mỗi khối (tính theo chiều cao chữ) để không cắt mất dấu tiếng Việt
+PAD_FACTOR = 0.4
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=REGION_WORKERS, thread_name_prefix="pdf-region")
+
+
+def char_height(binary):
+    """Chiều cao chữ điển hình (trung vị chiều cao các thành phần liên thông cỡ chữ)."""
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    # Bỏ chấm / vết bẩn và các khối to (hình, đường kẻ)
+    letters = heights[(heights >= 4) & (widths >= 2) & (heights <= binary.shape[0] // 10)]
+    return int(np.median(letters)) if len(letters) else 0
+
+
+def _split(boxes, axis):
+    # Chia các khối theo khe trống dọc trục axis (0: theo x -> cột, 1: theo y -> hàng)
+    order = sorted(boxes, key=lambda b: b[axis])
+    groups, end = [], None
+    for box in order:
+        start = box[axis]
+        if end is None or start > end:
+            groups.append([box])
+        else:
+            groups[-1].append(box)
+        end = max(end or 0, start + box[axis + 2])
+    return groups
+
+
+def reading_order(boxes):
+    """Cắt XY: thử tách cột trước (khe dọc), không được thì tách hàng (khe ngang), đệ quy."""
+    if len(boxes) <= 1:
+        return list(boxes)
+    for axis in (0, 1):
+        groups = _split(boxes, axis)
+        if len(groups) > 1:
+            return [box for group in groups for box in reading_order(group)]
+    return sorted(boxes, key=lambda b: (b[1], b[0]))
+
+
+def find_regions(gray):
+    """
+    gray: mảng xám đã tiền xử lý (chữ tối trên nền sáng).
+    Trả về danh sách dict box=(x, y, w, h), psm theo thứ tự đọc.
+    """
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    height = char_height(binary)
+    if not height:
+        return []
+
+    # Giãn ~1.5 chiều cao chữ: nối các từ và các dòng của một đoạn, nhưng không vượt qua
+    # khe giữa hai cột (thường >= 2 em ~ 4 lần chiều cao chữ thường) hay khoảng cách giữa các đoạn lớn
+    size = max(3, int(height * 1.5))
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (size, size))
+    blocks = cv2.dilate(binary, kernel)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(blocks, connectivity=8)
+
+    boxes = []
+    for x, y, w, h, _area in stats[1:]:
+        if h < height * 0.6 or w * h < height * height:
+            continue  # vết bẩn, số trang lẻ loi quá nhỏ
+        density = cv2.countNonZero(binary[y:y + h, x:x + w]) / float(w * h)
+        if density > IMAGE_DENSITY:
+            continue  # hình minh hoạ / ảnh chụp
+        boxes.append((int(x), int(y), int(w), int(h)))
+
+    pad = int(height * PAD_FACTOR)
+    regions = []
+    for x, y, w, h in reading_order(boxes):
+        x0, y0 = max(0, x - pad), max(0, y - pad)
+        x1, y1 = min(gray.shape[1], x + w + pad), min(gray.shape[0], y + h + pad)
+        # Khối chỉ một dòng (tiêu đề, chú thích): --psm 7. h đã nở thêm size do giãn nở
+        psm = 7 if h - size < height * 3.5 else 6
+        regions.append({"box": (x0, y0, x1 - x0, y1 - y0), "psm": psm})
+    return regions
+
+
+@metrics.timed("ocr")
+def ocr_regions(gray, lang="vie"):
+    """
+    OCR các khối chữ của trang song song, ghép lại theo thứ tự đọc.
+    Trả về (text, [độ tin cậy từng từ]) giống ocr_engine.recognize.
+    """
+    regions = find_regions(gray)
+
+    def run(region):
+        x, y, w, h = region["box"]
+        # Chỉ chép đúng vùng của khối, không chép cả trang
+        crop = preprocess.to_image(np.ascontiguousarray(gray[y:y + h, x:x + w]))
+        return ocr_engine.recognize(crop, lang=lang, config=f"--oem 3 --psm {region['psm']}")
+
+    results = list(_EXECUTOR.map(run, regions))
+    texts = [text.strip() for text, _ in results if text.strip()]
+    confidences = [c for _, confs in results for c in confs]
+    return "\n\n".join(texts), confidences
@@ -0,0 +1,298 @@
+"""
+Đo thời gian từng bước của mỗi trang trong app (để biết trang "treo" là do fitz, Tesseract,
+edge-tts, base64 hay do rerun):
+
+    with metrics.page_trace("app", page_number) as trace:
+        img, text = get_page_content_parallel(...)      # hàm @st.cache_data
+        trace.add_payload("image", len(img))
+
+Trong lúc trace mở, các hàm của pdfvoice tự ghi bước của mình vào trace của luồng hiện tại
+(render, display, preprocess, ocr, textlayer, classify; kho SQLite trúng / trượt). Hàm bọc cache
+không chạy (không ghi bước nào) -> trúng cache của Streamlit.
+
+Mỗi trang xong: ghi một dòng log JSON (logger pdfvoice.metrics), cộng vào histogram / counter dạng
+Prometheus (xem ở http://127.0.0.1:PDF_VOICE_METRICS_PORT/metrics nếu đặt cổng), và giữ DEBUG_PAGES
+trang gần nhất cho bảng "Thời gian xử lý" trong app (PDF_VOICE_DEBUG_PANEL=1).
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- CẤU HÌNH ---
+METRICS_ENABLED = os.environ.get("PDF_VOICE_METRICS", "1") == "1"
+METRICS_HOST = os.environ.get("PDF_VOICE_METRICS_HOST", "127.0.0.1")
+# Cổng của /metrics (vd 8503); không đặt thì không mở cổng nào
+METRICS_PORT = int(os.environ.get("PDF_VOICE_METRICS_PORT", "0"))
+# Ghi mỗi trang một dòng log JSON ra stderr
+LOG_TIMINGS = os.environ.get("PDF_VOICE_LOG_TIMINGS", "1") == "1"
+# Bảng thời gian xử lý trong app (mặc định tắt) và số trang gần nhất giữ lại
+DEBUG_PANEL = os.environ.get("PDF_VOICE_DEBUG_PANEL", "0") == "1"
+DEBUG_PAGES = int(os.environ.get("PDF_VOICE_DEBUG_PAGES", "20"))
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6)
+
+logger = logging.getLogger("pdfvoice.metrics")
+if LOG_TIMINGS and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+# --- COUNTER / HISTOGRAM (định dạng text của Prometheus) ---
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=SECONDS_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, tuple(labels), tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, value in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_labels(names, key + (f'{bound:g}',))} {value}")
+                lines.append(f"{self.name}_bucket{_labels(names, key + ('+Inf',))} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("pdfvoice_stage_seconds", "Thời gian từng bước xử lý một trang", ("stage",))
+PAGE_SECONDS = Histogram("pdfvoice_page_seconds", "Thời gian lấy một trang (ảnh + chữ)", ("app", "cache"))
+PAYLOAD_BYTES = Histogram("pdfvoice_payload_bytes", "Dung lượng gửi xuống trình duyệt mỗi trang",
+                          ("kind",), buckets=BYTES_BUCKETS)
+CACHE_TOTAL = Counter("pdfvoice_cache_total", "Số lần tra cache theo loại và kết quả", ("cache", "result"))
+PAGES_TOTAL = Counter("pdfvoice_pages_total", "Số trang đã lấy", ("app", "prefetch"))
+DEDUP_TOTAL = Counter("pdfvoice_ocr_dedup_total",
+                      "Số lần OCR trùng tránh được (chờ kết quả của luồng / bản Streamlit khác)", ("scope",))
+REGISTRY = (STAGE_SECONDS, PAGE_SECONDS, PAYLOAD_BYTES, CACHE_TOTAL, PAGES_TOTAL, DEDUP_TOTAL)
+
+
+def render_prometheus():
+    return "\n".join(line for metric in REGISTRY for line in metric.expose()) + "\n"
+
+
+def count_cache(cache, hit):
+    CACHE_TOTAL.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def count_dedup(scope):
+    # scope: "process" (luồng khác trong tiến trình) hoặc "replica" (bản Streamlit khác, pdfvoice.shared_cache)
+    DEDUP_TOTAL.inc(scope=scope)
+
+
+def observe_stage(name, seconds):
+    # Bước chạy ngoài trace của trang (tổng hợp giọng nói trên event loop nền...)
+    STAGE_SECONDS.observe(seconds, stage=name)
+
+
+# --- TRACE TỪNG TRANG ---
+_local = threading.local()
+_RECENT = deque(maxlen=DEBUG_PAGES)
+_RECENT_LOCK = threading.Lock()
+
+
+def _log(record):
+    if LOG_TIMINGS:
+        logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+class PageTrace:
+    def __init__(self, app, page_number, prefetch=False):
+        self.record = {"time": time.time(), "app": app, "page": page_number, "prefetch": prefetch,
+                       "cache": None, "store": None, "method": None,
+                       "stages": {}, "payload": {}, "total_ms": None}
+        self.done = False
+        self._active = set()
+
+    def __enter__(self):
+        self._previous = getattr(_local, "trace", None)
+        _local.trace = self
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.trace = self._previous
+        seconds = time.perf_counter() - self._start
+        record = self.record
+        # Hàm bọc @st.cache_data không chạy (không ghi bước nào) -> trúng cache của Streamlit
+        record["cache"] = "miss" if record["stages"] else "hit"
+        record["total_ms"] = round(seconds * 1000, 1)
+        PAGE_SECONDS.observe(seconds, app=record["app"], cache=record["cache"])
+        PAGES_TOTAL.inc(app=record["app"], prefetch=record["prefetch"])
+        count_cache("page", record["cache"] == "hit")
+        for name, ms in record["stages"].items():
+            STAGE_SECONDS.observe(ms / 1000, stage=name)
+        for kind, size in record["payload"].items():
+            PAYLOAD_BYTES.observe(size, kind=kind)
+        self.done = True
+        with _RECENT_LOCK:
+            _RECENT.append(record)
+        _log(record)
+        return False
+
+    def add_stage(self, name, seconds):
+        stages = self.record["stages"]
+        stages[name] = round(stages.get(name, 0.0) + seconds * 1000, 1)
+        if self.done:
+            # Bước ghi thêm sau khi lấy trang xong (chờ TTS, dựng trình phát...)
+            STAGE_SECONDS.observe(seconds, stage=name)
+            _log({"app": self.record["app"], "page": self.record["page"], "stage": name,
+                  "ms": round(seconds * 1000, 1)})
+
+    def add_payload(self, kind, size):
+        payload = self.record["payload"]
+        payload[kind] = payload.get(kind, 0) + size
+        if self.done:
+            PAYLOAD_BYTES.observe(size, kind=kind)
+            _log({"app": self.record["app"], "page": self.record["page"], "payload": kind, "bytes": size})
+
+    def note(self, **fields):
+        self.record.update(fields)
+
+    @contextmanager
+    def stage(self, name):
+        # Gọi lồng cùng một bước (hàm "preprocess" gọi hàm "preprocess" khác...) chỉ tính lớp ngoài cùng
+        if name in self._active:
+            yield
+            return
+        self._active.add(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._active.discard(name)
+            self.add_stage(name, time.perf_counter() - start)
+
+
+def page_trace(app, page_number, prefetch=False):
+    return PageTrace(app, page_number, prefetch)
+
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def stage(name):
+    """Ghi thời gian của khối lệnh vào trace đang mở trên luồng này (không có trace thì bỏ qua)."""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    with trace.stage(name):
+        yield
+
+
+def timed(name):
+    """Decorator: cả hàm là một bước của trace."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def note(**fields):
+    trace = current_trace()
+    if trace is not None:
+        trace.note(**fields)
+
+
+def recent(limit=DEBUG_PAGES):
+    """Các trang gần nhất (mới nhất trước), mỗi trang một dict phẳng để hiện thành bảng."""
+    with _RECENT_LOCK:
+        records = list(_RECENT)[-limit:]
+    rows = []
+    for record in reversed(records):
+        row = {"trang": record["page"], "app": record["app"], "đọc trước": record["prefetch"],
+               "cache": record["cache"], "kho": record["store"], "cách lấy": record["method"],
+               "tổng ms": record["total_ms"]}
+        row.update({f"{name} ms": ms for name, ms in record["stages"].items()})
+        row.update({f"{kind} KB": round(size / 1024, 1) for kind, size in record["payload"].items()})
+        rows.append(row)
+    return rows
+
+
+# --- MÁY CHỦ /metrics ---
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_SERVER = None
+_SERVER_LOCK = threading.Lock()
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Bật máy chủ /metrics (một lần cho cả tiến trình) nếu có đặt cổng. Cổng đã bị chiếm thì bỏ qua."""
+    global _SERVER
+    if not METRICS_ENABLED or not port:
+        return None
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            try:
+                _SERVER = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+            except OSError:
+                _SERVER = False
+                return None
+            _SERVER.daemon_threads = True
+            threading.Thread(target=_SERVER.serve_forever, name="pdf-metrics-http", daemon=True).start()
+        return _SERVER or None
@@ -0,0 +1,28 @@
+"""
+Ảnh cho app3 theo hồ sơ "archival" (pdfvoice.profiles): ảnh thu nhỏ của từng trang, còn ảnh to
+(gốc + ảnh máy nhìn thấy) chỉ render lại cho trang đang xem. OCR cả cuốn chạy nền bằng pdfvoice.bookjob.
+"""
+from pdfvoice import preprocess, profiles, render
+
+# Chiều rộng ảnh thu nhỏ giữ lại cho mỗi trang (pixel)
+THUMBNAIL_WIDTH = 160
+
+
+def render_thumbnail(page, width=THUMBNAIL_WIDTH):
+    # Render thẳng ở độ phân giải nhỏ, không thu nhỏ từ ảnh 300 DPI
+    return render.display_jpeg(page, width=width, quality=70)
+
+
+def archival_profile(psm_mode=6, dpi=300):
+    # Hồ sơ "archival" (pdfvoice.profiles) với psm / dpi người dùng chọn; psm "auto" -> thang OCR
+    if psm_mode == "auto":
+        return profiles.get_profile("auto")
+    return profiles.get_profile("archival", psm=psm_mode, dpi=dpi)
+
+
+def render_page_images(doc, page_number, dpi=300):
+    """Render lại ảnh gốc (JPEG vừa màn hình) + ảnh máy nhìn thấy (xám, làm nét) của một trang."""
+    page = doc.load_page(page_number - 1)
+    profile = archival_profile(dpi=dpi)
+    return (render.display_jpeg(page, width=profile["display_width"]),
+            preprocess.to_image(profiles.processed_gray(page, profile)))
@@ -0,0 +1,270 @@
+"""
+Bộ máy OCR dùng chung cho mọi app.
+
+pytesseract mỗi trang lại chạy một tiến trình `tesseract` mới: nạp lại vie.traineddata
+rồi ghi/đọc ảnh PNG tạm. Nếu cài được tesserocr (gọi thẳng C-API của Tesseract) thì
+mỗi luồng giữ một engine sống lâu: model chỉ nạp một lần, ảnh đưa vào dạng buffer thô.
+Ở luồng phụ (Streamlit) tesserocr không import được nên ảnh thô được gửi sang vài tiến trình
+engine sống lâu thay vì chạy tesseract mới cho mỗi trang.
+Không có tesserocr (hoặc không khởi tạo được) thì tự quay về pytesseract như cũ.
+tesserocr là tuỳ chọn (pip install tesserocr), nên không có trong requirements.txt.
+
+Chọn bằng biến môi trường PDF_VOICE_OCR_BACKEND = auto (mặc định) | tesserocr | pytesseract
+
+Trang đang đọc, luồng đọc trước và job OCR cả cuốn chạy cùng lúc, nên mỗi lần OCR chỉ cho Tesseract
+một luồng (OMP_THREAD_LIMIT) và cả tiến trình chạy tối đa OCR_SLOTS lần OCR
+cùng lúc (mặc định bằng số nhân); lần thứ OCR_SLOTS + 1 chờ (bước "ocr_wait" trong /metrics).
+"""
+import contextlib
+import glob
+import importlib.util
+import multiprocessing
+import os
+import shlex
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pytesseract
+
+from pdfvoice import metrics
+
+# OpenMP (libgomp) đọc biến này lúc nạp thư viện -> đặt trước khi import tesserocr; tesseract chạy
+# bằng pytesseract là tiến trình con nên cũng nhận được. Đặt sẵn trong môi trường thì giữ nguyên.
+os.environ.setdefault("OMP_THREAD_LIMIT", os.environ.get("PDF_VOICE_OMP_THREADS", "1"))
+
+try:
+    import tesserocr
+except ImportError:  # tesserocr là tuỳ chọn
+    tesserocr = None
+except ValueError:
+    # cysignals (tesserocr kéo theo) chỉ import được ở luồng chính, mà Streamlit chạy script ở luồng phụ
+    # -> OCR qua vài tiến trình engine sống lâu (_engine_pool), tesserocr nạp ở luồng chính của chúng
+    tesserocr = None
+
+TESSEROCR_INSTALLED = importlib.util.find_spec("tesserocr") is not None
+BACKEND = os.environ.get("PDF_VOICE_OCR_BACKEND", "auto")
+# Số lần OCR chạy cùng lúc trong cả tiến trình (mọi phiên, đọc trước, job cả cuốn, vùng của layout)
+OCR_SLOTS = int(os.environ.get("PDF_VOICE_OCR_SLOTS", str(os.cpu_count() or 2)))
+# Số tiến trình engine khi không dùng được tesserocr ngay trong tiến trình này; mặc định đủ cho
+# OCR_SLOTS lần OCR cùng lúc, ít hơn thì các lần OCR đã có suất vẫn phải xếp hàng chờ engine
+ENGINE_PROCESSES = int(os.environ.get("PDF_VOICE_OCR_ENGINE_PROCESSES", str(OCR_SLOTS)))
+
+_local = threading.local()
+# Cấu hình nào tesserocr không khởi tạo được (thiếu tessdata...) thì nhớ lại, lần sau đi thẳng pytesseract
+_failed = set()
+_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(1, OCR_SLOTS))
+
+
+def parse_config(config):
+    """'--oem 3 --psm 6 -c key=val' -> (oem, psm, {key: val})"""
+    oem, psm, variables = 3, 3, {}
+    args = shlex.split(config or "")
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ("--oem", "--psm") and i + 1 < len(args):
+            if arg == "--oem":
+                oem = int(args[i + 1])
+            else:
+                psm = int(args[i + 1])
+            i += 2
+            continue
+        if arg == "-c" and i + 1 < len(args) and "=" in args[i + 1]:
+            key, value = args[i + 1].split("=", 1)
+            variables[key] = value
+            i += 2
+            continue
+        i += 1
+    return oem, psm, variables
+
+
+def tessdata_path():
+    # Cùng chỗ với tesseract mà pytesseract đang dùng (Windows: C:\Program Files\Tesseract-OCR\tessdata)
+    if os.environ.get("TESSDATA_PREFIX"):
+        return os.environ["TESSDATA_PREFIX"]
+    cmd = pytesseract.pytesseract.tesseract_cmd
+    if cmd and os.path.isabs(cmd):
+        path = os.path.join(os.path.dirname(cmd), "tessdata")
+        if os.path.isdir(path):
+            return path
+    # Linux cài bằng apt (packages.txt): /usr/share/tesseract-ocr/5/tessdata
+    for path in sorted(glob.glob("/usr/share/tesseract-ocr/*/tessdata"), reverse=True) + ["/usr/share/tessdata"]:
+        if os.path.isdir(path):
+            return path
+    return None
+
+
+def _get_api(lang, config):
+    """Engine tesserocr của luồng hiện tại cho (lang, config); tạo một lần rồi dùng lại."""
+    apis = getattr(_local, "apis", None)
+    if apis is None:
+        apis = _local.apis = {}
+    api = apis.get((lang, config))
+    if api is None:
+        oem, psm, variables = parse_config(config)
+        kwargs = {"lang": lang, "psm": psm, "oem": oem}
+        path = tessdata_path()
+        if path:
+            kwargs["path"] = path
+        api = tesserocr.PyTessBaseAPI(**kwargs)
+        for key, value in variables.items():
+            api.SetVariable(key, value)
+        apis[(lang, config)] = api
+    return api
+
+
+def _image_buffer(image):
+    # Ảnh trắng đen ('1') / có alpha -> 'L' / 'RGB' để có 1 hoặc 3 byte mỗi điểm ảnh
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("L" if image.mode in ("1", "LA", "P") else "RGB")
+    bpp = 1 if image.mode == "L" else 3
+    return image.tobytes(), image.width, image.height, bpp, image.width * bpp
+
+
+def _tesserocr_run(buffer, lang, config, confidences=False):
+    api = _get_api(lang, config)
+    api.SetImageBytes(*buffer)
+    try:
+        text = api.GetUTF8Text()
+        # Độ tin cậy từng từ (0-100) của lần nhận dạng vừa chạy, không tốn thêm lượt OCR
+        return (text, list(api.AllWordConfidences())) if confidences else text
+    finally:
+        api.Clear()
+
+
+_spawn_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def spawning_workers():
+    """
+    Bọc đúng chỗ tạo tiến trình worker của một pool (một lần cho mỗi pool, không phải mỗi lần OCR).
+    Streamlit gắn chính file app làm __main__, mà tiến trình "spawn" lúc khởi động sẽ chạy lại
+    __main__ -> chạy lại cả giao diện; nên trong lúc tạo worker tạm thay bằng module này.
+    Streamlit cũng chỉ thêm thư mục app vào sys.path lúc đang chạy script, nên thêm hẳn (một lần,
+    không gỡ ra) thư mục chứa pdfvoice để worker import được.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with _spawn_lock:
+        if root not in sys.path:
+            sys.path.append(root)
+        main = sys.modules.get("__main__")
+        here = sys.modules[__name__]
+        sys.modules["__main__"] = here
+        try:
+            yield
+        finally:
+            # Trong lúc đó Streamlit đã gắn __main__ mới (lượt chạy của phiên khác) thì để nguyên
+            if sys.modules.get("__main__") is here:
+                sys.modules["__main__"] = main
+
+
+def start_workers(pool, workers):
+    """
+    Tạo đủ workers tiến trình của pool ngay bây giờ (ProcessPoolExecutor chỉ tạo worker trong submit,
+    mỗi lần submit khi chưa có worker rảnh tạo thêm một), để các lần submit sau không tạo worker nữa.
+    """
+    with spawning_workers():
+        warm = [pool.submit(os.getpid) for _ in range(workers)]
+    for future in warm:
+        future.result()
+    return pool
+
+
+_pool = None
+
+
+def _init_engine(tesseract_cmd):
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def _engine_pool():
+    # Tạo + khởi động đủ worker một lần cho cả tiến trình; sau đó submit không đụng __main__ / sys.path
+    global _pool
+    with _lock:
+        if _pool is None:
+            pool = ProcessPoolExecutor(max_workers=ENGINE_PROCESSES,
+                                       mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_engine,
+                                       initargs=(pytesseract.pytesseract.tesseract_cmd,))
+            _pool = start_workers(pool, ENGINE_PROCESSES)
+        return _pool
+
+
+def _pooled_run(buffer, lang, config, confidences=False):
+    return _engine_pool().submit(_tesserocr_run, buffer, lang, config, confidences).result()
+
+
+def _pytesseract_data(image, lang, config):
+    # image_to_data: một lượt tesseract ra cả chữ lẫn độ tin cậy; ghép lại chữ theo dòng / đoạn
+    data = pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+    lines, confidences, last = [], [], None
+    for i, word in enumerate(data["text"]):
+        if not word.strip():
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        if key != last:
+            if last is not None and key[:2] != last[:2]:
+                lines.append("")
+            lines.append(word)
+            last = key
+        else:
+            lines[-1] += " " + word
+        confidences.append(float(data["conf"][i]))
+    return "\n".join(lines), confidences
+
+
+def active_backend(lang="vie", config=""):
+    """Tên backend sẽ được dùng cho cấu hình này: 'tesserocr' hoặc 'pytesseract'."""
+    if BACKEND == "pytesseract" or not TESSEROCR_INSTALLED:
+        return "pytesseract"
+    if (lang, config) in _failed:
+        return "pytesseract"
+    return "tesserocr"
+
+
+def _run(image, lang, config, backend, confidences):
+    # Chờ tới lượt (quá OCR_SLOTS lần OCR đang chạy) rồi mới OCR; thời gian chờ tính riêng
+    with metrics.stage("ocr_wait"):
+        _slots.acquire()
+    try:
+        return _run_ocr(image, lang, config, backend, confidences)
+    finally:
+        _slots.release()
+
+
+@metrics.timed("ocr")
+def _run_ocr(image, lang, config, backend, confidences):
+    forced = backend == "tesserocr" or BACKEND == "tesserocr"
+    backend = backend or active_backend(lang, config)
+    if backend == "tesserocr":
+        try:
+            buffer = _image_buffer(image)
+            if tesserocr is not None:
+                return _tesserocr_run(buffer, lang, config, confidences)
+            return _pooled_run(buffer, lang, config, confidences)
+        except RuntimeError:
+            # Thường là thiếu tessdata cho tesserocr (hoặc engine hỏng) -> không thử lại cấu hình này nữa
+            if forced:
+                raise
+            with _lock:
+                _failed.add((lang, config))
+    if confidences:
+        return _pytesseract_data(image, lang, config)
+    return pytesseract.image_to_string(image, lang=lang, config=config)
+
+
+def image_to_string(image, lang="vie", config="", backend=None):
+    """
+    Thay cho pytesseract.image_to_string (cùng tham số).
+    backend=None -> theo PDF_VOICE_OCR_BACKEND; 'pytesseract' / 'tesserocr' để ép (dùng khi đo).
+    """
+    return _run(image, lang, config, backend, confidences=False)
+
+
+def recognize(image, lang="vie", config="", backend=None):
+    """Như image_to_string nhưng trả về (text, [độ tin cậy từng từ 0-100])."""
+    return _run(image, lang, config, backend, confidences=True)
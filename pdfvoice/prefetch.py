@@ -0,0 +1,65 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pdfvoice import metrics
+
+# --- CẤU HÌNH ĐỌC TRƯỚC ---
+# Số trang chạy trước trang đang đọc và số luồng nền dùng chung cho mọi phiên.
+PREFETCH_AHEAD = int(os.environ.get("PDF_VOICE_PREFETCH_AHEAD", "3"))
+PREFETCH_WORKERS = int(os.environ.get("PDF_VOICE_PREFETCH_WORKERS", "2"))
+
+# Module chỉ import một lần cho cả tiến trình Streamlit nên pool này được
+# chia sẻ giữa các lần rerun và giữa các người dùng -> số luồng OCR luôn có giới hạn.
+_EXECUTOR = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="pdf-prefetch")
+
+
+def _traced(fn, args, page_number):
+    # Trang đọc trước cũng có trace riêng (đánh dấu prefetch) để biết thời gian các bước
+    with metrics.page_trace(getattr(fn, "__name__", "prefetch"), page_number, prefetch=True):
+        return fn(*args, page_number)
+
+
+class PagePrefetcher:
+    """
+    Render + OCR trước các trang current+1..current+N trong nền.
+    Hàm truyền vào chính là hàm đã bọc @st.cache_data, nên kết quả nằm luôn
+    trong cache của Streamlit: lần bấm "Auto Next" sau chỉ còn là tra cache.
+    Hàm được gọi dạng fn(*args, page_number).
+    """
+
+    def __init__(self, ahead=PREFETCH_AHEAD, executor=None):
+        self.ahead = ahead
+        self.executor = executor or _EXECUTOR
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._doc_key = None
+
+    def schedule(self, fn, current_page, total_pages, *args, doc_key=None):
+        # Đổi file -> bỏ toàn bộ việc đang chờ của file cũ
+        if doc_key != self._doc_key:
+            self.cancel()
+            self._doc_key = doc_key
+
+        wanted = range(current_page + 1, min(current_page + self.ahead, total_pages) + 1)
+        with self._lock:
+            # Nhảy trang bằng number_input -> huỷ các trang không còn nằm trong cửa sổ.
+            # Trang nào Tesseract đang chạy dở thì không dừng được, cứ để nó ghi vào cache.
+            for page in list(self._futures):
+                if page not in wanted:
+                    self._futures.pop(page).cancel()
+
+            for page in wanted:
+                if page not in self._futures:
+                    self._futures[page] = self.executor.submit(_traced, fn, args, page)
+
+    def cancel(self):
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+
+    def future(self, page_number):
+        # Future của trang đang đọc trước (None nếu trang đó không nằm trong cửa sổ)
+        with self._lock:
+            return self._futures.get(page_number)
@@ -0,0 +1,69 @@
+"""
+Tiền xử lý ảnh trước khi OCR, làm thẳng trên buffer samples của pixmap fitz.
+
+Bản cũ: Image.frombytes (chép cả trang RGB) -> ImageOps.grayscale (chép) -> ImageEnhance.Contrast
+(ảnh nền + ảnh kết quả) -> .point(lambda ...) (chép), mỗi bước một bản sao cả trang.
+Ở đây: nhìn thẳng vào pixmap bằng NumPy (không chép) -> ra một mảng xám duy nhất -> tăng tương phản
+và phân ngưỡng gộp chung một bảng tra (LUT) chạy tại chỗ trên mảng đó.
+"""
+import cv2
+import numpy as np
+from PIL import Image
+
+from pdfvoice import metrics
+
+
+def pixmap_array(pix):
+    """Mảng (cao, rộng, số kênh) nhìn thẳng vào pix.samples, không chép. pix phải còn sống khi dùng mảng."""
+    return np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride // pix.n, pix.n)[:, :pix.width]
+
+
+@metrics.timed("preprocess")
+def to_gray(source):
+    """Pixmap / ảnh PIL / mảng NumPy -> mảng xám uint8 mới (bản sao duy nhất của trang)."""
+    # Không gán đè lên source: pixmap truyền thẳng vào (to_gray(render.ocr_pixmap(...)))
+    # phải sống đến hết hàm, nếu không vùng nhớ bị giải phóng khi mảng còn đang đọc
+    array = source
+    if isinstance(source, Image.Image):
+        array = np.asarray(source.convert("RGB") if source.mode not in ("L", "RGB") else source)
+    elif not isinstance(source, np.ndarray):
+        array = pixmap_array(source)
+    if array.ndim == 2:
+        return array.copy()
+    if array.shape[2] == 1:
+        return array[:, :, 0].copy()
+    code = cv2.COLOR_RGBA2GRAY if array.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+    return cv2.cvtColor(array, code)
+
+
+def contrast_lut(gray, factor):
+    # Giống ImageEnhance.Contrast: kéo mỗi điểm ra xa độ sáng trung bình của trang
+    mean = int(gray.mean() + 0.5)
+    values = mean + factor * (np.arange(256, dtype=np.float32) - mean)
+    return np.clip(values, 0, 255).astype(np.uint8)
+
+
+@metrics.timed("preprocess")
+def enhance_contrast(gray, factor):
+    """Tăng tương phản tại chỗ, trả lại chính mảng gray."""
+    return cv2.LUT(gray, contrast_lut(gray, factor), dst=gray)
+
+
+@metrics.timed("preprocess")
+def binarize(gray, contrast=2.0, threshold=160):
+    """Tương phản rồi phân ngưỡng (tối hơn ngưỡng -> đen, còn lại trắng) trong một lượt, tại chỗ."""
+    lut = contrast_lut(gray, contrast)
+    lut = np.where(lut < threshold, 0, 255).astype(np.uint8)
+    return cv2.LUT(gray, lut, dst=gray)
+
+
+@metrics.timed("preprocess")
+def adaptive_threshold(gray, block_size=15, c=8):
+    """Ngưỡng thích nghi Gaussian (tách chữ khỏi nền không đều), ghi đè lên gray."""
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                 block_size, c, dst=gray)
+
+
+def to_image(gray):
+    """Mảng xám -> ảnh PIL 'L' dùng chung bộ nhớ với mảng (không chép)."""
+    return Image.fromarray(gray)
@@ -0,0 +1,123 @@
+"""
+Hồ sơ hiệu năng dùng chung cho mọi app: mỗi hồ sơ là một bộ zoom / tiền xử lý / PSM cố định.
+
+Trước đây mỗi script tự chép hàm render + OCR với hằng số riêng, nên sửa một chỗ không tới
+chỗ khác. Giờ app chỉ chọn tên hồ sơ (theo thiết bị hoặc người dùng chọn); khoá kho chữ
+(pdfvoice.store) và cache âm thanh tính theo tham số của hồ sơ, nên trang đã OCR trên máy tính
+thì điện thoại dùng lại được nếu cùng hồ sơ. Khoá trùng với khoá các bản cũ đã ghi vào kho.
+"""
+import re
+
+from pdfvoice import cleanup, layout, ladder, ocr_engine, preprocess, render, speech
+from pdfvoice.store import ocr_params
+from pdfvoice.textlayer import read_page_result
+
+OCR_LANG = "vie"
+
+# zoom (hoặc dpi), prep như pdfvoice.ladder.RUNGS; psm "regions" = tách khối (pdfvoice.layout),
+# "auto" = thang OCR (pdfvoice.ladder). display_width: bề ngang ảnh JPEG gửi xuống trình duyệt.
+PROFILES = {
+    "lite": {"label": "Nhẹ (điện thoại)", "zoom": 1.2, "prep": ("contrast", 1.5), "psm": 6,
+             "display_width": 720},
+    "desktop": {"label": "Máy tính", "zoom": 2.0, "prep": ("contrast", 2.0), "psm": 6,
+                "display_width": render.DISPLAY_WIDTH},
+    "opencv": {"label": "Làm nét (OpenCV)", "zoom": 1.5, "prep": ("adaptive", 15, 8), "psm": 6,
+               "display_width": 720},
+    "columns": {"label": "Nhiều cột", "zoom": 1.5, "prep": ("contrast", 1.5), "psm": "regions",
+                "display_width": 720},
+    "archival": {"label": "Lưu trữ 300 DPI", "dpi": 300, "prep": ("binary", 2.0, 160), "psm": 6,
+                 "display_width": render.DISPLAY_WIDTH},
+    "auto": {"label": "Tự động (thang OCR)", "psm": "auto", "display_width": 720},
+}
+
+# Trình duyệt điện thoại / máy tính bảng -> hồ sơ nhẹ
+MOBILE_AGENT = re.compile(r"Android|iPhone|iPad|iPod|Mobile|Opera Mini|IEMobile", re.I)
+
+
+def get_profile(name, **overrides):
+    """Bản sao của hồ sơ name, có thể đổi vài tham số (ví dụ psm của app3)."""
+    profile = dict(PROFILES[name], name=name)
+    profile.update(overrides)
+    return profile
+
+
+def device_profile(user_agent):
+    return "lite" if user_agent and MOBILE_AGENT.search(user_agent) else "desktop"
+
+
+def resolve_profile(profile):
+    # Tên hồ sơ hoặc dict hồ sơ đã có (get_profile với tham số riêng) -> dict
+    return get_profile(profile) if isinstance(profile, str) else profile
+
+
+def profile_zoom(profile):
+    return profile["zoom"] if "zoom" in profile else profile["dpi"] / 72
+
+
+def prep_name(prep):
+    # Tên bước tiền xử lý trong khoá kho, giữ đúng như các bản cũ đã ghi
+    if prep[0] == "adaptive":
+        return f"opencv-adaptive-{prep[1]}-{prep[2]}"
+    if prep[0] == "binary":
+        return f"binary-{prep[2]}"
+    return f"contrast-{prep[1]}"
+
+
+def profile_params(profile, lang=OCR_LANG):
+    """Khoá kho chữ của hồ sơ."""
+    profile = resolve_profile(profile)
+    if profile["psm"] == "auto":
+        return ladder.ladder_params(lang)
+    if "dpi" in profile:
+        return ocr_params(dpi=profile["dpi"], psm=profile["psm"], prep=prep_name(profile["prep"]), lang=lang)
+    return ocr_params(zoom=profile["zoom"], psm=profile["psm"], prep=prep_name(profile["prep"]), lang=lang)
+
+
+def processed_gray(page, profile):
+    """Mảng xám đã tiền xử lý của hồ sơ (ảnh máy nhìn thấy)."""
+    profile = resolve_profile(profile)
+    return ladder.prepare(page, {"zoom": profile_zoom(profile), "prep": profile["prep"]})
+
+
+def run_ocr(page, profile, lang=OCR_LANG):
+    """
+    OCR một trang theo hồ sơ: chuỗi, hoặc dict (text, rung, confidence) với hồ sơ auto.
+    Từ rác Tesseract không chắc đã bỏ (pdfvoice.cleanup.drop_garbage).
+    """
+    profile = resolve_profile(profile)
+    if profile["psm"] == "auto":
+        return ladder.ocr_page_adaptive(page, lang=lang)
+    gray = processed_gray(page, profile)
+    if profile["psm"] == "regions":
+        return cleanup.drop_garbage(*layout.ocr_regions(gray, lang=lang))
+    return cleanup.drop_garbage(*ocr_engine.recognize(preprocess.to_image(gray), lang=lang,
+                                                      config=f"--oem 3 --psm {profile['psm']}"))
+
+
+def read_text(page, fingerprint, page_number, profile, lang=OCR_LANG):
+    """Kho -> lớp chữ -> OCR theo hồ sơ; trả về dict text, method, rung, confidence."""
+    profile = resolve_profile(profile)
+    return read_page_result(page, fingerprint, page_number, profile_params(profile, lang),
+                            lambda: run_ocr(page, profile, lang))
+
+
+def read_clean_text(page, fingerprint, page_number, profile, lang=OCR_LANG):
+    """
+    Như read_text nhưng text đã làm sạch để đọc (pdfvoice.cleanup): bỏ header / footer / số trang,
+    nối chữ bị gạch nối và các dòng của một đoạn.
+    """
+    profile = resolve_profile(profile)
+    result = read_text(page, fingerprint, page_number, profile, lang)
+    text = cleanup.cleaned_text(fingerprint, page_number, profile_params(profile, lang), result["text"])
+    return dict(result, text=text)
+
+
+def page_content(page, fingerprint, page_number, profile):
+    """
+    Ảnh JPEG để hiển thị + chữ đã làm sạch của một trang; dict image, text, chunks (các đoạn câu
+    cho giọng đọc trình duyệt, pdfvoice.speech), method, rung, confidence.
+    """
+    profile = resolve_profile(profile)
+    image = render.display_jpeg(page, width=profile["display_width"])
+    result = read_clean_text(page, fingerprint, page_number, profile)
+    return dict(result, image=image, chunks=speech.chunks(result["text"]))
@@ -0,0 +1,58 @@
+"""
+Hai kiểu render một trang PDF, mỗi kiểu chỉ làm đúng việc của nó:
+
+- ocr_pixmap: pixmap xám (csGRAY, 1 byte/điểm ảnh) ở độ phân giải cho Tesseract, chỉ lấy vùng có nội dung.
+  Chỉ render khi trang thật sự cần OCR (trang có lớp chữ thì không render gì).
+- display_jpeg: JPEG vừa bề ngang màn hình để st.image gửi xuống trình duyệt / điện thoại.
+"""
+import io
+import os
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from pdfvoice import metrics
+
+# Bề ngang ảnh hiển thị (pixel); bản mobile truyền nhỏ hơn
+DISPLAY_WIDTH = int(os.environ.get("PDF_VOICE_DISPLAY_WIDTH", "1000"))
+DISPLAY_QUALITY = 75
+# Cạnh dài tối đa của ảnh OCR: trang khổ lớn (A3, bản đồ...) tự hạ zoom để không nổ RAM
+MAX_OCR_SIDE = 5000
+# Lề giữ lại quanh vùng nội dung (điểm, 1/72 inch)
+CLIP_MARGIN = 6
+
+
+def content_clip(page):
+    """Hình chữ nhật bao mọi thứ được vẽ trên trang (chữ, ảnh, nét vẽ); None nếu trang trống."""
+    rect = fitz.Rect()
+    for _kind, bbox in page.get_bboxlog():
+        rect |= bbox
+    if rect.is_empty:
+        return None
+    return (rect + (-CLIP_MARGIN, -CLIP_MARGIN, CLIP_MARGIN, CLIP_MARGIN)) & page.rect
+
+
+def ocr_zoom(rect, zoom):
+    # Giữ zoom của app, trừ khi ảnh ra vượt MAX_OCR_SIDE
+    longest = max(rect.width, rect.height, 1)
+    return min(zoom, MAX_OCR_SIDE / longest)
+
+
+@metrics.timed("render")
+def ocr_pixmap(page, zoom):
+    """Pixmap xám chỉ gồm vùng nội dung của trang, để đưa vào pdfvoice.preprocess."""
+    clip = content_clip(page) or page.rect
+    zoom = ocr_zoom(clip, zoom)
+    return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, clip=clip, alpha=False)
+
+
+@metrics.timed("display")
+def display_jpeg(page, width=DISPLAY_WIDTH, quality=DISPLAY_QUALITY):
+    """Ảnh JPEG cả trang, bề ngang = width pixel (st.image nhận thẳng bytes)."""
+    zoom = width / max(page.rect.width, 1)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    # Nén bằng PIL (libjpeg-turbo) nhanh hơn pix.tobytes("jpg") ~2-3 lần; frombuffer không chép pixmap
+    image = Image.frombuffer("RGB", (pix.width, pix.height), pix.samples_mv, "raw", "RGB", pix.stride, 1)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
@@ -0,0 +1,200 @@
+"""
+Tìm chữ trong sách đã OCR (SQLite FTS5), gõ không dấu vẫn ra:
+
+    search.search(pdf.digest, "duong cach mang")   # -> [{"page": 12, "snippet": "... **đường** ..."}]
+
+Mỗi trang vừa có chữ (OCR, lớp chữ PDF, job cả cuốn, pdfvoice.batch) được thêm vào chỉ mục ngay
+(textlayer.read_page_result); chữ sạch của cả cuốn (cleanup.clean_book) ghi đè lên. Sách OCR từ
+trước khi có chỉ mục thì lần tìm đầu tiên tự lấy từ kho chữ (pdfvoice.store).
+Chỉ mục lưu bản chữ đã bỏ dấu (tokenizer unicode61 không bỏ được "đ"), mỗi ký tự thành đúng một
+ký tự, nên vị trí tìm thấy trên bản bỏ dấu cũng là vị trí trên chữ gốc -> đoạn trích giữ nguyên dấu.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from pdfvoice import cleanup, metrics
+from pdfvoice.store import CACHE_DIR, get_store
+
+# Số ký tự lấy mỗi bên chỗ tìm thấy trong đoạn trích
+SNIPPET_CHARS = 60
+MAX_RESULTS = 20
+
+_TERM = re.compile(r"\w+")
+# Mọi dấu câu ASCII đều thoát được bằng "\" trong markdown (CommonMark)
+_MARKDOWN_SPECIAL = re.compile(r"([!-/:-@\[-`{-~])")
+
+
+def fold(text):
+    """Bỏ dấu + chữ thường, giữ nguyên độ dài (mỗi ký tự -> một ký tự): "Đường" -> "duong"."""
+    folded = []
+    for char in text:
+        base = unicodedata.normalize("NFD", char)[0].lower()
+        folded.append("d" if base == "đ" else base)
+    return "".join(folded)
+
+
+def query_terms(query):
+    return _TERM.findall(fold(unicodedata.normalize("NFC", query)))
+
+
+def escape_markdown(text):
+    """Chữ OCR hiện nguyên văn trong st.markdown ("*", "_", "#", "[...]"... không thành định dạng)."""
+    return _MARKDOWN_SPECIAL.sub(r"\\\1", text)
+
+
+def snippet(text, terms, chars=SNIPPET_CHARS, mark="**", escape=escape_markdown):
+    """
+    Đoạn quanh chỗ đầu tiên có từ tìm, các từ khớp bọc trong mark (markdown in đậm).
+    Chữ được escape (mặc định thoát ký tự markdown) trước khi bọc mark; escape=None để lấy chữ trơn.
+    """
+    escape = escape or (lambda piece: piece)
+    text = " ".join(unicodedata.normalize("NFC", text).split())
+    folded = fold(text)
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\w*")
+    first = pattern.search(folded)
+    if not first:
+        return escape(text[:2 * chars])
+    start = max(0, first.start() - chars)
+    end = min(len(text), first.end() + chars)
+    # Cắt ở khoảng trắng cho khỏi đứt chữ
+    space = text.find(" ", start, first.start())
+    if start and space != -1:
+        start = space + 1
+    space = text.rfind(" ", first.end(), end)
+    if end < len(text) and space != -1:
+        end = space
+    parts, last = [], start
+    for match in pattern.finditer(folded, start, end):
+        parts.append(escape(text[last:match.start()]))
+        parts.append(mark + escape(text[match.start():match.end()]) + mark)
+        last = match.end()
+    parts.append(escape(text[last:end]))
+    return ("…" if start else "") + "".join(parts) + ("…" if end < len(text) else "")
+
+
+class SearchIndex:
+    """
+    Chỉ mục FTS5 trên đĩa: mỗi (vân tay PDF, trang) một dòng, chữ gốc để trích + bản bỏ dấu để tìm.
+    Bảng docs giữ rowid của từng trang để thay chữ một trang không phải quét cả bảng FTS.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "search.sqlite3")
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " fingerprint TEXT NOT NULL,"
+            " page INTEGER NOT NULL,"
+            " UNIQUE (fingerprint, page))"
+        )
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(text UNINDEXED, folded, tokenize='unicode61')"
+        )
+        self._conn.commit()
+
+    def add(self, fingerprint, texts):
+        """texts: {trang: chữ}; trang đã có thì thay chữ mới. Trả về False nếu không ghi được."""
+        try:
+            with self._lock:
+                for page, text in texts.items():
+                    self._conn.execute("INSERT OR IGNORE INTO docs (fingerprint, page) VALUES (?, ?)",
+                                       (fingerprint, page))
+                    rowid = self._conn.execute("SELECT rowid FROM docs WHERE fingerprint=? AND page=?",
+                                               (fingerprint, page)).fetchone()[0]
+                    self._conn.execute("DELETE FROM pages WHERE rowid=?", (rowid,))
+                    self._conn.execute("INSERT INTO pages (rowid, text, folded) VALUES (?, ?, ?)",
+                                       (rowid, text, fold(unicodedata.normalize("NFC", text))))
+                self._conn.commit()
+        except sqlite3.Error:
+            # Chỉ mục lỗi không được làm hỏng việc đọc sách
+            with self._lock:
+                self._conn.rollback()
+            return False
+        return True
+
+    def pages(self, fingerprint):
+        try:
+            with self._lock:
+                rows = self._conn.execute("SELECT page FROM docs WHERE fingerprint=?", (fingerprint,)).fetchall()
+        except sqlite3.Error:
+            return set()
+        return {row[0] for row in rows}
+
+    def search(self, fingerprint, terms, limit=MAX_RESULTS):
+        """[(trang, chữ)] tốt nhất trước (bm25); mọi từ đều phải có, từ cuối theo tiền tố (gõ dở vẫn ra)."""
+        match = " ".join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+        try:
+            with self._lock:
+                return self._conn.execute(
+                    "SELECT docs.page, pages.text FROM pages JOIN docs ON docs.rowid = pages.rowid"
+                    " WHERE pages MATCH ? AND docs.fingerprint=? ORDER BY bm25(pages) LIMIT ?",
+                    (match, fingerprint, limit)
+                ).fetchall()
+        except sqlite3.Error:
+            return []
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_index():
+    # Một kết nối cho cả tiến trình (như pdfvoice.store.get_store)
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = SearchIndex()
+        return _INDEX
+
+
+def index_page(fingerprint, page_number, text):
+    get_index().add(fingerprint, {page_number: text})
+
+
+def index_pages(fingerprint, texts):
+    return get_index().add(fingerprint, texts)
+
+
+_BACKFILLED = set()
+
+
+def backfill(fingerprint):
+    """
+    Thêm vào chỉ mục các trang đã có trong kho chữ mà chưa có trong chỉ mục; trả về số trang thêm.
+    Mỗi cuốn một lần cho cả tiến trình: trang OCR sau đó tự vào chỉ mục. Lỗi giữa chừng thì lần
+    tìm sau làm lại.
+    """
+    if fingerprint in _BACKFILLED:
+        return 0
+    indexed = get_index().pages(fingerprint)
+    missing = {page: cleanup.clean_page(text)
+               for page, text in get_store().all_texts(fingerprint).items() if page not in indexed}
+    if missing and not index_pages(fingerprint, missing):
+        return 0
+    _BACKFILLED.add(fingerprint)
+    return len(missing)
+
+
+def indexed_count(fingerprint):
+    return len(get_index().pages(fingerprint))
+
+
+def search(fingerprint, query, limit=MAX_RESULTS):
+    """Các trang của sách có mọi từ trong query (không phân biệt dấu); list dict page, snippet."""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    start = time.perf_counter()
+    backfill(fingerprint)
+    rows = get_index().search(fingerprint, terms, limit)
+    metrics.observe_stage("search", time.perf_counter() - start)
+    return [{"page": page, "snippet": snippet(text, terms)} for page, text in rows]
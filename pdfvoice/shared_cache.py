@@ -0,0 +1,319 @@
+"""
+OCR mỗi trang một lần dù nhiều người cùng đọc một cuốn sách.
+
+Kho SQLite (pdfvoice.store) chỉ giúp khi trang đã OCR xong: nhiều phiên cùng tới một trang mới
+thì trước đây phiên nào cũng chạy Tesseract. Ở đây:
+  - SingleFlight: trong một tiến trình, các yêu cầu cùng khoá (vân tay PDF, trang, tham số OCR)
+    chờ chung một lần tính (phiên khác, luồng đọc trước...),
+  - backend dùng chung (tuỳ chọn, PDF_VOICE_SHARED_CACHE) cho nhiều bản Streamlit:
+        redis://[:mật_khẩu@]host:6379/0   Redis / Valkey / KeyDB hoặc pdfvoice.fake_redis
+        /mnt/chung/pdf_voice (file://...)  thư mục trên ổ đĩa mạng gắn chung
+    Bản nào OCR trước thì giữ "phiếu" (lease) của khoá, bản khác chờ kết quả thay vì OCR lại.
+    Bản giữ phiếu chết giữa chừng thì phiếu hết hạn sau PDF_VOICE_SHARED_LEASE giây.
+Backend lỗi / không kết nối được thì coi như không có, OCR bình thường.
+Tỉ lệ trúng (pdfvoice_cache_total{cache="shared"}) và số lần OCR trùng tránh được
+(pdfvoice_ocr_dedup_total) có trong /metrics.
+"""
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from urllib.parse import unquote, urlparse
+
+from pdfvoice import metrics
+
+# --- CẤU HÌNH ---
+SHARED_CACHE = os.environ.get("PDF_VOICE_SHARED_CACHE", "")
+# Phiếu giữ khoá tối đa bao lâu (giây) nếu bản đang OCR không trả kết quả
+LEASE_SECONDS = int(os.environ.get("PDF_VOICE_SHARED_LEASE", "120"))
+# Chờ bản khác OCR tối đa bao lâu rồi tự làm
+WAIT_SECONDS = float(os.environ.get("PDF_VOICE_SHARED_WAIT", "60"))
+POLL_SECONDS = 0.2
+# Kết quả trong Redis giữ bao lâu (giây, 0 = mãi mãi); backend thư mục không tự xoá
+TTL_SECONDS = int(os.environ.get("PDF_VOICE_SHARED_TTL", str(30 * 24 * 3600)))
+KEY_PREFIX = "pdfvoice:page:"
+# Trả phiếu nguyên tử: chỉ xoá khi phiếu vẫn là của mình (GET rồi DEL riêng thì phiếu có thể hết
+# hạn và bị bản khác lấy ngay giữa hai lệnh -> xoá nhầm phiếu của bản kia)
+RELEASE_SCRIPT = ("if redis.call('get', KEYS[1]) == ARGV[1] then "
+                  "return redis.call('del', KEYS[1]) end return 0")
+
+
+def page_key(fingerprint, page_number, params):
+    # Tham số OCR là chuỗi JSON dài -> băm ngắn lại cho vừa tên file / khoá Redis
+    digest = hashlib.sha256(params.encode("utf-8")).hexdigest()[:16]
+    return f"{fingerprint}:{page_number}:{digest}"
+
+
+# --- GỘP CÁC LẦN GỌI TRÙNG TRONG TIẾN TRÌNH ---
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Các lần gọi cùng khoá chạy chồng lên nhau chỉ tính một lần, các luồng sau chờ kết quả."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Trả về (kết quả, leader); leader False = không tự tính mà chờ luồng khác. Lỗi cũng dùng chung."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, False
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, True
+
+
+# --- BACKEND REDIS (giao thức RESP, không cần thư viện redis) ---
+class RedisError(Exception):
+    pass
+
+
+def _read_reply(conn):
+    line = conn.readline()
+    if not line:
+        raise ConnectionError("máy chủ Redis đóng kết nối")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        raise RedisError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        size = int(rest)
+        return None if size < 0 else conn.read(size + 2)[:-2]
+    if kind == b"*":
+        count = int(rest)
+        return None if count < 0 else [_read_reply(conn) for _ in range(count)]
+    raise RedisError(f"trả lời không hiểu được: {line!r}")
+
+
+class RedisBackend:
+    """Client tối giản (GET, SET NX EX, EVAL trả phiếu); mỗi luồng một kết nối."""
+
+    def __init__(self, url, timeout=5.0):
+        parsed = urlparse(url)
+        self.address = (parsed.hostname or "127.0.0.1", parsed.port or 6379)
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip("/") or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection(self.address, timeout=self.timeout)
+            conn = sock.makefile("rwb")
+            sock.close()  # makefile giữ socket mở đến khi conn đóng
+            self._local.conn = conn
+            if self.password:
+                self.command("AUTH", self.password)
+            if self.db:
+                self.command("SELECT", self.db)
+        return conn
+
+    def command(self, *args):
+        conn = self._connection()
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        try:
+            conn.write(b"".join(parts))
+            conn.flush()
+            return _read_reply(conn)
+        except OSError:
+            # Kết nối hỏng -> lần sau mở lại
+            self._local.conn = None
+            conn.close()
+            raise
+
+    def get(self, key):
+        data = self.command("GET", KEY_PREFIX + key)
+        return json.loads(data) if data is not None else None
+
+    def put(self, key, value):
+        args = ["SET", KEY_PREFIX + key, json.dumps(value, ensure_ascii=False)]
+        if TTL_SECONDS:
+            args += ["EX", TTL_SECONDS]
+        self.command(*args)
+
+    def claim(self, key, lease=LEASE_SECONDS):
+        """Giữ phiếu của khoá; trả về mã phiếu, hoặc None nếu bản khác đang giữ."""
+        token = uuid.uuid4().hex
+        reply = self.command("SET", KEY_PREFIX + key + ":lease", token, "NX", "EX", lease)
+        return token if reply == "OK" else None
+
+    def release(self, key, token):
+        # Chỉ trả phiếu của mình (phiếu đã hết hạn và bị bản khác lấy thì để yên), trong một lệnh
+        self.command("EVAL", RELEASE_SCRIPT, 1, KEY_PREFIX + key + ":lease", token)
+
+
+# --- BACKEND THƯ MỤC (ổ đĩa mạng dùng chung) ---
+class FileBackend:
+    """Mỗi trang một file JSON; phiếu là file .lease tạo bằng O_EXCL."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, suffix=".json"):
+        return os.path.join(self.directory, key.replace(":", "-") + suffix)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, value):
+        # Ghi file tạm rồi đổi tên (nguyên tử) -> bản khác không đọc phải file ghi dở
+        temp = self._path(key, f".{uuid.uuid4().hex}.part")
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(temp, self._path(key))
+
+    def claim(self, key, lease=LEASE_SECONDS):
+        path = self._path(key, ".lease")
+        token = uuid.uuid4().hex
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    expired = time.time() - os.path.getmtime(path) > lease
+                except FileNotFoundError:
+                    continue
+                if not expired:
+                    return None
+                # Bản giữ phiếu đã chết: bỏ phiếu cũ rồi thử lại một lần
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(token)
+            return token
+        return None
+
+    def release(self, key, token):
+        path = self._path(key, ".lease")
+        try:
+            with open(path) as f:
+                if f.read() == token:
+                    os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def make_backend(spec):
+    """'redis://...' -> RedisBackend, 'file://...' hoặc đường dẫn -> FileBackend, rỗng -> None."""
+    if not spec:
+        return None
+    if spec.startswith("redis://"):
+        return RedisBackend(spec)
+    if spec.startswith("file://"):
+        spec = unquote(urlparse(spec).path)
+    return FileBackend(spec)
+
+
+_BACKEND = None
+_BACKEND_READY = False
+_BACKEND_LOCK = threading.Lock()
+
+
+def get_backend():
+    # Một backend cho cả tiến trình (như pdfvoice.store.get_store)
+    global _BACKEND, _BACKEND_READY
+    with _BACKEND_LOCK:
+        if not _BACKEND_READY:
+            try:
+                _BACKEND = make_backend(SHARED_CACHE)
+            except OSError:
+                # Không tạo được thư mục dùng chung: chạy như không có backend
+                _BACKEND = None
+            _BACKEND_READY = True
+        return _BACKEND
+
+
+# --- LẤY HOẶC TÍNH ---
+_FLIGHT = SingleFlight()
+
+
+def _safe(fn, *args, default=None):
+    # Backend chậm / sập không được làm hỏng việc đọc sách
+    try:
+        return fn(*args)
+    except (OSError, RedisError, ValueError):
+        return default
+
+
+def _compute_shared(key, compute):
+    backend = get_backend()
+    if backend is None:
+        return compute(), "computed"
+
+    value = _safe(backend.get, key)
+    metrics.count_cache("shared", value is not None)
+    if value is not None:
+        return value, "shared"
+
+    # Backend lỗi khi lấy phiếu -> cứ OCR (token "" = không có phiếu để trả)
+    token = _safe(backend.claim, key, LEASE_SECONDS, default="")
+    deadline = time.monotonic() + WAIT_SECONDS
+    while token is None and time.monotonic() < deadline:
+        # Bản khác đang OCR trang này: chờ kết quả của nó
+        time.sleep(POLL_SECONDS)
+        value = _safe(backend.get, key)
+        if value is not None:
+            metrics.count_dedup("replica")
+            return value, "shared"
+        # Phiếu hết hạn / được trả mà không có kết quả (bản kia lỗi) -> tự làm
+        token = _safe(backend.claim, key, LEASE_SECONDS, default="")
+
+    try:
+        value = compute()
+        _safe(backend.put, key, value)
+    finally:
+        if token:
+            _safe(backend.release, key, token)
+    return value, "computed"
+
+
+def get_or_compute(fingerprint, page_number, params, compute):
+    """
+    compute() (trả về dict kết quả) chỉ chạy một lần cho mỗi khoá dù nhiều phiên / bản Streamlit cùng hỏi.
+    Trả về (kết quả, nguồn): 'computed' (tự tính), 'waited' (chờ luồng khác trong tiến trình),
+    'shared' (lấy từ backend dùng chung).
+    """
+    key = page_key(fingerprint, page_number, params)
+    (value, source), leader = _FLIGHT.do(key, lambda: _compute_shared(key, compute))
+    if not leader:
+        metrics.count_dedup("process")
+        return dict(value), "waited"
+    return value, source
@@ -0,0 +1,114 @@
+"""
+Chuẩn bị chữ cho giọng đọc của trình duyệt (speechSynthesis) ngay trên server, một lần mỗi trang:
+chuẩn hoá (NFC, khoảng trắng, dấu câu), tách câu tiếng Việt không cắt nhầm ở chữ viết tắt
+(TP. Hồ Chí Minh, PGS. TS., v.v.), rồi gộp / cắt thành các đoạn vừa một lần đọc.
+
+Kết quả (danh sách chuỗi) nằm chung cache với chữ OCR (pdfvoice.profiles.page_content) và
+được gửi xuống component đọc tĩnh (pdfvoice.speech_component) dạng JSON, thay cho việc nhét cả
+trang vào chuỗi JS rồi tách câu bằng regex trong trình duyệt ở mỗi lần rerun.
+"""
+import re
+import unicodedata
+
+# Đoạn dài quá thì Chrome trên Android hay tự dừng giữa chừng; ngắn quá thì ngắt nghỉ nhiều
+CHUNK_CHARS = 220
+# Câu ngắn hơn mức này được gộp với câu sau
+MIN_CHUNK_CHARS = 40
+
+# Chữ viết tắt hay gặp: dấu chấm sau chúng không phải hết câu (so không phân biệt hoa thường)
+ABBREVIATIONS = frozenset(word.lower() for word in (
+    "TP", "Tp", "TX", "TT", "KP", "QL", "ĐT",
+    "GS", "PGS", "TS", "ThS", "BS", "KS", "CN", "NCS", "ĐH", "CĐ", "THPT", "THCS", "UBND",
+    "NXB", "Nxb", "Tr", "tr", "St", "TK", "VD", "vd", "Ch", "Chg", "Sđd", "sđd", "Tld", "tld",
+    "Mr", "Mrs", "Ms", "Dr", "Prof", "No", "Vol", "Fig", "etc",
+))
+
+# Dấu kết thúc câu (kèm ngoặc / nháy đóng) rồi tới khoảng trắng
+_SENTENCE_END = re.compile(r'[.!?…]+["”’»)\]]*(?=\s)')
+# Chữ (kể cả có dấu) đứng ngay trước dấu chấm, ví dụ "TP." hay "v.v."
+_WORD_BEFORE = re.compile(r'([^\W\d_]+(?:\.[^\W\d_]+)*)\.$')
+_OPENERS = '"“‘«(['
+_SPACE_BEFORE_PUNCT = re.compile(r'\s+([,.;:!?…)\]”’»])')
+_SOFT_BREAK = re.compile(r'(?<=[,;:–—])\s+')
+_INVISIBLE = re.compile('[\u00ad\u200b-\u200f\u2060\ufeff]')
+
+
+def normalize(text):
+    """NFC + gộp khoảng trắng + bỏ khoảng trắng trước dấu câu (OCR hay để "chữ ,")."""
+    text = unicodedata.normalize("NFC", text)
+    # Ký tự vô hình (gạch nối mềm, zero-width) bỏ đi; split() gộp luôn NBSP, \f cuối trang của Tesseract...
+    text = " ".join(_INVISIBLE.sub("", text).split())
+    return _SPACE_BEFORE_PUNCT.sub(r"\1", text)
+
+
+def _is_boundary(text, match):
+    rest = text[match.end():].lstrip()
+    if not rest:
+        return True
+    following = rest[1:2] if rest[0] in _OPENERS else rest[0]
+    # Câu mới bắt đầu bằng chữ hoa, số hoặc ngoặc mở; "Ôi! anh..." viết thường thì chưa hết câu
+    if not (following.isupper() or following.isdigit()):
+        return False
+    if match.group().rstrip('"”’»)]') != ".":
+        return True
+    word = _WORD_BEFORE.search(text[:match.start() + 1])
+    if not word:
+        return True
+    word = word.group(1)
+    # Viết tắt đã biết, chữ cái đầu của tên người (N. Trãi), hay kiểu "v.v" / "T.Ư" có chấm bên trong
+    if word.lower() in ABBREVIATIONS or (len(word) == 1 and word.isupper()):
+        return False
+    return "." not in word or word.lower() == "v.v"
+
+
+def sentences(text):
+    """Tách câu (chữ đã normalize)."""
+    result = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        if _is_boundary(text, match):
+            result.append(text[start:match.end()].strip())
+            start = match.end()
+    tail = text[start:].strip()
+    if tail:
+        result.append(tail)
+    return [sentence for sentence in result if sentence]
+
+
+def _split_long(sentence, max_chars):
+    # Câu dài: cắt ở dấu phẩy / chấm phẩy / gạch ngang trước, không được thì ở khoảng trắng
+    pieces = []
+    current = ""
+    for part in _SOFT_BREAK.split(sentence):
+        while len(part) > max_chars:
+            cut = part.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(part[:cut])
+            part = part[cut:].lstrip()
+        if current and len(current) + 1 + len(part) > max_chars:
+            pieces.append(current)
+            current = part
+        else:
+            current = f"{current} {part}" if current else part
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunks(text, max_chars=CHUNK_CHARS, min_chars=MIN_CHUNK_CHARS):
+    """Chữ của một trang -> các đoạn để trình duyệt đọc lần lượt (mỗi đoạn <= max_chars)."""
+    result = []
+    current = ""
+    for sentence in sentences(normalize(text)):
+        for piece in _split_long(sentence, max_chars) if len(sentence) > max_chars else [sentence]:
+            if current and (len(current) >= min_chars or len(current) + 1 + len(piece) > max_chars):
+                result.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+    if current:
+        result.append(current)
+    return result
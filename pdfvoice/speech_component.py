@@ -0,0 +1,60 @@
+"""
+Component Streamlit đọc bằng giọng của trình duyệt (speechSynthesis), tự sang trang.
+
+JS là file tĩnh (pdfvoice/components/speech), trình duyệt tải một lần rồi cache; component giữ
+nguyên giữa các lần rerun cùng key. Python gửi xuống các đoạn câu đã tách sẵn (pdfvoice.speech)
+của trang đang đọc và vài trang kế tiếp đã OCR xong (reading_queue); đọc hết trang thì component
+tự sang trang kế ngay trên trình duyệt rồi báo vị trí lên. App đặt ảnh trang + component trong một
+st.fragment: lần báo đó chỉ chạy lại fragment (reported_page -> trang mới, hàng đợi mới), không
+rerun cả app, không bấm nút "TIẾP THEO" như trước.
+Module duy nhất trong pdfvoice import streamlit (các app import, pdfvoice.batch thì không).
+"""
+import os
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "speech")
+# Số trang kế tiếp gửi sẵn xuống trình duyệt (chỉ trang đã OCR xong)
+AHEAD_PAGES = int(os.environ.get("PDF_VOICE_SPEECH_AHEAD", "3"))
+SPEECH_KEY = "pdfvoice-speech"
+
+_speech = components.declare_component("speech", path=COMPONENT_DIR)
+
+
+def _ack_key(key):
+    return key + "-ack"
+
+
+def reported_page(key=SPEECH_KEY):
+    """
+    Trang component vừa đọc tới mà app chưa xử lý (gọi đầu fragment), không có thì None.
+    Component đọc hết trang mà chưa có trang sau -> trang đó + 1 (lớn hơn số trang = hết sách).
+    """
+    report = st.session_state.get(key)
+    if not report or report.get("seq") == st.session_state.get(_ack_key(key)):
+        return None
+    st.session_state[_ack_key(key)] = report["seq"]
+    return report["page"] + 1 if report.get("done") else report["page"]
+
+
+def reading_queue(pdf, page_number, chunks_of, ready=None, ahead=AHEAD_PAGES):
+    """
+    [{"page", "chunks"}] cho browser_reader: trang page_number rồi tối đa ahead trang đọc được kế
+    tiếp (bỏ trang trắng như pdf.next_readable_page). chunks_of(n): các đoạn câu của trang n.
+    Trang sau chỉ lấy khi ready(n) (đã OCR xong, lấy ra không phải chờ), gặp trang chưa xong thì
+    dừng; ready None = chỉ trang đang đọc.
+    """
+    queue = [{"page": page_number, "chunks": chunks_of(page_number)}]
+    while ready is not None and len(queue) <= ahead and queue[-1]["page"] < pdf.page_count:
+        next_page = pdf.next_readable_page(queue[-1]["page"] + 1)
+        if not ready(next_page):
+            break
+        queue.append({"page": next_page, "chunks": chunks_of(next_page)})
+    return queue
+
+
+def browser_reader(queue, page, rate=1.0, key=SPEECH_KEY):
+    """Đọc từ trang page theo hàng đợi queue (reading_queue); trả về vị trí component báo lên gần nhất."""
+    return _speech(pages=queue, page=page, ack=st.session_state.get(_ack_key(key)), rate=rate,
+                   key=key, default=None)
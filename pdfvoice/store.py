@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- NƠI LƯU KẾT QUẢ OCR ---
+# Đặt PDF_VOICE_CACHE_DIR để đổi thư mục (ví dụ ổ đĩa gắn ngoài khi deploy).
+CACHE_DIR = os.environ.get(
+    "PDF_VOICE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "pdf_voice")
+)
+
+
+def pdf_fingerprint(pdf_bytes):
+    # Khoá theo nội dung file chứ không theo tên -> upload lại cùng cuốn sách vẫn trúng
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def ocr_params(**params):
+    # Chuỗi cố định (đã sắp xếp) cho bộ tham số OCR: zoom, psm, tiền xử lý, ngôn ngữ...
+    return json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+
+class PageTextStore:
+    """
+    Kho chữ OCR trên đĩa (SQLite), khoá = (vân tay PDF, số trang, tham số OCR).
+    Restart / redeploy không mất kết quả; mở lại sách cũ chỉ tốn một lần tra khoá.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "pages.sqlite3")
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL để nhiều tiến trình Streamlit cùng đọc/ghi một file
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " fingerprint TEXT NOT NULL,"
+            " page INTEGER NOT NULL,"
+            " params TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " method TEXT NOT NULL DEFAULT 'ocr',"
+            " rung TEXT,"
+            " confidence REAL,"
+            " PRIMARY KEY (fingerprint, page, params))"
+        )
+        # Chữ đã làm sạch theo cả cuốn (pdfvoice.cleanup.clean_book); version đổi thì làm lại
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS clean_pages ("
+            " fingerprint TEXT NOT NULL,"
+            " page INTEGER NOT NULL,"
+            " params TEXT NOT NULL,"
+            " version INTEGER NOT NULL,"
+            " text TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " PRIMARY KEY (fingerprint, page, params))"
+        )
+        self._conn.commit()
+
+    def lookup_result(self, fingerprint, page_number, params):
+        # Trả về dict (text, method, rung, confidence) hoặc None nếu chưa có
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT text, method, rung, confidence FROM pages"
+                    " WHERE fingerprint=? AND page=? AND params=?",
+                    (fingerprint, page_number, params)
+                ).fetchone()
+        except sqlite3.Error:
+            # Kho lỗi thì coi như chưa có, OCR lại bình thường
+            return None
+        if not row:
+            return None
+        return {"text": row[0], "method": row[1], "rung": row[2], "confidence": row[3]}
+
+    def pages_done(self, fingerprint, params):
+        # Các trang của sách đã có chữ với bộ tham số này (checkpoint của pdfvoice.bookjob)
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT page FROM pages WHERE fingerprint=? AND params=?", (fingerprint, params)
+                ).fetchall()
+        except sqlite3.Error:
+            return set()
+        return {row[0] for row in rows}
+
+    def texts(self, fingerprint, params):
+        # {trang: chữ} của các trang đã có (làm sạch cả cuốn một lượt)
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT page, text FROM pages WHERE fingerprint=? AND params=?", (fingerprint, params)
+                ).fetchall()
+        except sqlite3.Error:
+            return {}
+        return dict(rows)
+
+    def all_texts(self, fingerprint):
+        # {trang: chữ} của sách với mọi bộ tham số (trang OCR nhiều lần thì lấy lần mới nhất)
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT page, text FROM pages WHERE fingerprint=? ORDER BY created", (fingerprint,)
+                ).fetchall()
+        except sqlite3.Error:
+            return {}
+        return dict(rows)
+
+    def lookup_clean(self, fingerprint, page_number, params, version):
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT text FROM clean_pages WHERE fingerprint=? AND page=? AND params=? AND version=?",
+                    (fingerprint, page_number, params, version)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else None
+
+    def clean_count(self, fingerprint, params, version):
+        try:
+            with self._lock:
+                return self._conn.execute(
+                    "SELECT COUNT(*) FROM clean_pages WHERE fingerprint=? AND params=? AND version=?",
+                    (fingerprint, params, version)
+                ).fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def put_clean(self, fingerprint, params, version, texts):
+        # texts: {trang: chữ đã làm sạch}; ghi cả cuốn trong một transaction
+        now = time.time()
+        try:
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO clean_pages (fingerprint, page, params, version, text, created)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    [(fingerprint, page, params, version, text, now) for page, text in texts.items()]
+                )
+                self._conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def put(self, fingerprint, page_number, params, text, method="ocr", rung=None, confidence=None):
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO pages"
+                    " (fingerprint, page, params, text, created, method, rung, confidence)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (fingerprint, page_number, params, text, time.time(), method, rung, confidence)
+                )
+                self._conn.commit()
+        except sqlite3.Error:
+            pass
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_store():
+    # Một kết nối cho cả tiến trình (dùng chung giữa các phiên và luồng đọc trước)
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = PageTextStore()
+        return _STORE
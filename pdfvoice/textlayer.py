@@ -0,0 +1,115 @@
+import fitz  # PyMuPDF
+
+from pdfvoice import blank, cleanup, metrics, search, shared_cache
+from pdfvoice.store import get_store
+
+# --- NGƯỠNG NHẬN DIỆN LỚP CHỮ CÓ SẴN ---
+# Trang có ít hơn MIN_CHARS ký tự (chỉ số trang, header...) coi như trang scan.
+MIN_CHARS = 50
+# Tỉ lệ diện tích khung chữ / diện tích trang. Trang sách chữ kín thường 0.2-0.5.
+MIN_GLYPH_COVERAGE = 0.02
+# Font thiếu bảng ToUnicode cho ra toàn ký tự rác -> OCR còn đúng hơn.
+MAX_BAD_CHAR_RATIO = 0.05
+# Ảnh phủ gần kín trang mà chữ lại thưa -> trang scan có lớp chữ lẻ tẻ.
+SCAN_IMAGE_COVERAGE = 0.6
+SCAN_GLYPH_COVERAGE = 0.05
+
+
+@metrics.timed("textlayer")
+def analyze_text_layer(page):
+    """
+    Xem trang có lớp chữ dùng được không (mật độ chữ + độ phủ glyph).
+    Trả về dict: method ('native' hoặc 'ocr'), reason, text, chars, coverage.
+    """
+    page_rect = page.rect
+    page_area = abs(page_rect) or 1.0
+
+    chars = 0
+    bad_chars = 0
+    glyph_area = 0.0
+    for block in page.get_text("dict")["blocks"]:
+        if block["type"] != 0:
+            continue
+        for line in block["lines"]:
+            for span in line["spans"]:
+                span_text = span["text"].strip()
+                if not span_text:
+                    continue
+                chars += len(span_text)
+                bad_chars += sum(1 for c in span_text if c == "\ufffd" or not c.isprintable())
+                glyph_area += abs(fitz.Rect(span["bbox"]) & page_rect)
+
+    image_area = sum(abs(fitz.Rect(info["bbox"]) & page_rect) for info in page.get_image_info())
+
+    coverage = glyph_area / page_area
+    image_coverage = min(image_area / page_area, 1.0)
+    result = {"method": "ocr", "reason": "", "text": "",
+              "chars": chars, "coverage": coverage, "image_coverage": image_coverage}
+
+    if chars < MIN_CHARS:
+        result["reason"] = "ít chữ"
+    elif bad_chars / chars > MAX_BAD_CHAR_RATIO:
+        result["reason"] = "font lỗi"
+    elif coverage < MIN_GLYPH_COVERAGE:
+        result["reason"] = "chữ quá thưa"
+    elif image_coverage > SCAN_IMAGE_COVERAGE and coverage < SCAN_GLYPH_COVERAGE:
+        result["reason"] = "trang scan"
+    else:
+        result["method"] = "native"
+        result["reason"] = "có lớp chữ"
+        result["text"] = page.get_text()
+    return result
+
+
+def read_page_result(page, fingerprint, page_number, params, run_ocr):
+    """
+    Lấy chữ của trang: kho trên đĩa -> lớp chữ của PDF -> OCR (run_ocr).
+    Trang trắng / ngăn cách / chỉ có hình (pdfvoice.blank) không chạy OCR: text rỗng, method là loại trang;
+    kết quả này không ghi vào kho (nhận diện lại mỗi lần, vài ms) để sửa cách nhận diện thì trang
+    bỏ nhầm được OCR lại.
+    Nhiều phiên cùng hỏi một trang chưa có trong kho thì chỉ tính một lần (pdfvoice.shared_cache).
+    run_ocr trả về chuỗi, hoặc dict (text, rung, confidence) nếu là OCR tự động (pdfvoice.ladder).
+    Kết quả ghi vào kho và chỉ mục tìm kiếm (pdfvoice.search); trả về dict text, method, rung, confidence.
+    """
+    store = get_store()
+    row = store.lookup_result(fingerprint, page_number, params)
+    metrics.count_cache("store", row is not None)
+    if row is not None:
+        metrics.note(store="hit", method=row["method"])
+        return row
+
+    layer = analyze_text_layer(page)
+    if layer["method"] != "native":
+        kind = blank.classify_page(page)["kind"]
+        if kind in blank.SKIP_KINDS:
+            metrics.note(store="skip", method=kind)
+            return {"text": "", "method": kind, "rung": None, "confidence": None}
+
+    def compute():
+        result = {"method": layer["method"], "rung": None, "confidence": None}
+        if layer["method"] == "native":
+            result["text"] = layer["text"]
+        else:
+            ocr = run_ocr()
+            result.update(ocr if isinstance(ocr, dict) else {"text": ocr})
+        return result
+
+    # Phiên / luồng đọc trước / bản Streamlit khác đang làm đúng trang này thì chờ kết quả của nó
+    result, source = shared_cache.get_or_compute(fingerprint, page_number, params, compute)
+    metrics.note(store="miss" if source == "computed" else source, method=result["method"])
+    if source != "waited":
+        # "waited": luồng đã tính tự ghi vào kho
+        store.put(fingerprint, page_number, params, result["text"], method=result["method"],
+                  rung=result["rung"], confidence=result["confidence"])
+        search.index_page(fingerprint, page_number, cleanup.clean_page(result["text"]))
+    return result
+
+
+def read_page(page, fingerprint, page_number, params, run_ocr):
+    """Như read_page_result, trả về (text, method)."""
+    result = read_page_result(page, fingerprint, page_number, params, run_ocr)
+    return result["text"], result["method"]
+
+
+def read_page_text(page, fingerprint, page_number, params, run_ocr):
+    return read_page(page, fingerprint, page_number, params, run_ocr)[0]
@@ -0,0 +1,137 @@
+"""
+Đọc bằng edge-tts theo từng đoạn câu, tổng hợp song song (có giới hạn) trên một
+event loop chạy nền. Đoạn đầu để ngắn cho nhanh có tiếng; trong lúc phát đoạn 1
+thì các đoạn sau và trang kế tiếp vẫn đang được tổng hợp.
+"""
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import edge_tts
+import edge_tts.communicate
+
+from pdfvoice import metrics
+from pdfvoice.audio_cache import get_audio_cache
+
+# --- CẤU HÌNH ---
+# Số yêu cầu edge-tts chạy cùng lúc (cho cả tiến trình)
+TTS_CONCURRENCY = int(os.environ.get("PDF_VOICE_TTS_CONCURRENCY", "4"))
+# Đoạn đầu ngắn để có tiếng sớm, các đoạn sau dài hơn để bớt số lần gọi
+FIRST_CHUNK_CHARS = 160
+MAX_CHUNK_CHARS = 600
+# Số trang (âm thanh) giữ lại trong bộ nhớ
+MAX_PAGES = 16
+
+# Trỏ edge-tts sang máy chủ giả lập (pdfvoice.fake_tts) để chạy offline
+TTS_URL = os.environ.get("PDF_VOICE_TTS_URL")
+if TTS_URL:
+    edge_tts.communicate.WSS_URL = TTS_URL
+
+SENTENCE_END = re.compile(r'(?<=[.!?…;:])\s+')
+
+
+def split_sentences(text, first_chars=FIRST_CHUNK_CHARS, max_chars=MAX_CHUNK_CHARS):
+    """Tách theo câu rồi gộp lại thành các đoạn <= max_chars (đoạn đầu <= first_chars)."""
+    sentences = []
+    for sentence in SENTENCE_END.split(' '.join(text.split())):
+        # Câu dài quá thì cắt ở khoảng trắng
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            sentences.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            sentences.append(sentence)
+
+    chunks = []
+    current = ""
+    for sentence in sentences:
+        limit = first_chars if not chunks else max_chars
+        if current and len(current) + 1 + len(sentence) > limit:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# --- EVENT LOOP NỀN ---
+_LOOP = None
+_LIMIT = None
+_LOCK = threading.Lock()
+_PAGES = OrderedDict()
+
+
+def _get_loop():
+    global _LOOP, _LIMIT
+    if _LOOP is None:
+        _LOOP = asyncio.new_event_loop()
+        _LIMIT = asyncio.Semaphore(TTS_CONCURRENCY)
+        threading.Thread(target=_LOOP.run_forever, name="pdf-tts", daemon=True).start()
+    return _LOOP
+
+
+async def synthesize_cached(text, voice, rate):
+    # Đoạn đã từng đọc (cùng chữ, giọng, tốc độ) lấy thẳng từ cache, không gọi mạng
+    async def save(output_file):
+        start = time.perf_counter()
+        communicate = edge_tts.Communicate(text, voice, rate=rate)
+        await communicate.save(output_file)
+        metrics.observe_stage("tts", time.perf_counter() - start)
+
+    return await get_audio_cache().get_or_synthesize(text, voice, rate, save)
+
+
+async def _synthesize(text, voice, rate):
+    async with _LIMIT:
+        return await synthesize_cached(text, voice, rate)
+
+
+def start_page_audio(text, voice, rate):
+    """
+    Bắt đầu tổng hợp (chạy nền) mọi đoạn của một trang, trả về list Future
+    (đúng thứ tự đoạn). Gọi lại với cùng (text, voice, rate) thì dùng lại kết quả.
+    """
+    key = (text, voice, rate)
+    with _LOCK:
+        loop = _get_loop()
+        futures = _PAGES.get(key)
+        if futures is None:
+            futures = [
+                asyncio.run_coroutine_threadsafe(_synthesize(chunk, voice, rate), loop)
+                for chunk in split_sentences(text)
+            ]
+            _PAGES[key] = futures
+            while len(_PAGES) > MAX_PAGES:
+                _PAGES.popitem(last=False)
+        else:
+            _PAGES.move_to_end(key)
+        return futures
+
+
+def prefetch_page_audio(text, voice, rate):
+    # Trang kế tiếp: chỉ xếp hàng tổng hợp, không chờ
+    if text and len(text.strip()) >= 2:
+        start_page_audio(text, voice, rate)
+
+
+def stream_page_audio(text, voice, rate, timeout=120):
+    """
+    Generator: trả đường dẫn mp3 của từng đoạn ngay khi đoạn đó xong (theo thứ tự).
+    Đoạn lỗi trả về None để bên phát bỏ qua mà vẫn biết tổng số đoạn.
+    """
+    futures = start_page_audio(text, voice, rate)
+    for future in futures:
+        try:
+            yield future.result(timeout)
+        except Exception:
+            # Đoạn lỗi (mất mạng...) -> bỏ kết quả của trang để lần sau thử lại
+            with _LOCK:
+                if _PAGES.get((text, voice, rate)) is futures:
+                    del _PAGES[(text, voice, rate)]
+            yield None
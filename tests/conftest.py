@@ -0,0 +1,11 @@
+"""
+Cấu hình chung cho pytest: kho chữ / cache âm thanh / chỉ mục tìm kiếm ghi vào thư mục tạm,
+không đụng ~/.cache/pdf_voice. Phải đặt trước khi import pdfvoice (các module đọc biến môi trường
+lúc import).
+"""
+import os
+import sys
+import tempfile
+
+os.environ["PDF_VOICE_CACHE_DIR"] = tempfile.mkdtemp(prefix="pdfvoice-test-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
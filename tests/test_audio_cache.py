@@ -0,0 +1,43 @@
+import os
+
+from pdfvoice.audio_cache import AudioCache, audio_key
+
+
+def _put(cache, text, size, tmp_path):
+    source = tmp_path / f"src-{len(os.listdir(tmp_path))}.mp3"
+    source.write_bytes(b"\0" * size)
+    return cache.put_file(text, "voice", "+0%", str(source))
+
+
+def test_evicts_least_recently_used_over_budget(tmp_path):
+    cache = AudioCache(directory=str(tmp_path / "audio"), max_bytes=250)
+    a = _put(cache, "trang một", 100, tmp_path)
+    b = _put(cache, "trang hai", 100, tmp_path)
+    # Dùng lại "trang một" -> "trang hai" thành cũ nhất
+    assert cache.get("trang một", "voice", "+0%") == a
+    c = _put(cache, "trang ba", 100, tmp_path)
+
+    assert os.path.exists(a) and os.path.exists(c)
+    assert not os.path.exists(b)
+    assert cache.get("trang hai", "voice", "+0%") is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 200 and stats["files"] == 2
+
+
+def test_file_bigger_than_budget_is_kept(tmp_path):
+    cache = AudioCache(directory=str(tmp_path / "audio"), max_bytes=50)
+    path = _put(cache, "trang dài", 100, tmp_path)
+    assert os.path.exists(path)
+    assert cache.stats()["files"] == 1
+
+
+def test_reload_from_disk_and_key_normalization(tmp_path):
+    directory = str(tmp_path / "audio")
+    cache = AudioCache(directory=directory)
+    path = _put(cache, "Xin chào", 10, tmp_path)
+
+    reopened = AudioCache(directory=directory)
+    # Khác khoảng trắng / dạng dấu (NFD) vẫn là một khoá
+    assert reopened.get(" Xin   cha\u0300o ", "voice", "+0%") == path
+    assert audio_key("Xin chào", "voice", "+0%") != audio_key("Xin chào", "voice", "+10%")
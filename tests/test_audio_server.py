@@ -0,0 +1,85 @@
+import functools
+import os
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from pdfvoice.audio_server import AudioRequestHandler, audio_url
+
+NAME = "a" * 64 + ".mp3"
+DATA = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def base_url(tmp_path):
+    (tmp_path / NAME).write_bytes(DATA)
+    server = ThreadingHTTPServer(("127.0.0.1", 0),
+                                 functools.partial(AudioRequestHandler, directory=str(tmp_path)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _get(url, range_header=None):
+    request = urllib.request.Request(url, headers={"Range": range_header} if range_header else {})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, b""
+
+
+def test_full_file(base_url):
+    status, headers, body = _get(f"{base_url}/{NAME}")
+    assert status == 200
+    assert body == DATA
+    assert headers["Accept-Ranges"] == "bytes"
+    assert headers.get("Access-Control-Allow-Origin") is None
+
+
+@pytest.mark.parametrize("range_header, start, end", [
+    ("bytes=10-19", 10, 19),
+    ("bytes=1000-", 1000, len(DATA) - 1),
+    ("bytes=-24", len(DATA) - 24, len(DATA) - 1),
+    ("bytes=1000-99999", 1000, len(DATA) - 1),
+])
+def test_range(base_url, range_header, start, end):
+    status, headers, body = _get(f"{base_url}/{NAME}", range_header)
+    assert status == 206
+    assert body == DATA[start:end + 1]
+    assert headers["Content-Range"] == f"bytes {start}-{end}/{len(DATA)}"
+    assert headers["Content-Length"] == str(end - start + 1)
+
+
+@pytest.mark.parametrize("range_header", ["bytes=5000-", "bytes=20-10", "bytes=-", "items=0-1"])
+def test_unsatisfiable_range(base_url, range_header):
+    status, headers, _ = _get(f"{base_url}/{NAME}", range_header)
+    assert status == 416
+    assert headers["Content-Range"] == f"bytes */{len(DATA)}"
+
+
+@pytest.mark.parametrize("path", ["/" + "b" * 64 + ".mp3", "/../secret.mp3", "/pages.sqlite3"])
+def test_only_existing_content_addressed_files(base_url, path):
+    assert _get(base_url + path)[0] == 404
+
+
+def test_static_url_links_cache_file_and_prunes_evicted(tmp_path):
+    cache_dir, static_dir = tmp_path / "cache", tmp_path / "static"
+    cache_dir.mkdir()
+    first, second = cache_dir / NAME, cache_dir / ("c" * 64 + ".mp3")
+    first.write_bytes(DATA)
+    second.write_bytes(DATA)
+
+    assert audio_url(str(first), str(cache_dir), static_dir=str(static_dir)) == f"/app/static/audio/{NAME}"
+    assert os.path.samefile(static_dir / "audio" / NAME, first)
+    # Static serving chưa bật -> None, bên gọi nhúng base64
+    assert audio_url(str(first), str(cache_dir)) is None
+
+    # Cache xoá bản của nó (LRU) -> lần link sau dọn luôn bản trong static
+    first.unlink()
+    audio_url(str(second), str(cache_dir), static_dir=str(static_dir))
+    assert sorted(os.listdir(static_dir / "audio")) == [second.name]
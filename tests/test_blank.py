@@ -0,0 +1,69 @@
+import fitz  # PyMuPDF
+import numpy as np
+import pytest
+
+from pdfvoice import blank, textlayer
+from pdfvoice.store import get_store
+
+TEXT = "Con đường làng đi qua cánh đồng lúa chín vàng, gió thổi nhẹ. " * 40
+
+
+def _page(doc, background=None, text=True, photo=False):
+    page = doc.new_page()
+    if background is not None:
+        # Giấy ngả màu / scan tối: cả trang phủ một màu xám
+        page.draw_rect(page.rect, color=None, fill=(background / 255,) * 3)
+    if text:
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), TEXT, fontsize=11, fontname="helv")
+    if photo:
+        small = np.random.default_rng(0).integers(40, 220, (60, 45), dtype=np.uint8)
+        pixels = np.kron(small, np.ones((10, 10), dtype=np.uint8))
+        pix = fitz.Pixmap(fitz.csGRAY, pixels.shape[1], pixels.shape[0], pixels.tobytes(), False)
+        page.insert_image(fitz.Rect(30, 30, 565, 810), pixmap=pix)
+    return page
+
+
+@pytest.mark.parametrize("options, kind", [
+    ({}, "text"),
+    ({"background": 185}, "text"),
+    ({"background": 215, "text": False}, "blank"),
+    ({"background": 185, "text": False}, "blank"),
+    ({"text": False}, "blank"),
+    ({"text": False, "photo": True}, "image"),
+])
+def test_classify_page_relative_to_background(options, kind):
+    doc = fitz.open()
+    assert blank.classify_page(_page(doc, **options))["kind"] == kind
+
+
+def test_separator_page():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.draw_rect(page.rect, color=None, fill=(0.8, 0.8, 0.8))
+    page.insert_text((170, 420), "PHẦN II", fontsize=48, fontname="helv")
+    assert blank.classify_page(page)["kind"] == "separator"
+
+
+def test_skipped_pages_are_not_stored():
+    doc = fitz.open()
+    page = _page(doc, background=215, text=False)
+    store = get_store()
+
+    result = textlayer.read_page_result(page, "blank-book", 1, "p", lambda: "không được gọi")
+    assert result["method"] == "blank" and result["text"] == ""
+    # Trang "bỏ qua" không ghi vào kho: lần sau nhận diện lại
+    assert store.lookup_result("blank-book", 1, "p") is None
+
+    # Trang cần OCR (theo cách nhận diện hiện tại) thì OCR rồi mới ghi vào kho
+    tinted = _page(doc, background=185, text=False)
+    tinted.insert_image(fitz.Rect(50, 50, 550, 800), pixmap=_text_pixmap(185))
+    result = textlayer.read_page_result(tinted, "blank-book", 3, "p", lambda: "chữ OCR")
+    assert result == {"text": "chữ OCR", "method": "ocr", "rung": None, "confidence": None}
+    assert store.lookup_result("blank-book", 3, "p")["text"] == "chữ OCR"
+
+
+def _text_pixmap(background):
+    # Trang scan: chữ là ảnh (không có lớp chữ) trên nền giấy ngả màu
+    source = fitz.open()
+    _page(source, background=background)
+    return source[0].get_pixmap(dpi=72, colorspace=fitz.csGRAY)
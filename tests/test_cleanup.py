@@ -0,0 +1,65 @@
+from pdfvoice import cleanup
+
+
+def _body(page_number, lines=6):
+    # Mỗi trang chữ khác nhau (không lặp ở mép trang giữa các trang)
+    words = ["sông", "núi", "làng", "chợ", "đình", "ruộng", "mây", "gió"]
+    return "\n".join(f"{words[(page_number + k) % 8].capitalize()} {words[k % 8]} câu {k} kể chuyện"
+                     f" {'khác ' * (page_number % 3)}trang {'ấy' if k % 2 else 'này'}." for k in range(lines))
+
+
+def test_dehyphenates_line_breaks():
+    assert cleanup.clean_page("Nguy-\nễn Văn A đi học.") == "Nguyễn Văn A đi học."
+    # Từ ghép viết hoa giữ gạch nối
+    assert cleanup.clean_page("Chủ nghĩa Mác-\nLênin") == "Chủ nghĩa Mác-Lênin"
+    # Gạch nối mềm: giữa dòng bỏ đi, cuối dòng nối liền
+    assert cleanup.clean_page("hoà\u00adbình và độc lập\u00ad\nlập") == "hoàbình và độc lậplập"
+
+
+def test_paragraphs_and_symbol_lines():
+    text = "Dòng một của đoạn\nvẫn là đoạn một.\n\n~~ — ~~\nĐoạn hai."
+    assert cleanup.clean_page(text) == "Dòng một của đoạn vẫn là đoạn một.\n\nĐoạn hai."
+
+
+def test_short_words_are_not_roman_page_numbers():
+    text = "di\nCon đường làng đi qua cánh đồng.\nmi\n"
+    assert cleanup.clean_page(text) == "di Con đường làng đi qua cánh đồng. mi"
+    book = {n: _body(n) for n in range(1, 6)}
+    book[3] = text
+    assert cleanup.clean_document(book)[3] == "di Con đường làng đi qua cánh đồng. mi"
+
+
+def test_removes_repeated_header_and_numbered_folios():
+    book = {n: f"TÊN SÁCH · Chương 2\n\n{_body(n)}\n\n- {n + 10} -" for n in range(1, 8)}
+    # Trang mở chương không có số trang
+    book[4] = _body(4)
+    cleaned = cleanup.clean_document(book)
+    for n, text in cleaned.items():
+        assert "TÊN SÁCH" not in text
+        assert f"{n + 10}" not in text
+        assert text.startswith(_body(n).split("\n")[0])
+
+
+def test_roman_folios_in_front_matter():
+    book = {n: _body(n) + "\n" + roman for n, roman in zip(range(1, 5), ["i", "ii", "iii", "iv"])}
+    for n, text in cleanup.clean_document(book).items():
+        assert not text.endswith(("i", "v")), text
+
+
+def test_lone_number_without_neighbouring_sequence_is_kept():
+    book = {n: _body(n) for n in range(1, 8)}
+    book[2] += "\n1945"
+    book[6] += "\n12"
+    cleaned = cleanup.clean_document(book)
+    assert cleaned[2].endswith("1945")
+    assert cleaned[6].endswith("12")
+    # Không biết trang mấy thì không bỏ số
+    assert cleanup.clean_page("Chữ trang.\n- 12 -").endswith("12 -")
+
+
+def test_drop_garbage_uses_confidences():
+    text = "Xin chào ~@#% bạn\nđọc ¦¦"
+    assert cleanup.drop_garbage(text, [95, 90, 12, 91, 93, 20]) == "Xin chào bạn\nđọc"
+    # Từ thật độ tin cậy thấp vẫn giữ; số từ không khớp thì giữ nguyên
+    assert cleanup.drop_garbage("Xin chào", [10, 10]) == "Xin chào"
+    assert cleanup.drop_garbage(text, [95, 90]) == text
@@ -0,0 +1,71 @@
+import pytest
+
+from pdfvoice import search
+from pdfvoice.search import SearchIndex
+from pdfvoice.store import get_store
+
+PAGES = {
+    1: "Con đường cách mạng Việt Nam\nrất dài và gian khổ.",
+    2: "Nguyễn Ái Quốc viết Đường Kách mệnh năm 1927 ở Quảng Châu.",
+    3: "Hà Nội mùa thu, cây cơm nguội vàng.",
+}
+
+
+def test_fold_keeps_length_and_removes_diacritics():
+    for text in ("Đường Cách Mạng", "ươn ướt", "Quảng Châu"):
+        assert len(search.fold(text)) == len(text)
+    assert search.fold("Đường Cách Mạng") == "duong cach mang"
+    assert search.query_terms("  Đường, cách-MẠNG ") == ["duong", "cach", "mang"]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.sqlite3"))
+    index.add("book", PAGES)
+    index.add("other", {1: "đường cách mạng"})
+    return index
+
+
+@pytest.mark.parametrize("query, pages", [
+    ("duong", [1, 2]),
+    ("đường cách", [1]),
+    ("ha noi", [3]),
+    ("QUANG chau", [2]),
+    ("nguyen ai q", [2]),  # từ cuối gõ dở
+    ("xyz", []),
+])
+def test_diacritic_insensitive_matching(index, query, pages):
+    rows = index.search("book", search.query_terms(query))
+    assert sorted(page for page, _ in rows) == pages
+
+
+def test_replacing_a_page(index):
+    index.add("book", {3: "Trang ba đổi chữ: đường mới"})
+    assert [page for page, _ in index.search("book", ["ha", "noi"])] == []
+    assert [page for page, _ in index.search("book", ["duong", "moi"])] == [3]
+    assert index.pages("book") == {1, 2, 3}
+
+
+def test_snippet_keeps_accents_and_escapes_markdown():
+    text = "Giá *đặc biệt* #1 [xem](x) trên con đường: $5 và hàng_xóm"
+    snippet = search.snippet(text, ["duong"])
+    assert "**đường**" in snippet
+    assert "\\*đặc biệt\\*" in snippet and "\\#1" in snippet and "\\[xem\\]\\(x\\)" in snippet
+    assert "\\$5" in snippet and "hàng\\_xóm" in snippet
+    assert search.snippet(text, ["duong"], escape=None).startswith("Giá *đặc biệt*")
+
+
+def test_search_backfills_from_store_and_retries_after_failure(monkeypatch):
+    store = get_store()
+    for page, text in PAGES.items():
+        store.put("backfill-book", page, "p", text)
+
+    # Lần đầu ghi chỉ mục lỗi -> chưa đánh dấu, lần tìm sau làm lại
+    monkeypatch.setattr(search, "index_pages", lambda fingerprint, texts: False)
+    assert search.search("backfill-book", "duong") == []
+    monkeypatch.undo()
+
+    results = search.search("backfill-book", "duong")
+    assert sorted(result["page"] for result in results) == [1, 2]
+    assert search.indexed_count("backfill-book") == 3
+    assert search.backfill("backfill-book") == 0
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from pdfvoice import fake_redis, shared_cache
+from pdfvoice.shared_cache import RedisBackend, SingleFlight
+
+
+def test_single_flight_concurrent_callers_compute_once():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"text": "chữ"}
+
+    results = []
+
+    def caller():
+        results.append(flight.do("key", compute))
+
+    threads = [threading.Thread(target=caller) for _ in range(8)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # Chờ các luồng sau xếp hàng sau lần tính đầu
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 8
+    assert sum(leader for _, leader in results) == 1
+    assert all(value == {"text": "chữ"} for value, _ in results)
+
+
+def test_single_flight_shares_errors_and_forgets_key():
+    flight = SingleFlight()
+
+    def boom():
+        raise ValueError("hỏng")
+
+    with pytest.raises(ValueError):
+        flight.do("key", boom)
+    assert flight.do("key", lambda: 1) == (1, True)
+
+
+@pytest.fixture(scope="module")
+def redis_url():
+    return fake_redis.serve_in_background()
+
+
+def test_redis_lease_release_only_own_token(redis_url):
+    backend = RedisBackend(redis_url)
+    token = backend.claim("page-1")
+    assert token and backend.claim("page-1") is None
+    backend.release("page-1", "not-mine")
+    assert backend.claim("page-1") is None
+    backend.release("page-1", token)
+    assert backend.claim("page-1") is not None
+
+
+def test_redis_expired_lease_is_not_deleted_by_old_owner(redis_url):
+    backend = RedisBackend(redis_url)
+    old = backend.claim("page-2", lease=1)
+    time.sleep(1.1)
+    new = backend.claim("page-2", lease=30)
+    assert new is not None
+    backend.release("page-2", old)
+    assert backend.claim("page-2") is None
+
+
+def test_get_or_compute_across_backend(redis_url, monkeypatch):
+    monkeypatch.setattr(shared_cache, "get_backend", lambda: RedisBackend(redis_url))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"text": "trang", "method": "ocr"}
+
+    assert shared_cache.get_or_compute("book", 1, "p", compute) == ({"text": "trang", "method": "ocr"}, "computed")
+    # Bản Streamlit khác (cùng backend) lấy kết quả, không OCR lại
+    assert shared_cache.get_or_compute("book", 1, "p", compute)[1] == "shared"
+    assert len(calls) == 1
@@ -0,0 +1,63 @@
+import asyncio
+
+import edge_tts.communicate
+import pytest
+
+from pdfvoice import fake_tts, tts
+from pdfvoice.audio_cache import AudioCache
+
+VOICE = "vi-VN-HoaiMyNeural"
+TEXT = " ".join(f"Đây là câu thứ {n} của trang sách, đọc thử bằng máy chủ giả lập." for n in range(30))
+
+
+def test_split_sentences_first_chunk_short_then_bounded():
+    chunks = tts.split_sentences(TEXT)
+    assert len(chunks) > 2
+    assert len(chunks[0]) <= tts.FIRST_CHUNK_CHARS
+    assert all(len(chunk) <= tts.MAX_CHUNK_CHARS for chunk in chunks)
+    # Không mất chữ, không cắt giữa câu
+    assert " ".join(chunks) == " ".join(TEXT.split())
+    assert all(chunk.endswith(".") for chunk in chunks)
+
+
+def test_split_sentences_cuts_long_sentence_at_spaces():
+    sentence = "chữ " * 400
+    chunks = tts.split_sentences(sentence, max_chars=100)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert " ".join(chunks).split() == sentence.split()
+
+
+@pytest.fixture
+def fake_server(monkeypatch, tmp_path):
+    monkeypatch.setattr(edge_tts.communicate, "WSS_URL", fake_tts.serve_in_background())
+    cache = AudioCache(directory=str(tmp_path / "audio"))
+    monkeypatch.setattr(tts, "get_audio_cache", lambda: cache)
+    tts._PAGES.clear()
+    yield cache
+    tts._PAGES.clear()
+
+
+def test_stream_page_audio_against_fake_tts_then_cache_hits(fake_server):
+    cache = fake_server
+    chunks = tts.split_sentences(TEXT)
+
+    paths = list(tts.stream_page_audio(TEXT, VOICE, "+0%", timeout=30))
+    assert len(paths) == len(chunks)
+    assert all(path and path.endswith(".mp3") for path in paths)
+    assert cache.stats()["misses"] == len(chunks)
+
+    # Trang đọc lại (hết trong bộ nhớ _PAGES): mọi đoạn lấy từ cache, không gọi TTS nữa
+    tts._PAGES.clear()
+    again = list(tts.stream_page_audio(TEXT, VOICE, "+0%", timeout=30))
+    assert again == paths
+    assert cache.stats()["hits"] == len(chunks)
+    assert cache.stats()["misses"] == len(chunks)
+
+
+def test_synthesize_cached_key_ignores_whitespace(fake_server):
+    cache = fake_server
+    loop = tts._get_loop()
+    first = asyncio.run_coroutine_threadsafe(tts.synthesize_cached("Xin chào bạn.", VOICE, "+0%"), loop).result(30)
+    second = asyncio.run_coroutine_threadsafe(tts.synthesize_cached(" Xin  chào\nbạn. ", VOICE, "+0%"), loop).result(30)
+    assert first == second
+    assert cache.stats()["hits"] == 1
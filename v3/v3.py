@@ -1,12 +1,16 @@
 import streamlit as st
 import pytesseract
-import fitz  # PyMuPDF
-from PIL import Image, ImageEnhance, ImageOps
 import sys
 import shutil
-import time
+import os
 import streamlit.components.v1 as components
 
+# v3/ nằm trong thư mục con -> thêm thư mục gốc để import được pdfvoice
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdfvoice import bookjob, metrics, profiles
+from pdfvoice.documents import get_document
+from pdfvoice.prefetch import PagePrefetcher
+
 # --- CẤU HÌNH HỆ THỐNG ---
 if sys.platform.startswith('win'):
     PATH_TESSERACT = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
@@ -18,22 +22,15 @@ if PATH_TESSERACT:
 
 # --- HÀM XỬ LÝ ẢNH (TURBO) ---
 @st.cache_data(show_spinner=False)
-def get_page_content(pdf_bytes, page_number):
+def get_page_content(_pdf, digest, page_number):
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page = doc.load_page(page_number - 1)
-        
-        mat = fitz.Matrix(2.0, 2.0)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img_visual = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        
-        img_ocr = ImageOps.grayscale(img_visual)
-        img_ocr = ImageEnhance.Contrast(img_ocr).enhance(2.0)
-        custom_config = r'--oem 3 --psm 6'
-        text = pytesseract.image_to_string(img_ocr, lang='vie', config=custom_config)
+        # _pdf (OpenDocument) không bị Streamlit băm; khoá cache chỉ là digest + số trang
+        page = _pdf.load_page(page_number)
         
-        text = text.replace('\n', ' ').strip()
-        return img_visual, text
+        # Hồ sơ "desktop" dùng chung (pdfvoice.profiles): JPEG vừa màn hình để xem; trang scan mới
+        # render ảnh xám Matrix 2.0 + tương phản 2.0 để OCR. Kho chữ chung với các app khác.
+        content = profiles.page_content(page, digest, page_number, "desktop")
+        return content["image"], content["text"]
     except Exception as e:
         return None, str(e)
 
@@ -114,8 +111,17 @@ def speak_client_side(text, page_num):
     """
     components.html(html_code, height=0)
 
+# --- TIẾN ĐỘ OCR CẢ CUỐN ---
+# Fragment tự chạy lại vài giây một lần: thanh tiến độ cập nhật mà không rerun cả trang
+@st.fragment(run_every=bookjob.PROGRESS_SECONDS)
+def show_book_progress(job):
+    progress = job.progress()
+    st.progress(progress["done"] / progress["total"], text=bookjob.progress_text(progress))
+
 # --- GIAO DIỆN CHÍNH ---
 st.set_page_config(page_title="PDF Reader V21 (Fix)", layout="wide")
+# Đặt PDF_VOICE_METRICS_PORT (vd 8503) để xem thời gian từng bước ở http://127.0.0.1:<cổng>/metrics
+metrics.start_metrics_server()
 
 with st.sidebar:
     st.header("📂 Cài đặt")
@@ -124,11 +130,16 @@ with st.sidebar:
 if uploaded_file:
     if 'current_page' not in st.session_state: st.session_state.current_page = 1
     if 'is_auto' not in st.session_state: st.session_state.is_auto = False
+    if 'prefetcher' not in st.session_state: st.session_state.prefetcher = PagePrefetcher()
+
+    # Mở file một lần cho cả phiên: rerun không đọc lại / băm lại cả file
+    pdf = get_document(st.session_state, uploaded_file)
+    total_pages = pdf.page_count
 
-    doc = fitz.open(stream=uploaded_file.read(), filetype="pdf")
-    total_pages = doc.page_count
-    uploaded_file.seek(0)
-    bytes_data = uploaded_file.read()
+    # Auto: trang trắng / trang ngăn cách / trang chỉ có hình thì nhảy qua ngay trong lượt chạy này
+    # (kiểm tra trên ảnh ~50 dpi, không OCR, không ngủ, không rerun thêm)
+    if st.session_state.is_auto:
+        st.session_state.current_page = pdf.next_readable_page(st.session_state.current_page)
 
     col_vis, col_ctrl = st.columns([1.3, 1])
 
@@ -145,6 +156,8 @@ if uploaded_file:
 
         if selected_page != st.session_state.current_page:
             st.session_state.current_page = selected_page
+            # Nhảy trang -> huỷ các trang đang xếp hàng đọc trước của vị trí cũ
+            st.session_state.prefetcher.cancel()
             st.rerun()
 
         st.markdown("---")
@@ -169,7 +182,27 @@ if uploaded_file:
                     st.rerun()
 
     # Cột Trái: Ảnh
-    img_show, text_content = get_page_content(bytes_data, st.session_state.current_page)
+    # Cả cuốn được OCR trước trong nền: trang đang đọc, các trang sau rồi phần còn lại (pdfvoice.bookjob)
+    if bookjob.BOOK_JOB_ENABLED:
+        book_job = bookjob.get_job(pdf, "desktop", st.session_state.current_page)
+        with st.sidebar:
+            show_book_progress(book_job)
+
+    # Đo thời gian từng bước của trang (cache, render, OCR...) -> log, /metrics, bảng debug
+    with metrics.page_trace("get_page_content", st.session_state.current_page) as page_trace:
+        img_show, text_content = get_page_content(pdf, pdf.digest, st.session_state.current_page)
+        page_trace.add_payload("image", len(img_show or b""))
+
+    # Bảng thời gian xử lý các trang gần nhất (bật bằng PDF_VOICE_DEBUG_PANEL=1)
+    if metrics.DEBUG_PANEL:
+        with st.sidebar.expander("🐞 Thời gian xử lý", expanded=True):
+            st.dataframe(metrics.recent(), use_container_width=True)
+
+    # OCR sẵn các trang kế tiếp trong lúc trình duyệt đang đọc trang này
+    st.session_state.prefetcher.schedule(
+        get_page_content, st.session_state.current_page, total_pages, pdf, pdf.digest,
+        doc_key=pdf.digest
+    )
     with col_vis:
         if img_show: st.image(img_show, caption=f"Trang {st.session_state.current_page}", use_container_width=True)
 
@@ -178,13 +211,13 @@ if uploaded_file:
         with col_ctrl:
             if text_content:
                 st.toast(f"🔊 Đang đọc trang {st.session_state.current_page}...")
+                page_trace.add_payload("speech", len(text_content.encode()))
                 speak_client_side(text_content, st.session_state.current_page)
                 
                 with st.expander("Văn bản"):
                     st.write(text_content)
             else:
-                st.warning("Trang trắng. Chuyển tiếp...")
-                time.sleep(1)
+                # Trang có nội dung nhưng OCR không ra chữ: sang trang luôn
                 if st.session_state.current_page < total_pages:
                     st.session_state.current_page += 1
                     st.rerun()
@@ -1,12 +1,15 @@
 import streamlit as st
 import pytesseract
-import fitz  # PyMuPDF
-from PIL import Image, ImageEnhance, ImageOps
+import json
 import sys
 import shutil
-import time
 import streamlit.components.v1 as components
 
+from pdfvoice import bookjob, metrics, profiles, search
+from pdfvoice.documents import get_document
+from pdfvoice.prefetch import PagePrefetcher
+from pdfvoice.speech_component import browser_reader, reading_queue, reported_page
+
 # --- CẤU HÌNH HỆ THỐNG ---
 if sys.platform.startswith('win'):
     PATH_TESSERACT = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
@@ -18,72 +21,97 @@ if PATH_TESSERACT:
 
 # --- HÀM XỬ LÝ ẢNH (TURBO) ---
 @st.cache_data(show_spinner=False)
-def get_page_content(pdf_bytes, page_number):
+def get_page_content(_pdf, digest, page_number):
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page = doc.load_page(page_number - 1)
-        
-        # Render ảnh
-        mat = fitz.Matrix(2.0, 2.0)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img_visual = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        
-        # OCR
-        img_ocr = ImageOps.grayscale(img_visual)
-        img_ocr = ImageEnhance.Contrast(img_ocr).enhance(2.0)
-        custom_config = r'--oem 3 --psm 6'
-        text = pytesseract.image_to_string(img_ocr, lang='vie', config=custom_config)
+        # _pdf (OpenDocument) không bị Streamlit băm; khoá cache chỉ là digest + số trang
+        page = _pdf.load_page(page_number)
         
-        text = text.replace('\n', ' ').strip()
-        return img_visual, text
+        # Hồ sơ "desktop" dùng chung (pdfvoice.profiles): JPEG vừa màn hình để xem; trang scan mới
+        # render ảnh xám Matrix 2.0 + tương phản 2.0 để OCR. Kho chữ chung với các app khác.
+        # Các đoạn câu để đọc đã tách sẵn ở server, cache cùng chữ (pdfvoice.speech)
+        content = profiles.page_content(page, digest, page_number, "desktop")
+        return content["image"], content["text"], content["chunks"]
     except Exception as e:
-        return None, str(e)
-
-# --- JAVASCRIPT TỰ ĐỌC ---
-def speak_client_side(text, page_num):
-    safe_text = text.replace('"', '\\"').replace("'", "\\'").replace('\n', ' ')
-    
-    html_code = f"""
-    <script>
-        window.speechSynthesis.cancel();
-
-        function startSpeaking() {{
-            var msg = new SpeechSynthesisUtterance();
-            msg.text = "{safe_text}";
-            msg.lang = 'vi-VN';
-            msg.rate = 1.1;
-            
-            var voices = window.speechSynthesis.getVoices();
-            var vnVoice = voices.find(v => v.lang.includes('vi') && v.name.includes('Microsoft')) || 
-                          voices.find(v => v.lang.includes('vi'));
-            
-            if (vnVoice) {{ msg.voice = vnVoice; }}
-
-            msg.onend = function(event) {{
-                // Tìm nút Auto Next để bấm
-                var buttons = window.parent.document.getElementsByTagName('button');
-                for (var i = 0; i < buttons.length; i++) {{
-                    if (buttons[i].innerText.includes("Auto Next")) {{
-                        buttons[i].click();
-                        break;
-                    }}
-                }}
-            }};
-
-            window.speechSynthesis.speak(msg);
-        }}
-
-        if (window.speechSynthesis.getVoices().length === 0) {{
-            window.speechSynthesis.addEventListener('voiceschanged', startSpeaking);
-        }} else {{
-            startSpeaking();
-        }}
-    </script>
-    """
-    components.html(html_code, height=0)
+        return None, str(e), []
+
+# --- TIẾN ĐỘ OCR CẢ CUỐN ---
+# Fragment tự chạy lại vài giây một lần: thanh tiến độ cập nhật mà không rerun cả trang
+@st.fragment(run_every=bookjob.PROGRESS_SECONDS)
+def show_book_progress(job):
+    progress = job.progress()
+    st.progress(progress["done"] / progress["total"], text=bookjob.progress_text(progress))
+
+# --- TRANG ĐANG ĐỌC ---
+# Component đọc báo đã sang trang -> chỉ fragment này chạy lại (ảnh, chữ, hàng đợi đọc),
+# không rerun cả app
+@st.fragment
+def show_page(pdf):
+    total_pages = pdf.page_count
+    page = reported_page()
+    if page is not None:
+        if page > total_pages:
+            # Đọc hết sách: rerun cả app để nút trở về "BẮT ĐẦU ĐỌC"
+            st.session_state.is_auto = False
+            st.rerun()
+        st.session_state.current_page = page
+    if st.session_state.is_auto:
+        st.session_state.current_page = pdf.next_readable_page(st.session_state.current_page)
+    page = st.session_state.current_page
+
+    # Trang đổi trong fragment: job OCR cả cuốn cũng ưu tiên lại từ đây
+    book_job = bookjob.get_job(pdf, "desktop", page) if bookjob.BOOK_JOB_ENABLED else None
+
+    # Đo thời gian từng bước của trang (cache, render, OCR...) -> log, /metrics, bảng debug
+    with metrics.page_trace("get_page_content", page) as page_trace:
+        img_show, text_content, chunks = get_page_content(pdf, pdf.digest, page)
+        page_trace.add_payload("image", len(img_show or b""))
+
+    # OCR sẵn các trang kế tiếp trong lúc trình duyệt đang đọc trang này
+    st.session_state.prefetcher.schedule(
+        get_page_content, page, total_pages, pdf, pdf.digest,
+        doc_key=pdf.digest
+    )
+
+    if img_show:
+        st.image(img_show, caption=f"Trang {page}", use_container_width=True)
+
+    # --- LOGIC ĐỌC ---
+    if st.session_state.is_auto:
+        st.toast(f"🔊 Đang đọc trang {page}...")
+        # Gửi sẵn chữ của vài trang sau đã OCR xong: component đọc hết trang này thì tự sang trang
+        # (trang OCR ra rỗng thì bỏ qua luôn), không phải chờ server
+        queue = reading_queue(pdf, page, lambda n: get_page_content(pdf, pdf.digest, n)[2],
+                              ready=book_job.is_done if book_job else None)
+        page_trace.add_payload("speech", len(json.dumps(queue, ensure_ascii=False).encode()))
+        browser_reader(queue, page, rate=1.1)
+
+        if chunks:
+            with st.expander("Xem văn bản đang đọc", expanded=True):
+                st.write(text_content)
+
+# --- TÌM TRONG SÁCH ---
+# Tìm trên chỉ mục các trang đã OCR (pdfvoice.search), gõ không dấu vẫn ra; bấm kết quả để nhảy
+# tới trang đó. Fragment: gõ chữ tìm không rerun cả trang (không OCR / render lại trang đang đọc)
+@st.fragment
+def show_search(pdf):
+    query = st.text_input("🔎 Tìm trong sách", placeholder="vd: duong cach mang")
+    if not query:
+        return
+    results = search.search(pdf.digest, query)
+    st.caption(f"{len(results)} kết quả · tìm trên {search.indexed_count(pdf.digest)}/{pdf.page_count} trang đã OCR")
+    for index, result in enumerate(results):
+        if st.button(f"Trang {result['page']}", key=f"search-{index}-{result['page']}"):
+            st.session_state.current_page = result["page"]
+            # Nhảy trang -> huỷ các trang đang xếp hàng đọc trước của vị trí cũ
+            st.session_state.prefetcher.cancel()
+            # Rerun cả app: ô số trang, nút, trình đọc theo trang mới
+            st.rerun()
+        st.markdown(result["snippet"])
 
 # --- GIAO DIỆN CHÍNH ---
 st.set_page_config(page_title="PDF Reader V20", layout="wide")
+# Đặt PDF_VOICE_METRICS_PORT (vd 8503) để xem thời gian từng bước ở http://127.0.0.1:<cổng>/metrics
+metrics.start_metrics_server()
 
 with st.sidebar:
     st.header("📂 Cài đặt")
@@ -94,12 +122,17 @@ if uploaded_file:
     # Khởi tạo session
     if 'current_page' not in st.session_state: st.session_state.current_page = 1
     if 'is_auto' not in st.session_state: st.session_state.is_auto = False
+    if 'prefetcher' not in st.session_state: st.session_state.prefetcher = PagePrefetcher()
 
     # Đọc file PDF
-    doc = fitz.open(stream=uploaded_file.read(), filetype="pdf")
-    total_pages = doc.page_count
-    uploaded_file.seek(0)
-    bytes_data = uploaded_file.read()
+    # Mở file một lần cho cả phiên: rerun không đọc lại / băm lại cả file
+    pdf = get_document(st.session_state, uploaded_file)
+    total_pages = pdf.page_count
+
+    # Auto: trang trắng / trang ngăn cách / trang chỉ có hình thì nhảy qua ngay trong lượt chạy này
+    # (kiểm tra trên ảnh ~50 dpi, không OCR, không ngủ, không rerun thêm)
+    if st.session_state.is_auto:
+        st.session_state.current_page = pdf.next_readable_page(st.session_state.current_page)
 
     # --- GIAO DIỆN CHIA CỘT ---
     col_vis, col_ctrl = st.columns([1.3, 1])
@@ -125,6 +158,8 @@ if uploaded_file:
         # Logic: Nếu người dùng thay đổi số ở ô trên -> Cập nhật trang hiện tại
         if selected_page != st.session_state.current_page:
             st.session_state.current_page = selected_page
+            # Nhảy trang -> huỷ các trang đang xếp hàng đọc trước của vị trí cũ
+            st.session_state.prefetcher.cancel()
             # Nếu đang auto thì giữ nguyên auto (nhảy cóc và đọc tiếp)
             # Nếu muốn nhảy trang là dừng đọc thì bỏ comment dòng dưới:
             # st.session_state.is_auto = False 
@@ -146,7 +181,7 @@ if uploaded_file:
                     st.rerun()
         
         with c2:
-            # Nút Next này ẩn mình để JS bấm, nhưng người dùng bấm cũng được
+            # Sang trang bằng tay (khi đang đọc, component tự sang trang, không bấm nút này nữa)
             if st.button("⏭️ Auto Next", use_container_width=True):
                 if st.session_state.current_page < total_pages:
                     st.session_state.current_page += 1
@@ -155,24 +190,18 @@ if uploaded_file:
 
     # --- CỘT TRÁI: HIỂN THỊ ẢNH & OCR ---
     # Lấy nội dung trang (Dựa theo số trang đã chọn)
-    img_show, text_content = get_page_content(bytes_data, st.session_state.current_page)
+    # Cả cuốn được OCR trước trong nền: trang đang đọc, các trang sau rồi phần còn lại (pdfvoice.bookjob)
+    if bookjob.BOOK_JOB_ENABLED:
+        book_job = bookjob.get_job(pdf, "desktop", st.session_state.current_page)
+        with st.sidebar:
+            show_book_progress(book_job)
+    with st.sidebar:
+        show_search(pdf)
 
     with col_vis:
-        if img_show: 
-            st.image(img_show, caption=f"Trang {st.session_state.current_page}", use_container_width=True)
+        show_page(pdf)
 
-    # --- LOGIC ĐỌC ---
-    if st.session_state.is_auto:
-        with col_ctrl:
-            if text_content:
-                st.toast(f"🔊 Đang đọc trang {st.session_state.current_page}...")
-                speak_client_side(text_content, st.session_state.current_page)
-                
-                with st.expander("Xem văn bản đang đọc", expanded=True):
-                    st.write(text_content)
-            else:
-                st.warning("Trang trắng. Đang chuyển tiếp...")
-                time.sleep(1)
-                if st.session_state.current_page < total_pages:
-                    st.session_state.current_page += 1
-                    st.rerun()
+    # Bảng thời gian xử lý các trang gần nhất (bật bằng PDF_VOICE_DEBUG_PANEL=1)
+    if metrics.DEBUG_PANEL:
+        with st.sidebar.expander("🐞 Thời gian xử lý", expanded=True):
+            st.dataframe(metrics.recent(), use_container_width=True)